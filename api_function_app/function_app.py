@@ -3,29 +3,181 @@ import os
 import json
 import logging
 
+from inventory_store import (
+    DEFAULT_LIMIT,
+    InventoryFile,
+    InventoryStore,
+    body_digest,
+    bulk_arguments,
+    compress,
+    etag_matches,
+    make_etag,
+    ndjson_lines,
+    negotiate_encoding,
+    wants_ndjson,
+)
+
 app = func.FunctionApp()
 
+INVENTORY_PATH = os.path.join(os.path.dirname(__file__), "shops_inventory.json")
+# Clients may reuse a response for this long, then must revalidate with If-None-Match
+INVENTORY_MAX_AGE = int(os.getenv("INVENTORY_MAX_AGE", "60"))
+# Bodies smaller than this are not worth compressing
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+
+# Parsed, indexed and serialized once per worker; reloaded only when the file changes
+inventory_file = InventoryFile(INVENTORY_PATH)
+
+
+def get_inventory_store() -> InventoryStore:
+    return inventory_file.current().store
+
+
+def cached_json_response(
+    req: func.HttpRequest, body: bytes, digest: str, encoded=None, version=None, mimetype="application/json"
+) -> func.HttpResponse:
+    """
+    Serve a JSON body with a strong ETag, Cache-Control and content-coding negotiation.
+
+    Args:
+        req: The incoming request (If-None-Match and Accept-Encoding are honoured).
+        body: Compact UTF-8 JSON body.
+        digest: Content digest the ETag is derived from.
+        encoded: Optional callable returning a pre-compressed body for an encoding.
+        version: Optional dataset version, sent as X-Inventory-Version so clients can tell when derived answers go stale.
+        mimetype: Media type of the body (JSON, or NDJSON for line-delimited bulk results).
+    """
+    encoding = negotiate_encoding(req.headers.get("Accept-Encoding"), COMPRESSION_MIN_BYTES, len(body))
+    headers = {
+        "ETag": make_etag(digest, encoding),
+        "Cache-Control": f"public, max-age={INVENTORY_MAX_AGE}, must-revalidate",
+        "Vary": "Accept-Encoding",
+    }
+    if version:
+        headers["X-Inventory-Version"] = version
+    if etag_matches(req.headers.get("If-None-Match"), digest):
+        return func.HttpResponse(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        body = encoded(encoding) if encoded else compress(body, encoding)
+    return func.HttpResponse(body, mimetype=mimetype, charset="utf-8", status_code=200, headers=headers)
+
+
+def _optional_float(req: func.HttpRequest, name: str):
+    value = req.params.get(name)
+    return float(value) if value not in (None, "") else None
+
+
+def _optional_bool(req: func.HttpRequest, name: str):
+    value = req.params.get(name)
+    if value in (None, ""):
+        return None
+    if value.lower() in ("true", "1", "yes"):
+        return True
+    if value.lower() in ("false", "0", "no"):
+        return False
+    raise ValueError(f"'{name}' must be true or false")
+
+
 @app.route(route="shops_inventory", auth_level=func.AuthLevel.ANONYMOUS)
 def seaworld_shops_inventory_final(req: func.HttpRequest) -> func.HttpResponse:
     logging.info('Serving Shops Inventory JSON data.')
 
-    # Always use the path relative to this script
-    json_path = os.path.join(os.path.dirname(__file__), "shops_inventory.json")
-
     try:
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return func.HttpResponse(
-            json.dumps(data, ensure_ascii=False, indent=2),
-            mimetype="application/json",
-            status_code=200
-        )
+        snapshot = inventory_file.current()
     except Exception as e:
         logging.error(f"Error loading JSON: {e}")
         return func.HttpResponse(
             f"Error loading inventory data: {e}",
             status_code=500
         )
+    return cached_json_response(req, snapshot.body, snapshot.digest, snapshot.encoded, version=snapshot.digest)
+
+
+@app.route(route="shops_inventory/query", auth_level=func.AuthLevel.ANONYMOUS)
+def shops_inventory_query(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Filtered, projected and paginated inventory lookup.
+
+    Query parameters: item, store, category, color, min_price, max_price, in_stock,
+    fields (comma-separated), limit, offset.
+    """
+    logging.info('Serving Shops Inventory query.')
+
+    try:
+        snapshot = inventory_file.current()
+        fields = req.params.get("fields")
+        result = snapshot.store.query(
+            item=req.params.get("item"),
+            store=req.params.get("store"),
+            category=req.params.get("category"),
+            color=req.params.get("color"),
+            min_price=_optional_float(req, "min_price"),
+            max_price=_optional_float(req, "max_price"),
+            in_stock=_optional_bool(req, "in_stock"),
+            fields=[field for field in fields.split(",") if field.strip()] if fields else None,
+            limit=int(req.params.get("limit") or DEFAULT_LIMIT),
+            offset=int(req.params.get("offset") or 0),
+        )
+    except ValueError as e:
+        return func.HttpResponse(f"Invalid query parameter: {e}", status_code=400)
+    except Exception as e:
+        logging.error(f"Error querying inventory: {e}")
+        return func.HttpResponse(f"Error querying inventory data: {e}", status_code=500)
+
+    body = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return cached_json_response(req, body, body_digest(body), version=snapshot.digest)
+
+
+@app.route(route="shops_inventory/bulk", methods=["GET", "POST"], auth_level=func.AuthLevel.ANONYMOUS)
+def shops_inventory_bulk(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Many items in one lookup: fuzzy item names and/or row ids, with the query filters.
+
+    Parameters (query string, or a JSON body for POST): items, ids, store, category,
+    color, min_price, max_price, in_stock, fields, limit_per_item. With format=ndjson
+    (or Accept: application/x-ndjson) matches are returned one row per line. The body
+    is built in full and sent in one piece, with an ETag and compression like the other
+    routes; clients can still parse it line by line as it arrives.
+    """
+    logging.info('Serving Shops Inventory bulk lookup.')
+
+    params = dict(req.params)
+    try:
+        body = req.get_json()
+    except ValueError:
+        body = None
+    if isinstance(body, dict):
+        params.update(body)
+
+    try:
+        snapshot = inventory_file.current()
+        groups = snapshot.store.bulk(**bulk_arguments(params))
+        if wants_ndjson(params.get("format"), req.headers.get("Accept")):
+            body, mimetype = b"".join(ndjson_lines(groups)), "application/x-ndjson"
+        else:
+            result = {"results": list(groups)}
+            body, mimetype = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), "application/json"
+    except (TypeError, ValueError) as e:
+        return func.HttpResponse(f"Invalid bulk request: {e}", status_code=400)
+    except Exception as e:
+        logging.error(f"Error in bulk inventory lookup: {e}")
+        return func.HttpResponse(f"Error querying inventory data: {e}", status_code=500)
+
+    return cached_json_response(req, body, body_digest(body), version=snapshot.digest, mimetype=mimetype)
+
+
+@app.route(route="shops_inventory/facets", auth_level=func.AuthLevel.ANONYMOUS)
+def shops_inventory_facets(req: func.HttpRequest) -> func.HttpResponse:
+    """Distinct stores, categories and colors available as query filters."""
+    try:
+        snapshot = inventory_file.current()
+        facets = snapshot.store.facets()
+    except Exception as e:
+        logging.error(f"Error loading inventory facets: {e}")
+        return func.HttpResponse(f"Error loading inventory data: {e}", status_code=500)
+    body = json.dumps(facets, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return cached_json_response(req, body, body_digest(body), version=snapshot.digest)
 
 
 @app.route(route="shops_inventory_final", auth_level=func.AuthLevel.ANONYMOUS)
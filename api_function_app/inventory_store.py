@@ -0,0 +1,466 @@
+import os
+import re
+import gzip
+import json
+import time
+import bisect
+import difflib
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# -------------------------------
+# In-memory inventory with query indexes
+# -------------------------------
+#
+# The catalogue is parsed once and indexed by item-name token, store, category
+# and color, plus a price-sorted list for range filters. Queries intersect the
+# posting sets of the requested filters instead of scanning every row.
+#
+# Bulk lookups resolve many item names (or row ids) in one pass. Names match
+# fuzzily: a word missing from the catalogue is replaced by the closest known
+# item word ("dolphins", "plushie", "jelyfish"), and a name keeps the rows that
+# contain the most of its words, as long as that is at least half of them.
+
+FIELDS = ["Item", "Store", "Price", "Color", "Description", "Category", "Quantity"]
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Names (or ids) per bulk request and default matches returned per name
+BULK_MAX_ITEMS = 50
+BULK_DEFAULT_LIMIT = 10
+# Minimum difflib similarity for a misspelled word to stand in for a catalogue word
+FUZZY_CUTOFF = 0.75
+# Words that say nothing about which item is meant
+STOPWORDS = frozenset({"a", "an", "and", "the", "of", "in", "for", "with", "to", "all", "any", "item", "items"})
+
+_TOKEN = re.compile(r"[\w’']+")
+_PRICE = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+
+def _key(value: Any) -> str:
+    # Curly and straight apostrophes compare equal ("Hamad’s Hideaway")
+    return str(value).strip().casefold().replace("’", "'")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.replace("’", "'") for token in _TOKEN.findall(text.casefold())]
+
+
+def parse_price(price: Any) -> Optional[float]:
+    """Return the numeric part of a price such as "126 AED"."""
+    if isinstance(price, (int, float)):
+        return float(price)
+    match = _PRICE.search(str(price or ""))
+    return float(match.group()) if match else None
+
+
+class InventoryStore:
+    """
+    Indexed, read-only view of the shops inventory.
+
+    Args:
+        rows: Inventory records as loaded from shops_inventory.json.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]) -> None:
+        self.rows = rows
+        self.prices: List[Optional[float]] = [parse_price(row.get("Price")) for row in rows]
+        self.by_token: Dict[str, Set[int]] = {}
+        self.by_store: Dict[str, Set[int]] = {}
+        self.by_category: Dict[str, Set[int]] = {}
+        self.by_color: Dict[str, Set[int]] = {}
+        self.in_stock: Set[int] = set()
+        for row_id, row in enumerate(rows):
+            for token in tokenize(str(row.get("Item", ""))):
+                self.by_token.setdefault(token, set()).add(row_id)
+            self.by_store.setdefault(_key(row.get("Store", "")), set()).add(row_id)
+            self.by_category.setdefault(_key(row.get("Category", "")), set()).add(row_id)
+            self.by_color.setdefault(_key(row.get("Color", "")), set()).add(row_id)
+            if int(row.get("Quantity") or 0) > 0:
+                self.in_stock.add(row_id)
+        priced = sorted((price, row_id) for row_id, price in enumerate(self.prices) if price is not None)
+        self._price_values = [price for price, _ in priced]
+        self._price_ids = [row_id for _, row_id in priced]
+        self._vocabulary = sorted(self.by_token)
+        self.by_name: Dict[str, List[int]] = {}
+        for row_id, row in enumerate(rows):
+            self.by_name.setdefault(_key(row.get("Item", "")), []).append(row_id)
+
+    @classmethod
+    def from_file(cls, path: str) -> "InventoryStore":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    # -------------------------------
+    # Filters
+    # -------------------------------
+
+    def _match_item(self, item: str) -> Set[int]:
+        # Every word of the requested item must appear in the item name ("dolphin plush")
+        tokens = tokenize(item)
+        if not tokens:
+            return set(range(len(self.rows)))
+        postings = [self.by_token.get(token, set()) for token in tokens]
+        return set.intersection(*postings)
+
+    def _price_range(self, min_price: Optional[float], max_price: Optional[float]) -> Set[int]:
+        lo = 0 if min_price is None else bisect.bisect_left(self._price_values, min_price)
+        hi = len(self._price_values) if max_price is None else bisect.bisect_right(self._price_values, max_price)
+        return set(self._price_ids[lo:hi])
+
+    def _filter(
+        self,
+        store: Optional[str] = None,
+        category: Optional[str] = None,
+        color: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: Optional[bool] = None,
+    ) -> List[Set[int]]:
+        candidates: List[Set[int]] = []
+        if store:
+            candidates.append(self.by_store.get(_key(store), set()))
+        if category:
+            candidates.append(self.by_category.get(_key(category), set()))
+        if color:
+            candidates.append(self.by_color.get(_key(color), set()))
+        if min_price is not None or max_price is not None:
+            candidates.append(self._price_range(min_price, max_price))
+        if in_stock is not None:
+            stocked = self.in_stock
+            candidates.append(stocked if in_stock else set(range(len(self.rows))) - stocked)
+        return candidates
+
+    def _project(self, row_id: int, selected: Optional[List[str]]) -> Dict[str, Any]:
+        row = self.rows[row_id]
+        return {field: row[field] for field in selected if field in row} if selected else row
+
+    @staticmethod
+    def _selected_fields(fields: Optional[Iterable[str]]) -> Optional[List[str]]:
+        wanted = {_key(field) for field in fields or []}
+        return [field for field in FIELDS if field.casefold() in wanted] or None
+
+    def facets(self) -> Dict[str, List[str]]:
+        """Distinct stores, categories and colors, for building valid filters."""
+        def distinct(field: str) -> List[str]:
+            return sorted({str(row.get(field, "")) for row in self.rows if row.get(field)})
+
+        return {"stores": distinct("Store"), "categories": distinct("Category"), "colors": distinct("Color")}
+
+    def query(
+        self,
+        item: Optional[str] = None,
+        store: Optional[str] = None,
+        category: Optional[str] = None,
+        color: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: Optional[bool] = None,
+        fields: Optional[Iterable[str]] = None,
+        limit: int = DEFAULT_LIMIT,
+        offset: int = 0,
+    ) -> Dict[str, Any]:
+        """
+        Filter the inventory and return one page of (optionally projected) rows.
+
+        Returns:
+            A dict with `total` matches, the `offset`/`limit` used and the page of `items`.
+        """
+        candidates = self._filter(store, category, color, min_price, max_price, in_stock)
+        if item:
+            candidates.append(self._match_item(item))
+
+        if candidates:
+            candidates.sort(key=len)
+            matches = sorted(set.intersection(*candidates))
+        else:
+            matches = list(range(len(self.rows)))
+
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        offset = max(0, int(offset))
+        selected = self._selected_fields(fields)
+        page = [self._project(row_id, selected) for row_id in matches[offset:offset + limit]]
+        return {"total": len(matches), "offset": offset, "limit": limit, "items": page}
+
+    # -------------------------------
+    # Bulk lookups
+    # -------------------------------
+
+    def _resolve_token(self, token: str) -> Optional[Tuple[str, float]]:
+        """The catalogue word a query word stands for, with its similarity (1.0 when exact)."""
+        if token in self.by_token:
+            return token, 1.0
+        close = difflib.get_close_matches(token, self._vocabulary, n=1, cutoff=FUZZY_CUTOFF)
+        if not close:
+            return None
+        return close[0], difflib.SequenceMatcher(None, token, close[0]).ratio()
+
+    def match_name(self, name: str) -> List[int]:
+        """Row ids best matching an item name: the exact name if known, else the rows sharing most of its words."""
+        exact = self.by_name.get(_key(name))
+        if exact:
+            return list(exact)
+        tokens = [token for token in tokenize(name) if token not in STOPWORDS] or tokenize(name)
+        if not tokens:
+            return []
+        # row id -> (query words matched, summed similarity)
+        scores: Dict[int, Tuple[int, float]] = {}
+        for token in dict.fromkeys(tokens):
+            resolved = self._resolve_token(token)
+            if resolved is None:
+                continue
+            word, similarity = resolved
+            for row_id in self.by_token[word]:
+                matched, total = scores.get(row_id, (0, 0.0))
+                scores[row_id] = (matched + 1, total + similarity)
+        if not scores:
+            return []
+        best = max(matched for matched, _ in scores.values())
+        if best * 2 < len(tokens):
+            return []
+        ranked = [(row_id, total) for row_id, (matched, total) in scores.items() if matched == best]
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return [row_id for row_id, _ in ranked]
+
+    def bulk(
+        self,
+        items: Sequence[Union[str, int]] = (),
+        store: Optional[str] = None,
+        category: Optional[str] = None,
+        color: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: Optional[bool] = None,
+        fields: Optional[Iterable[str]] = None,
+        limit_per_item: int = BULK_DEFAULT_LIMIT,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Look up many item names or row ids at once, narrowed by the same filters as `query`.
+
+        Yields one group per requested item, in request order:
+        {"query", "total", "items"}, where every item carries its row `id`.
+
+        Raises:
+            ValueError: If more than BULK_MAX_ITEMS items are requested.
+        """
+        if len(items) > BULK_MAX_ITEMS:
+            raise ValueError(f"at most {BULK_MAX_ITEMS} items per request")
+        candidates = self._filter(store, category, color, min_price, max_price, in_stock)
+        allowed = set.intersection(*candidates) if candidates else None
+        limit = max(1, min(int(limit_per_item), MAX_LIMIT))
+        # Validated above; groups are then produced as they are consumed (e.g. written as NDJSON)
+        return self._bulk_groups(items, allowed, limit, self._selected_fields(fields))
+
+    def _bulk_groups(
+        self, items: Sequence[Union[str, int]], allowed: Optional[Set[int]], limit: int, selected: Optional[List[str]]
+    ) -> Iterator[Dict[str, Any]]:
+        for item in items:
+            if isinstance(item, int):
+                matches = [item] if 0 <= item < len(self.rows) else []
+            else:
+                matches = self.match_name(item)
+            if allowed is not None:
+                matches = [row_id for row_id in matches if row_id in allowed]
+            rows = [{"id": row_id, **self._project(row_id, selected)} for row_id in matches[:limit]]
+            yield {"query": item, "total": len(matches), "items": rows}
+
+
+# -------------------------------
+# Preloaded, pre-serialized snapshot with change detection
+# -------------------------------
+
+class InventorySnapshot:
+    """
+    One parsed version of the inventory file, serialized once.
+
+    Attributes:
+        store: Indexed InventoryStore for queries.
+        body: Compact UTF-8 JSON of the full inventory.
+        digest: SHA-256 of `body`, used for strong ETags.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], content_hash: str) -> None:
+        self.store = InventoryStore(rows)
+        self.body = json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.content_hash = content_hash
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        """Return the body compressed with `encoding` ("gzip" or "br"), compressing at most once."""
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress(self.body, encoding)
+        return self._encoded[encoding]
+
+
+class InventoryFile:
+    """
+    Keeps the current InventorySnapshot for a JSON file.
+
+    The file is stat'ed at most every `check_interval` seconds. A new mtime only
+    triggers a rebuild when the file's content hash also changed.
+    """
+
+    def __init__(self, path: str, check_interval: float = 1.0) -> None:
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot: Optional[InventorySnapshot] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> InventorySnapshot:
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            self._checked_at = now
+            mtime = os.stat(self.path).st_mtime
+            if self._snapshot is None or mtime != self._mtime:
+                with open(self.path, "rb") as f:
+                    raw = f.read()
+                content_hash = hashlib.sha256(raw).hexdigest()
+                if self._snapshot is None or content_hash != self._snapshot.content_hash:
+                    self._snapshot = InventorySnapshot(json.loads(raw.decode("utf-8")), content_hash)
+                    logging.info(f"Inventory loaded: {len(self._snapshot.store.rows)} rows, etag {self._snapshot.digest}.")
+                self._mtime = mtime
+            return self._snapshot
+
+
+# -------------------------------
+# HTTP caching helpers
+# -------------------------------
+
+def available_encodings() -> List[str]:
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    return body
+
+
+def negotiate_encoding(accept_encoding: Optional[str], min_size: int, size: int) -> Optional[str]:
+    """Pick the best supported content-coding from an Accept-Encoding header (None for identity)."""
+    if not accept_encoding or size < min_size:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    for encoding in available_encodings():
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def make_etag(digest: str, encoding: Optional[str] = None) -> str:
+    """Strong ETag; each content-coding gets its own tag for the same digest."""
+    return f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], digest: str) -> bool:
+    """True if any tag in an If-None-Match header refers to `digest` (in any content-coding)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        if tag == digest or tag.split("-", 1)[0] == digest:
+            return True
+    return False
+
+
+def body_digest(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+# -------------------------------
+# Bulk request / response helpers (shared by the function app and the test server)
+# -------------------------------
+
+def _as_list(value: Any) -> List[Any]:
+    if value in (None, ""):
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    return list(value)
+
+
+def _as_bool(value: Any) -> Optional[bool]:
+    if value in (None, ""):
+        return None
+    if isinstance(value, bool):
+        return value
+    if str(value).lower() in ("true", "1", "yes"):
+        return True
+    if str(value).lower() in ("false", "0", "no"):
+        return False
+    raise ValueError("'in_stock' must be true or false")
+
+
+def bulk_arguments(params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Keyword arguments for InventoryStore.bulk from query parameters and/or a JSON body.
+
+    `items` (names) and `ids` (row ids) are lists, or comma-separated strings in a query string.
+
+    Raises:
+        ValueError: On malformed numbers or booleans, or when neither items nor ids are given.
+    """
+    items: List[Union[str, int]] = [str(item) for item in _as_list(params.get("items"))]
+    items += [int(row_id) for row_id in _as_list(params.get("ids"))]
+    if not items:
+        raise ValueError("'items' or 'ids' is required")
+    arguments: Dict[str, Any] = {
+        "items": items,
+        "store": params.get("store") or None,
+        "category": params.get("category") or None,
+        "color": params.get("color") or None,
+        "in_stock": _as_bool(params.get("in_stock")),
+        "fields": _as_list(params.get("fields")) or None,
+        "limit_per_item": int(params.get("limit_per_item") or BULK_DEFAULT_LIMIT),
+    }
+    for name in ("min_price", "max_price"):
+        value = params.get(name)
+        arguments[name] = float(value) if value not in (None, "") else None
+    return arguments
+
+
+def wants_ndjson(format_param: Optional[str], accept: Optional[str]) -> bool:
+    return (format_param or "").lower() == "ndjson" or "application/x-ndjson" in (accept or "").lower()
+
+
+def ndjson_lines(groups: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """
+    Newline-delimited JSON for bulk results: one {"query", "item"} line per matching row,
+    then a {"query", "total", "returned"} line closing each requested item.
+    """
+    for group in groups:
+        for row in group["items"]:
+            yield _compact({"query": group["query"], "item": row}) + b"\n"
+        yield _compact({"query": group["query"], "total": group["total"], "returned": len(group["items"])}) + b"\n"
+
+
+def _compact(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
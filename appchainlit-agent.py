@@ -1,69 +1,132 @@
 import asyncio
+from typing import AsyncIterator, List, Optional, Tuple
+
+# Reads the .env file; imported first so every module below sees its values
+from sk_runtime.settings import get_settings
 
-from semantic_kernel import Kernel
 from semantic_kernel.agents import ChatCompletionAgent, ChatHistoryAgentThread
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
-from semantic_kernel.filters import FunctionInvocationContext
-from dotenv import load_dotenv
+from semantic_kernel.contents import AuthorRole, ChatMessageContent
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.functions import KernelArguments
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior, FunctionChoiceType
-import os
 import chainlit as cl
 
-# Import your workflow plugins
-from sk_plugins.web_search import GoogleWebSearch
-from sk_plugins.ai_search_index import AiSearch
-from sk_plugins.ai_search_index_2 import AiSearch2
-from sk_plugins.api_inventory import Inventory
-
-# Load environment variables from .env file (for API keys and endpoints)
-load_dotenv()
- 
-# Retrieve Azure OpenAI configuration from environment variables
-AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
-AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4.1")
-AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview")
-AZURE_OPENAI_PROMPT = os.getenv("AZURE_OPENAI_PROMPT")
+from sk_runtime.kernel_provider import KernelProvider, LazyPlugin
+from sk_runtime.deployment_router import load_deployments
+from sk_runtime.admission import BUSY_MESSAGE, enable_admission_control, is_rate_limited
+from sk_runtime.chainlit_steps import tool_step_filter
+from sk_runtime.turn_metrics import track_turn
+from sk_runtime.turn_trace import RecordingChatCompletion, enable_turn_recording, trace_filter
+from sk_runtime.result_shaping import result_shaping_filter
+from sk_runtime.single_flight import single_flight_filter
+from sk_runtime.telemetry import configure_telemetry, instrumentation_filter, record_llm_usage, shutdown_telemetry
+from sk_runtime.session_store import get_session_store
+from sk_runtime.answer_cache import get_answer_cache
+from sk_runtime.intent_router import create_intent_router, prefetch_filter, speculate, stream_with_fallback
+
+# Azure OpenAI configuration, read once from the environment (and .env file)
+settings = get_settings()
+AZURE_OPENAI_API_KEY = settings.azure_openai_api_key
+AZURE_OPENAI_ENDPOINT = settings.azure_openai_endpoint
+AZURE_OPENAI_DEPLOYMENT = settings.azure_openai_deployment
+AZURE_OPENAI_API_VERSION = settings.azure_openai_api_version
+AZURE_OPENAI_PROMPT = settings.azure_openai_prompt
 
 """
 NEW: Single Agent Semantic Kernel 
 Uses the new Semantic Kernel SDK with AzureChatCompletionAgent 
-Added Function Invocation filter to log function calls initialized to kernel (without this service, you can create a single ChatCompletionAgent with NO kernel initialized)
+Function invocation filters on the kernel render tool steps and record telemetry (without this service, you can create a single ChatCompletionAgent with NO kernel initialized)
 Chainlit frontend 
 """
 
-# Kernel function-invocation filter (unchanged)
-async def function_invocation_filter(context: FunctionInvocationContext, next):
-    if "messages" not in context.arguments:
-        await next(context)
-        return
-    print(f"    Agent [{context.function.name}] called with messages: {context.arguments['messages']}")
-    await next(context)
-    print(f"    Response from agent [{context.function.name}]: {context.result.value}")
-
-load_dotenv()
-
-endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-api_version = os.getenv("AZURE_OPENAI_API_VERSION")
-deployment_name = "gpt-4.1"
-openai_key = os.getenv("AZURE_OPENAI_API_KEY")
-promptnew = os.getenv("AZURE_OPENAI_PROMPT_NEWAPP")
-
-kernel = Kernel()
-kernel.add_filter("function_invocation", function_invocation_filter)
-
-single_agent = ChatCompletionAgent(
-    service=AzureChatCompletion(
-        deployment_name="gpt-4.1",
-        api_key=openai_key,
-        endpoint=endpoint,
-        api_version=api_version,
-    ),
-    kernel=kernel,
-    name="SingleAgent",
-    instructions=promptnew, 
-    plugins=[GoogleWebSearch(), AiSearch(), AiSearch2(), Inventory()],
+endpoint = settings.azure_openai_endpoint
+# Optional full base URL (e.g. a gateway or local test server); takes precedence over the endpoint
+base_url = settings.azure_openai_base_url
+api_version = settings.azure_openai_api_version
+deployment_name = AZURE_OPENAI_DEPLOYMENT
+openai_key = settings.azure_openai_api_key
+promptnew = settings.azure_openai_prompt_newapp
+
+# Concurrency limit, fair per-session queueing, quota tracking and 429 retries for
+# every Azure OpenAI request of this process
+admission = enable_admission_control()
+# Each turn's messages, tool calls and timings go to TURN_TRACE_FILE when set (replayed by benchmarks/replay_traces.py)
+turn_recorder = enable_turn_recording()
+
+# One kernel, chat service (with a pooled HTTP transport) and plugin set per process,
+# shared by the CLI loop and every Chainlit session; sessions only own their history (in the session store).
+kernel_provider = KernelProvider(
+    deployment_name=deployment_name,
+    api_key=openai_key,
+    endpoint=endpoint,
+    base_url=base_url,
+    api_version=api_version,
+    # Several deployments (AZURE_OPENAI_DEPLOYMENTS) are routed by latency and health, with failover
+    deployments=load_deployments(),
+    chat_service_mixins=[RecordingChatCompletion] if turn_recorder else [],
+    # Imported with the kernel build, not at startup
+    plugins={
+        "GoogleWebSearch": LazyPlugin("sk_plugins.web_search:GoogleWebSearch"),
+        "AiSearch": LazyPlugin("sk_plugins.ai_search_index:AiSearch"),
+        "AiSearch2": LazyPlugin("sk_plugins.ai_search_index_2:AiSearch2"),
+        "Inventory": LazyPlugin("sk_plugins.api_inventory:Inventory"),
+        "ParkRetrieval": LazyPlugin("sk_plugins.park_retrieval:ParkRetrieval"),
+    },
+    filters=[
+        ("function_invocation", tool_step_filter),
+        ("function_invocation", instrumentation_filter),
+        # Records the call for the turn trace, with the result as the model receives it
+        ("function_invocation", trace_filter),
+        # Compacts and budgets tool results; inside instrumentation so it records what the model receives
+        ("function_invocation", result_shaping_filter),
+        # Serves speculative prefetches while steps and telemetry still see the call
+        ("function_invocation", prefetch_filter),
+        # Innermost: identical calls already in flight share one backend request
+        ("function_invocation", single_flight_filter),
+    ],
 )
+configure_telemetry("appchainlit-agent")
+# Thread histories live in the session store, so any worker can serve a session (see SESSION_STORE)
+session_store = get_session_store()
+# Narrows the advertised tools and prefetches retrieval for confidently classified questions
+intent_router = create_intent_router(kernel_provider.plugin_factories)
+
+_agent: Optional[ChatCompletionAgent] = None
+
+
+def get_agent() -> ChatCompletionAgent:
+    """The process-wide agent, created with the shared kernel on first use (not at import)."""
+    global _agent
+    if _agent is None:
+        _agent = ChatCompletionAgent(
+            service=kernel_provider.chat_completion,
+            kernel=kernel_provider.kernel,
+            name="SingleAgent",
+            instructions=promptnew,
+        )
+    return _agent
+
+def route_arguments(included_plugins: Optional[List[str]]) -> Optional[KernelArguments]:
+    """Per-turn arguments restricting the agent to the routed plugins, or None to expose all of them."""
+    if included_plugins is None:
+        return None
+    behavior = FunctionChoiceBehavior.Auto(filters={"included_plugins": included_plugins})
+    return KernelArguments(settings=PromptExecutionSettings(function_choice_behavior=behavior))
+
+async def stream_agent_reply(
+    agent: ChatCompletionAgent,
+    thread: ChatHistoryAgentThread,
+    user_text: str,
+    arguments: Optional[KernelArguments] = None,
+) -> AsyncIterator[Tuple[str, ChatHistoryAgentThread]]:
+    """Reduce the thread to its token budget, then stream (token, thread) pairs for the agent's reply."""
+    if thread is not None and thread.id is not None:
+        await thread.reduce()
+    async for resp in agent.invoke_stream(messages=user_text, thread=thread, arguments=arguments):
+        record_llm_usage(resp.message)
+        token = resp.message.content or ""
+        if token:
+            yield token, resp.thread
 
 # ---------- CLI loop (unchanged) ----------
 thread: ChatHistoryAgentThread = None
@@ -79,7 +142,7 @@ async def chat() -> bool:
         print("\n\nExiting chat...")
         return False
 
-    response = await single_agent.get_response(
+    response = await get_agent().get_response(
         messages=user_input,
         thread=thread,
     )
@@ -94,6 +157,8 @@ async def main() -> None:
     chatting = True
     while chatting:
         chatting = await chat()
+    await kernel_provider.aclose()
+    shutdown_telemetry()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -102,24 +167,84 @@ if __name__ == "__main__":
 # Chainlit frontend (simple)
 # ============================
 
+@cl.on_app_startup
+async def on_app_startup():
+    # Kernel build and connection warm-up; in the background by default (see WARM_UP)
+    if settings.warm_up == "background":
+        kernel_provider.start_warm_up()
+    elif settings.warm_up == "blocking":
+        await kernel_provider.warm_up()
+    await session_store.purge()
+
+@cl.on_app_shutdown
+async def on_app_shutdown():
+    await kernel_provider.aclose()
+    shutdown_telemetry()
+
 @cl.on_chat_start
 async def on_chat_start():
-    cl.user_session.set("agent", single_agent)
-    cl.user_session.set("thread", ChatHistoryAgentThread())
+    # The kernel may still be building in the background
+    await kernel_provider.ready()
+    cl.user_session.set("agent", get_agent())
+    # Token-budgeted thread history; dropped turns are summarized in the background
+    await session_store.history(cl.user_session.get("id"), service=kernel_provider.chat_completion)
     await cl.Message(content="Hi! Ask me about the Theme Park").send()
 
 @cl.on_message
 async def on_message(message: cl.Message):
-    agent: ChatCompletionAgent = cl.user_session.get("agent")
-    thread: ChatHistoryAgentThread = cl.user_session.get("thread")
+    await kernel_provider.ready()
+    agent: ChatCompletionAgent = cl.user_session.get("agent") or get_agent()
+    session_id = cl.user_session.get("id")
+    # The thread is a thin wrapper around the stored history and is rebuilt every turn
+    history = await session_store.history(session_id, service=kernel_provider.chat_completion)
+    thread = ChatHistoryAgentThread(chat_history=history, thread_id=session_id)
 
     user_text = (message.content or "").strip()
     if not user_text:
         await cl.Message(content="Please enter a message.").send()
         return
 
+    # Stream tokens into the message as they arrive; tool calls appear as steps
+    msg = cl.Message(content="")
+    answer_cache = get_answer_cache("appchainlit-agent")
+    # Messages from before the turn (reducing the thread may replace older ones, never add after them)
+    earlier = {id(message) for message in history.messages}
     try:
-        resp = await agent.get_response(messages=user_text, thread=thread)
-        await cl.Message(content=str(resp) if resp else "(no response)").send()
+        with track_turn("appchainlit-agent", session_id, question=user_text) as metrics:
+            # Repeat FAQ questions are answered from recent answers whose data is still current
+            cached = await answer_cache.lookup(user_text) if answer_cache else None
+            if cached is not None:
+                metrics.answer_cache_hit = True
+                metrics.mark_first_token()
+                await msg.stream_token(cached.answer)
+                # Keep the thread complete so follow-up questions still have the context
+                await thread.on_new_message(ChatMessageContent(role=AuthorRole.USER, content=user_text))
+                await thread.on_new_message(ChatMessageContent(role=AuthorRole.ASSISTANT, content=cached.answer))
+            else:
+                route = intent_router.route(user_text, agent.kernel) if intent_router else None
+                metrics.intent = route.intent if route else None
+
+                async def reply(included_plugins: Optional[List[str]]) -> AsyncIterator[str]:
+                    async for token, _ in stream_agent_reply(agent, thread, user_text, route_arguments(included_plugins)):
+                        yield token
+
+                with speculate(route, user_text):
+                    # A narrowed reply that used none of its tools is asked again with all of them
+                    async for token in stream_with_fallback(route, history, reply):
+                        metrics.mark_first_token()
+                        await msg.stream_token(token)
+                if intent_router:
+                    await intent_router.record(user_text, metrics.tools, route)
+                if answer_cache:
+                    await answer_cache.store(user_text, msg.content, metrics)
+        # Appends only the messages of this turn
+        await session_store.save(session_id)
+        if not msg.content:
+            msg.content = "(no response)"
+        await msg.send()
     except Exception as e:
-        await cl.Message(content=f"Error: {e}").send()
+        # Drop what the failed turn added (the question, an unanswered tool call): it would be saved with
+        # the next turn, and a tool call without its result makes every later request of the session fail
+        while history.messages and id(history.messages[-1]) not in earlier:
+            history.messages.pop()
+        await cl.Message(content=BUSY_MESSAGE if is_rate_limited(e) else f"Error: {e}").send()
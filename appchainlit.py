@@ -1,23 +1,33 @@
 import os
 import asyncio
 import logging
-from typing import Optional, Tuple
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional, Tuple
 import chainlit as cl
+
+# Reads the .env file; imported first so every module below sees its values
+from sk_runtime.settings import get_settings
  
 # Import Semantic Kernel and Azure OpenAI classes
 from semantic_kernel import Kernel
-from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.connectors.ai.function_choice_behavior import FunctionChoiceBehavior
 from semantic_kernel.contents.chat_history import ChatHistory
-from semantic_kernel.connectors.ai.open_ai.prompt_execution_settings.azure_chat_prompt_execution_settings import AzureChatPromptExecutionSettings
- 
-# Import your workflow plugins
-from sk_plugins.web_search import GoogleWebSearch
-from sk_plugins.ai_search_index import AiSearch
-from sk_plugins.ai_search_index_2 import AiSearch2
-from sk_plugins.api_inventory import Inventory
 
-from dotenv import load_dotenv
+from sk_runtime.kernel_provider import KernelProvider, LazyPlugin
+from sk_runtime.deployment_router import load_deployments
+from sk_runtime.admission import BUSY_MESSAGE, enable_admission_control, is_rate_limited
+from sk_runtime.chainlit_steps import tool_step_filter
+from sk_runtime.turn_metrics import track_turn
+from sk_runtime.turn_trace import RecordingChatCompletion, enable_turn_recording, trace_filter
+from sk_runtime.result_shaping import result_shaping_filter
+from sk_runtime.single_flight import single_flight_filter
+from sk_runtime.telemetry import configure_telemetry, instrumentation_filter, record_llm_usage, shutdown_telemetry
+from sk_runtime.session_store import get_session_store, new_session_id
+from sk_runtime.answer_cache import get_answer_cache
+from sk_runtime.intent_router import create_intent_router, prefetch_filter, speculate, stream_with_fallback
+
+if TYPE_CHECKING:
+    # The OpenAI connector is imported when the kernel is built (see kernel_provider.py)
+    from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion, AzureChatPromptExecutionSettings
  
 # -------------------------------
 # Configuration and Environment Setup
@@ -26,74 +36,135 @@ from dotenv import load_dotenv
 # Configure logging to output timestamps, level, and message
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
  
-# Load environment variables from .env file (for API keys and endpoints)
-load_dotenv()
- 
-# Retrieve Azure OpenAI configuration from environment variables
-AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
-AZURE_OPENAI_ENDPOINT_OLD = os.getenv("AZURE_OPENAI_ENDPOINT_OLD")
-AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4.1")
-AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview")
-AZURE_OPENAI_PROMPT = os.getenv("AZURE_OPENAI_PROMPT")
+# Azure OpenAI configuration, read once from the environment (and .env file)
+settings = get_settings()
+AZURE_OPENAI_API_KEY = settings.azure_openai_api_key
+AZURE_OPENAI_ENDPOINT_OLD = settings.azure_openai_endpoint_old
+AZURE_OPENAI_DEPLOYMENT = settings.azure_openai_deployment
+AZURE_OPENAI_API_VERSION = settings.azure_openai_api_version
+AZURE_OPENAI_PROMPT = settings.azure_openai_prompt
+
+IMAGE_PREFIX = "data:image/png;base64,"
+# Resume a CLI conversation across runs (with SESSION_STORE=sqlite); a new one is started otherwise
+CLI_SESSION_ID = os.getenv("CLI_SESSION_ID")
  
-history = ChatHistory()
+# Chat histories of the CLI and every Chainlit session, kept outside the session objects
+# so they can be shared by several workers and survive restarts (see SESSION_STORE)
+session_store = get_session_store()
 # -------------------------------
 # Kernel Initialization and Plugin Registration
 # -------------------------------
  
-def initialize_kernel() -> Tuple[Kernel, AzureChatCompletion]:
+# Concurrency limit, fair per-session queueing, quota tracking and 429 retries for
+# every Azure OpenAI request of this process
+admission = enable_admission_control()
+# Each turn's messages, tool calls and timings go to TURN_TRACE_FILE when set (replayed by benchmarks/replay_traces.py)
+turn_recorder = enable_turn_recording()
+
+# Built lazily on first use and shared by the CLI loop and every Chainlit session,
+# so a turn no longer pays for a new Kernel, HTTP client and plugin registration.
+kernel_provider = KernelProvider(
+    deployment_name=AZURE_OPENAI_DEPLOYMENT,
+    api_key=AZURE_OPENAI_API_KEY,
+    base_url=AZURE_OPENAI_ENDPOINT_OLD,
+    api_version=AZURE_OPENAI_API_VERSION,
+    # Several deployments (AZURE_OPENAI_DEPLOYMENTS) are routed by latency and health, with failover
+    deployments=load_deployments(),
+    chat_service_mixins=[RecordingChatCompletion] if turn_recorder else [],
+    # Imported with the kernel build, not at startup
+    plugins={
+        "ai_search_index_2": LazyPlugin("sk_plugins.ai_search_index_2:AiSearch2"),
+        "ai_search_index": LazyPlugin("sk_plugins.ai_search_index:AiSearch"),
+        "web_search": LazyPlugin("sk_plugins.web_search:GoogleWebSearch"),
+        "api_inventory": LazyPlugin("sk_plugins.api_inventory:Inventory"),
+        "park_search": LazyPlugin("sk_plugins.park_retrieval:ParkRetrieval"),
+    },
+    filters=[
+        ("function_invocation", tool_step_filter),
+        ("function_invocation", instrumentation_filter),
+        # Records the call for the turn trace, with the result as the model receives it
+        ("function_invocation", trace_filter),
+        # Compacts and budgets tool results; inside instrumentation so it records what the model receives
+        ("function_invocation", result_shaping_filter),
+        # Serves speculative prefetches while steps and telemetry still see the call
+        ("function_invocation", prefetch_filter),
+        # Innermost: identical calls already in flight share one backend request
+        ("function_invocation", single_flight_filter),
+    ],
+)
+configure_telemetry("appchainlit")
+# Narrows the advertised tools and prefetches retrieval for confidently classified questions
+intent_router = create_intent_router(kernel_provider.plugin_factories)
+ 
+def initialize_kernel() -> Tuple[Kernel, "AzureChatCompletion"]:
     """
-    Initialize the Semantic Kernel with Azure OpenAI service and register workflow plugins.
+    Return the process-wide Semantic Kernel and Azure OpenAI service with all workflow plugins registered.
+   
+    The kernel and service are built on the first call and reused afterwards.
    
     Returns:
         A tuple containing:
          - kernel: The initialized Semantic Kernel instance.
          - chat_completion: The AzureChatCompletion service instance.
     """
-    kernel = Kernel()
- 
-    try:
-        # Initialize and add the Azure Chat Completion service to the kernel
-        chat_completion = AzureChatCompletion(
-            deployment_name=AZURE_OPENAI_DEPLOYMENT,
-            api_key=AZURE_OPENAI_API_KEY,
-            base_url=AZURE_OPENAI_ENDPOINT_OLD,
-            api_version=AZURE_OPENAI_API_VERSION
-        )
-        kernel.add_service(chat_completion)
-        logging.info("Azure OpenAI chat completion service added.")
-    except Exception as e:
-        logging.error(f"Error initializing Azure OpenAI service: {e}")
-        raise e
- 
-    try:
-        # Register all workflow plugins with the kernel
-        kernel.add_plugin(AiSearch2(), plugin_name="ai_search_index_2")
-        kernel.add_plugin(AiSearch(), plugin_name="ai_search_index")
-        kernel.add_plugin(GoogleWebSearch(), plugin_name="web_search")
-        kernel.add_plugin(Inventory(), plugin_name="api_inventory")
-
-        logging.info("All workflow plugins registered successfully.")
-    except Exception as e:
-        logging.error(f"Error registering plugins: {e}")
-        raise e
- 
-    return kernel, chat_completion
+    return kernel_provider.kernel, kernel_provider.chat_completion
  
 # -------------------------------
 # Execution Settings Setup
 # -------------------------------
  
-def setup_execution_settings() -> AzureChatPromptExecutionSettings:
+def setup_execution_settings(included_plugins: Optional[List[str]] = None) -> "AzureChatPromptExecutionSettings":
     """
     Set up and return the execution settings for the Azure chat prompt.
    
+    Args:
+        included_plugins: Plugins the model may call (all when None), e.g. as narrowed by the intent router.
+   
     Returns:
         An AzureChatPromptExecutionSettings instance with auto function choice behavior.
     """
-    settings = AzureChatPromptExecutionSettings()
-    settings.function_choice_behavior = FunctionChoiceBehavior.Auto()
-    return settings
+    from semantic_kernel.connectors.ai.open_ai import AzureChatPromptExecutionSettings
+
+    execution_settings = AzureChatPromptExecutionSettings()
+    if included_plugins is None:
+        execution_settings.function_choice_behavior = FunctionChoiceBehavior.Auto()
+    else:
+        execution_settings.function_choice_behavior = FunctionChoiceBehavior.Auto(filters={"included_plugins": included_plugins})
+    return execution_settings
+ 
+# -------------------------------
+# Streaming Turn Helper
+# -------------------------------
+ 
+async def stream_reply(
+    kernel: Kernel,
+    chat_completion: "AzureChatCompletion",
+    chat_history: ChatHistory,
+    execution_settings: "AzureChatPromptExecutionSettings",
+) -> AsyncIterator[str]:
+    """
+    Stream the assistant's reply to the history's latest user message, running tool calls automatically.
+   
+    Args:
+        kernel: The Semantic Kernel with the workflow plugins.
+        chat_completion: The AzureChatCompletion service instance.
+        chat_history: The conversation so far, ending with the user's message.
+        execution_settings: Per-turn execution settings.
+   
+    Yields:
+        Non-empty text chunks as they arrive.
+    """
+    response = chat_completion.get_streaming_chat_message_content(
+        chat_history=chat_history,
+        settings=execution_settings,
+        kernel=kernel,
+    )
+    async for chunk in response:
+        # One chunk per model request carries its token usage
+        record_llm_usage(chunk)
+        text_chunk = str(chunk) if chunk else ""
+        if text_chunk:
+            yield text_chunk
  
 # -------------------------------
 # Interactive Chat Loop with Streaming Response
@@ -102,8 +173,8 @@ def setup_execution_settings() -> AzureChatPromptExecutionSettings:
  
 async def interactive_chat(
     kernel: Kernel,
-    execution_settings: AzureChatPromptExecutionSettings,
-    chat_completion: AzureChatCompletion,
+    execution_settings: "AzureChatPromptExecutionSettings",
+    chat_completion: "AzureChatCompletion",
 ) -> None:
     """
     Main interactive chat loop that handles user input and outputs AI responses using streaming.
@@ -115,9 +186,9 @@ async def interactive_chat(
     """
  
  
-    # Define the system prompt to set context and guidelines for the AI assistant
-    system_prompt = AZURE_OPENAI_PROMPT
-    history.add_system_message(system_prompt)
+    # Token-budgeted history seeded with the system prompt that sets context and guidelines for the assistant
+    session_id = CLI_SESSION_ID or new_session_id()
+    history = await session_store.history(session_id, system_prompt=AZURE_OPENAI_PROMPT, service=chat_completion)
  
     # Start the interactive chat loop
     while True:
@@ -138,31 +209,31 @@ async def interactive_chat(
             logging.warning("Empty input received. Please provide a valid request.")
             continue
  
-        # Add the user's message to chat history
+        # Add the user's message to chat history and keep it within the token budget
         history.add_user_message(user_input)
+        await history.reduce()
  
         try:
             # Request a streaming response from Azure OpenAI
-            response = chat_completion.get_streaming_chat_message_content(
-                chat_history=history,
-                settings=execution_settings,
-                kernel=kernel,
-            )
+            response = stream_reply(kernel, chat_completion, history, execution_settings)
             # Initialize a variable to accumulate the full response
             assistant_message = ""
             # Process and display response chunks as they are received
-            async for chunk in response:
-                text_chunk = str(chunk)  # Ensure chunk is a string
+            async for text_chunk in response:
                 print(text_chunk, end="", flush=True)
                 assistant_message += text_chunk
         except Exception as e:
             logging.error(f"Error during streaming chat completion: {e}")
-            assistant_message = "An error occurred while processing your request. Please try again."
+            if is_rate_limited(e):
+                assistant_message = BUSY_MESSAGE
+            else:
+                assistant_message = "An error occurred while processing your request. Please try again."
  
         # Print a new line after streaming completes
         print()
         # Add the complete assistant message to the chat history
         history.add_message({"role": "assistant", "content": assistant_message})
+        await session_store.save(session_id)
  
 # -------------------------------
 # Main Function: Entry Point of the Application
@@ -181,6 +252,8 @@ async def main() -> None:
     execution_settings = setup_execution_settings()
     # Start the interactive chat loop with streaming response
     await interactive_chat(kernel, execution_settings, chat_completion)
+    await kernel_provider.aclose()
+    shutdown_telemetry()
     logging.info("Chat session ended.")
  
 # -------------------------------
@@ -192,14 +265,31 @@ if __name__ == "__main__":
         asyncio.run(main())
     except Exception as e:
         logging.error(f"Application terminated with error: {e}")
- 
-history.add_system_message(AZURE_OPENAI_PROMPT)
+
+@cl.on_app_startup
+async def on_app_startup():
+    # Build the shared kernel and open the Azure OpenAI connection pool before the first user arrives
+    # (in the background by default, so the server is up meanwhile; see WARM_UP)
+    if settings.warm_up == "background":
+        kernel_provider.start_warm_up()
+    elif settings.warm_up == "blocking":
+        await kernel_provider.warm_up()
+    await session_store.purge()
+
+
+@cl.on_app_shutdown
+async def on_app_shutdown():
+    await kernel_provider.aclose()
+    shutdown_telemetry()
+
 
 @cl.on_chat_start
 async def on_chat_start():    
-    historychainlit = ChatHistory()
-    historychainlit.add_system_message(AZURE_OPENAI_PROMPT)
-    cl.user_session.set(cl.user_session.get("id"), historychainlit)
+    # Creates the session's history (or picks up a persisted one, e.g. after a worker restart)
+    await kernel_provider.ready()
+    await session_store.history(
+        cl.user_session.get("id"), system_prompt=AZURE_OPENAI_PROMPT, service=kernel_provider.chat_completion
+    )
     print("========= on_chat_start ==========")
     
     print(cl.user_session.get("id"))
@@ -212,40 +302,83 @@ async def handle_message(message: cl.Message):
     Calls Semantic Kernel with the user query and returns the response.
     """
     
-    historychainlit = cl.user_session.get(cl.user_session.get("id"))
+    session_id = cl.user_session.get("id")
     print("========= on_message ==========")
     user_input = message.content.strip()
  
-    # Initialize Semantic Kernel and Chat Service
-    kernel, chat_completion = initialize_kernel()
-    settings = setup_execution_settings()
+    # Reuse the shared Semantic Kernel and Chat Service; settings are per turn
+    await kernel_provider.ready()
+    kernel, chat_completion = kernel_provider.kernel, kernel_provider.chat_completion
+    # Loaded from the session store, so any worker can serve the session
+    historychainlit = await session_store.history(session_id, system_prompt=AZURE_OPENAI_PROMPT, service=chat_completion)
    
-    # Maintain chat history
+    # Maintain chat history within its token budget (older turns are summarized in the background)
     historychainlit.add_user_message(user_input)
+    user_message = historychainlit.messages[-1]
+    try:
+        await historychainlit.reduce()
    
  
-    # Get AI response
-    result = await chat_completion.get_chat_message_content(
-        chat_history=historychainlit,
-        settings=settings,
-        kernel=kernel,
-    )
- 
-    response_text = str(result)  # Convert response to string
-    historychainlit.add_message({"role": "assistant", "content": response_text})
-    #await cl.Message(content=response_text).send()
-    # If response is a base64 image, show it as an image element
-    if response_text.startswith("data:image/png;base64,"):
-        await cl.Message(
-            content="Here is the generated plot:",
-            elements=[
-                cl.Image(
-                    name="Financial Plot",
-                    display="inline",
-                    image=response_text  # this is the base64 image string
-                )
-            ]
-        ).send()
-    else:
-        # If it's a regular text response
-        await cl.Message(content=response_text).send()
+        # Stream the AI response token by token; tool calls show up as steps via tool_step_filter
+        msg = cl.Message(content="")
+        response_text = ""
+        streamed = False
+        answer_cache = get_answer_cache("appchainlit")
+        with track_turn("appchainlit", session_id, question=user_input) as metrics:
+            # Repeat FAQ questions are answered from recent answers whose data is still current
+            cached = await answer_cache.lookup(user_input) if answer_cache else None
+            if cached is not None:
+                metrics.answer_cache_hit = True
+                metrics.mark_first_token()
+                response_text = cached.answer
+                await msg.stream_token(response_text)
+                streamed = True
+            else:
+                # Settings are per turn: the router may narrow the tools to the likely intents
+                route = intent_router.route(user_input, kernel) if intent_router else None
+                metrics.intent = route.intent if route else None
+                with speculate(route, user_input):
+                    # A narrowed reply that used none of its tools is asked again with all of them
+                    replies = stream_with_fallback(
+                        route,
+                        historychainlit,
+                        lambda plugins: stream_reply(kernel, chat_completion, historychainlit, setup_execution_settings(plugins)),
+                    )
+                    async for text_chunk in replies:
+                        metrics.mark_first_token()
+                        response_text += text_chunk
+                        # Hold back anything that may still turn out to be a base64 image payload
+                        if response_text.startswith(IMAGE_PREFIX) or IMAGE_PREFIX.startswith(response_text):
+                            continue
+                        await msg.stream_token(text_chunk if streamed else response_text)
+                        streamed = True
+                if intent_router:
+                    await intent_router.record(user_input, metrics.tools, route)
+                if answer_cache and not response_text.startswith(IMAGE_PREFIX):
+                    await answer_cache.store(user_input, response_text, metrics)
+ 
+            historychainlit.add_message({"role": "assistant", "content": response_text})
+            # Appends only the messages of this turn
+            await session_store.save(session_id)
+            # If response is a base64 image, show it as an image element
+            if response_text.startswith(IMAGE_PREFIX):
+                msg.content = "Here is the generated plot:"
+                msg.elements = [
+                    cl.Image(
+                        name="Financial Plot",
+                        display="inline",
+                        image=response_text  # this is the base64 image string
+                    )
+                ]
+            elif not streamed:
+                # Short responses that never left the image-prefix buffer
+                msg.content = response_text
+            await msg.send()
+    except Exception as e:
+        # Drop the failed turn (the question and any tool calls made for it) so it does not stay unanswered in the history
+        messages = historychainlit.messages
+        for index in range(len(messages) - 1, -1, -1):
+            if messages[index] is user_message:
+                del messages[index:]
+                break
+        await cl.Message(content=BUSY_MESSAGE if is_rate_limited(e) else f"Error: {e}").send()
@@ -0,0 +1,151 @@
+"""
+Cold start of each entry point: framework import, app import and time to a built kernel.
+
+Every run is a fresh interpreter, so nothing is shared between samples. For each
+entry point the child process times, in order:
+
+  framework   importing what the host loads before the app (chainlit / azure.functions)
+  import      executing the app module (what `chainlit run` or the Functions host waits for)
+  ready       what the first request would still pay for: the kernel, chat service and
+              plugins (Chainlit apps) or the parsed inventory (Function app)
+
+No network calls are made. Run from the repository root:
+
+    python benchmarks/bench_cold_start.py --runs 5
+    python benchmarks/bench_cold_start.py --entry appchainlit --importtime 15
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# entry point -> (framework module, app file, working directory)
+ENTRY_POINTS: Dict[str, Tuple[str, str, str]] = {
+    "appchainlit": ("chainlit", "appchainlit.py", ROOT),
+    "appchainlit-agent": ("chainlit", "appchainlit-agent.py", ROOT),
+    "function_app": ("azure.functions", "function_app.py", os.path.join(ROOT, "api_function_app")),
+}
+
+# Dummy configuration so the services can be constructed offline
+ENVIRONMENT = {
+    "AZURE_OPENAI_API_KEY": "benchmark-key",
+    "AZURE_OPENAI_ENDPOINT": "https://benchmark.openai.azure.com/",
+    "AZURE_OPENAI_ENDPOINT_OLD": "https://benchmark.openai.azure.com/openai",
+    "AZURE_OPENAI_API_VERSION": "2025-01-01-preview",
+    "AZURE_SEARCH_ENDPOINT": "https://benchmark.search.windows.net",
+    "AZURE_SEARCH_INDEX": "guide",
+    "AZURE_SEARCH_API_KEY": "benchmark-key",
+    "AZURE_SEARCH_ENDPOINT_2": "https://benchmark.search.windows.net",
+    "AZURE_SEARCH_INDEX_2": "map",
+    "AZURE_SEARCH_API_KEY_2": "benchmark-key",
+}
+
+# Written to stderr between the framework and the app imports (for -X importtime)
+MARKER = "-- app --"
+
+CHILD = r"""
+import os, sys, json, time, importlib, importlib.util
+framework, path, MARKER = sys.argv[1], sys.argv[2], sys.argv[3]
+sys.path.insert(0, os.getcwd())
+started = time.perf_counter()
+try:
+    importlib.import_module(framework)
+except ImportError as e:
+    print(json.dumps({"skipped": f"{framework} is not installed ({e})"}))
+    sys.exit(0)
+imported_framework = time.perf_counter()
+print(MARKER, file=sys.stderr, flush=True)
+name = os.path.splitext(os.path.basename(path))[0].replace("-", "_")
+spec = importlib.util.spec_from_file_location(name, path)
+module = importlib.util.module_from_spec(spec)
+sys.modules[name] = module
+spec.loader.exec_module(module)
+imported_app = time.perf_counter()
+if hasattr(module, "kernel_provider"):
+    module.kernel_provider.kernel
+    if hasattr(module, "get_agent"):
+        module.get_agent()
+else:
+    module.get_inventory_store()
+ready = time.perf_counter()
+print(json.dumps({
+    "framework_ms": (imported_framework - started) * 1000,
+    "import_ms": (imported_app - imported_framework) * 1000,
+    "ready_ms": (ready - imported_app) * 1000,
+    "sdk_modules": sum(1 for m in sys.modules if m.startswith(("semantic_kernel", "azure", "openai"))),
+}))
+"""
+
+
+def _child_env() -> Dict[str, str]:
+    env = dict(os.environ)
+    for key, value in ENVIRONMENT.items():
+        env.setdefault(key, value)
+    # No database to open: the store is not part of the cold start being measured
+    env.setdefault("SESSION_STORE", "memory")
+    return env
+
+
+def run_once(entry: str, importtime: bool = False) -> Tuple[Optional[dict], str]:
+    framework, path, cwd = ENTRY_POINTS[entry]
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", CHILD, framework, os.path.join(cwd, path), MARKER]
+    completed = subprocess.run(command, cwd=cwd, env=_child_env(), capture_output=True, text=True)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith("{")]
+    if completed.returncode != 0 or not lines:
+        raise RuntimeError(f"{entry} failed:\n{completed.stderr[-2000:]}")
+    return json.loads(lines[-1]), completed.stderr
+
+
+def top_imports(stderr: str, limit: int) -> List[Tuple[int, str]]:
+    """Modules imported after the framework (app import and first build), by cumulative import time (us)."""
+    rows = []
+    lines = stderr.splitlines()
+    for line in lines[lines.index(MARKER) + 1:] if MARKER in lines else []:
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # Depth 0 or 1: the app's own imports and what they pull in directly
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1:
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold-start (import and first-kernel) time per entry point.")
+    parser.add_argument("--entry", action="append", choices=sorted(ENTRY_POINTS), help="Entry point (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--importtime", type=int, default=0, metavar="N", help="Also list the N slowest imports of the app")
+    args = parser.parse_args()
+
+    print(f"{'entry point':<20}{'framework ms':>14}{'import ms':>12}{'ready ms':>11}{'total ms':>11}{'SDK modules':>13}")
+    for entry in args.entry or list(ENTRY_POINTS):
+        samples = []
+        for _ in range(args.runs):
+            sample, _ = run_once(entry)
+            if "skipped" in sample:
+                break
+            samples.append(sample)
+        if not samples:
+            print(f"{entry:<20}skipped: {sample['skipped']}")
+            continue
+        medians = {key: statistics.median(s[key] for s in samples) for key in ("framework_ms", "import_ms", "ready_ms")}
+        total = sum(medians.values())
+        modules = samples[-1]["sdk_modules"]
+        print(
+            f"{entry:<20}{medians['framework_ms']:>14.0f}{medians['import_ms']:>12.0f}"
+            f"{medians['ready_ms']:>11.0f}{total:>11.0f}{modules:>13}"
+        )
+        if args.importtime:
+            _, stderr = run_once(entry, importtime=True)
+            for cumulative, name in top_imports(stderr, args.importtime):
+                print(f"    {cumulative / 1000:>9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
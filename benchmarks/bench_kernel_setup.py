@@ -0,0 +1,99 @@
+"""
+Per-turn kernel setup overhead: legacy per-message initialization vs. the shared KernelProvider.
+
+No network calls are made; only object construction, client creation and plugin
+registration are measured. Run from the repository root:
+
+    python benchmarks/bench_kernel_setup.py --turns 200
+"""
+import os
+import sys
+import time
+import argparse
+import asyncio
+import statistics
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Dummy configuration so the services can be constructed offline
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "benchmark-key")
+os.environ.setdefault("AZURE_OPENAI_ENDPOINT_OLD", "https://benchmark.openai.azure.com/openai")
+os.environ.setdefault("AZURE_OPENAI_API_VERSION", "2025-01-01-preview")
+
+from semantic_kernel import Kernel
+from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+
+from sk_plugins.web_search import GoogleWebSearch
+from sk_plugins.ai_search_index import AiSearch
+from sk_plugins.ai_search_index_2 import AiSearch2
+from sk_plugins.api_inventory import Inventory
+from sk_runtime.kernel_provider import KernelProvider
+from sk_runtime.session_store import get_session_store, new_session_id
+
+PLUGINS = {
+    "ai_search_index_2": AiSearch2,
+    "ai_search_index": AiSearch,
+    "web_search": GoogleWebSearch,
+    "api_inventory": Inventory,
+}
+
+
+async def legacy_turn() -> None:
+    """What `handle_message` used to do on every message."""
+    kernel = Kernel()
+    chat_completion = AzureChatCompletion(
+        deployment_name="gpt-4.1",
+        api_key=os.environ["AZURE_OPENAI_API_KEY"],
+        base_url=os.environ["AZURE_OPENAI_ENDPOINT_OLD"],
+        api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+    )
+    kernel.add_service(chat_completion)
+    for name, factory in PLUGINS.items():
+        kernel.add_plugin(factory(), plugin_name=name)
+
+
+async def measure(label: str, turn, turns: int) -> None:
+    samples = []
+    tracemalloc.start()
+    for _ in range(turns):
+        start = time.perf_counter()
+        await turn()
+        samples.append((time.perf_counter() - start) * 1000)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(
+        f"{label:<10} turns={turns:<5} mean={statistics.mean(samples):8.3f} ms  "
+        f"p50={statistics.median(samples):8.3f} ms  p95={p95:8.3f} ms  peak_alloc={peak / 1024:9.1f} KiB"
+    )
+
+
+async def run(turns: int) -> None:
+    provider = KernelProvider(
+        deployment_name="gpt-4.1",
+        api_key=os.environ["AZURE_OPENAI_API_KEY"],
+        base_url=os.environ["AZURE_OPENAI_ENDPOINT_OLD"],
+        api_version=os.environ["AZURE_OPENAI_API_VERSION"],
+        plugins=PLUGINS,
+    )
+    session_store = get_session_store()
+
+    async def provider_turn() -> None:
+        """What `handle_message` does now: the shared kernel and service, plus a (new) session history."""
+        await provider.ready()
+        kernel, chat_completion = provider.kernel, provider.chat_completion
+        await session_store.history(new_session_id(), system_prompt="benchmark", service=chat_completion)
+
+    await measure("legacy", legacy_turn, turns)
+    # First access pays for the one-off build; every later session/turn only gets its history
+    await measure("provider", provider_turn, turns)
+    await provider.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args.turns))
@@ -0,0 +1,188 @@
+"""
+In-process hybrid retrieval (sk_runtime/local_index.py) vs. the remote Azure AI Search index.
+
+For every question both backends are queried uncached; the report shows latency
+percentiles per backend and recall@top of the local results, with the remote
+results as the reference.
+
+Offline (default): the remote side is the fake search service from fake_services.py
+(use --search-latency-ms etc. to model the network) and the local indexes are built
+from the same fake corpora with the hashing embedder.
+
+Against the real services: build the local indexes first and configure the usual
+.env, then pass --real:
+
+    python -m sk_runtime.local_index build --from-search guide --out indexes/guide
+    python -m sk_runtime.local_index build --from-search map --out indexes/map
+    python benchmarks/bench_local_index.py --real --guide-index indexes/guide --map-index indexes/map
+
+    python benchmarks/bench_local_index.py --repeat 20 --search-latency-ms 60
+    python benchmarks/bench_local_index.py --synthetic-chunks 100000 --dim 1536
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import GUIDE_CHUNKS, MAP_CHUNKS, FakeServices, add_profile_arguments, config_from_args  # noqa: E402
+from load_test import QUESTIONS  # noqa: E402
+
+EXTRA_QUESTIONS = [
+    "How much are stingray feeding cups?",
+    "Where are the lockers?",
+    "What can I eat at the park?",
+    "How do I get to the Lagoon Touch Pool?",
+    "How old do you have to be for the penguin encounter?",
+    "Where does the penguin encounter start?",
+    "When is the sea lion keeper talk?",
+    "Where is first aid?",
+]
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 3)
+
+
+def _latency(samples: List[float]) -> Dict[str, Any]:
+    return {"p50_ms": _percentile(samples, 0.50), "p95_ms": _percentile(samples, 0.95), "max_ms": round(max(samples), 3)}
+
+
+async def compare(label: str, plugin: Any, local: Any, questions: List[str], repeat: int, top: int) -> Dict[str, Any]:
+    """Query the plugin's remote index and the local index with the same questions."""
+    remote_ms, local_ms, recalls = [], [], []
+    for _ in range(repeat):
+        for question in questions:
+            started = time.perf_counter()
+            remote = [text for text in await plugin._search(question) if text]
+            remote_ms.append((time.perf_counter() - started) * 1000)
+
+            # The first query of a question pays for its embedding; later ones hit the query-embedding cache
+            started = time.perf_counter()
+            hits = await local.search(question, top=top)
+            local_ms.append((time.perf_counter() - started) * 1000)
+
+            if remote:
+                recalls.append(len({hit.text for hit in hits} & set(remote)) / len(remote))
+    return {
+        "index": label,
+        "chunks": local.count,
+        "queries": len(remote_ms),
+        "remote": _latency(remote_ms),
+        "local": _latency(local_ms),
+        f"recall_at_{top}": round(sum(recalls) / len(recalls), 3) if recalls else None,
+        "query_embedding_cache": {"hits": local.embeddings.hits, "misses": local.embeddings.misses},
+    }
+
+
+async def synthetic(count: int, dim: int, queries: int) -> Dict[str, Any]:
+    """Local-only latency at a larger corpus size (random vectors, filler text)."""
+    from sk_runtime.local_index import LocalIndex, build_index
+
+    rng = np.random.default_rng(7)
+    words = (" ".join(GUIDE_CHUNKS + MAP_CHUNKS)).split()
+    vectors = rng.standard_normal((count, dim)).astype(np.float32)
+    chunks = [(" ".join(rng.choice(words, 40)), vector) for vector in vectors]
+    with tempfile.TemporaryDirectory() as out:
+        build_started = time.perf_counter()
+        await build_index(chunks, out, f"hashing:{dim}")
+        build_s = time.perf_counter() - build_started
+        index = LocalIndex(out)
+        samples = []
+        for question in (QUESTIONS + EXTRA_QUESTIONS)[:queries] * 3:
+            vector = rng.standard_normal(dim).astype(np.float32)
+            started = time.perf_counter()
+            index.rank(question, vector / np.linalg.norm(vector), top=3)
+            samples.append((time.perf_counter() - started) * 1000)
+        return {"chunks": count, "dim": dim, "build_s": round(build_s, 2), "rank": _latency(samples)}
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from sk_runtime.local_index import LocalIndex, build_index
+
+    questions = QUESTIONS + EXTRA_QUESTIONS
+    report: Dict[str, Any] = {"results": []}
+    with tempfile.TemporaryDirectory() as scratch:
+        guide_path, map_path = args.guide_index, args.map_index
+        if not args.real:
+            guide_path, map_path = os.path.join(scratch, "guide"), os.path.join(scratch, "map")
+            await build_index([(text, None) for text in GUIDE_CHUNKS], guide_path, "hashing:2048")
+            await build_index([(text, None) for text in MAP_CHUNKS], map_path, "hashing:2048")
+
+        from sk_plugins.ai_search_index import AiSearch
+        from sk_plugins.ai_search_index_2 import AiSearch2
+        from sk_runtime.search_clients import close_search_indexes
+
+        try:
+            for label, plugin, path in (("guide", AiSearch(), guide_path), ("map", AiSearch2(), map_path)):
+                if path:
+                    report["results"].append(await compare(label, plugin, LocalIndex(path), questions, args.repeat, args.top))
+        finally:
+            await close_search_indexes()
+    if args.synthetic_chunks:
+        report["synthetic"] = await synthetic(args.synthetic_chunks, args.dim, len(questions))
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    for result in report["results"]:
+        print(f"\n=== {result['index']}: {result['chunks']} chunks, {result['queries']} queries ===")
+        for backend in ("remote", "local"):
+            latency = result[backend]
+            print(f"{backend:<7} p50/p95/max : {latency['p50_ms']} / {latency['p95_ms']} / {latency['max_ms']} ms")
+        recall = next(value for key, value in result.items() if key.startswith("recall_at_"))
+        print(f"recall vs remote    : {recall}")
+        print(f"query embeddings    : {result['query_embedding_cache']}")
+    if "synthetic" in report:
+        synthetic_result = report["synthetic"]
+        rank = synthetic_result["rank"]
+        print(f"\n=== local only: {synthetic_result['chunks']} chunks x {synthetic_result['dim']} dims ===")
+        print(f"build               : {synthetic_result['build_s']} s")
+        print(f"rank p50/p95/max    : {rank['p50_ms']} / {rank['p95_ms']} / {rank['max_ms']} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--real", action="store_true", help="Compare against the Azure AI Search indexes configured in .env")
+    parser.add_argument("--guide-index", default=os.getenv("LOCAL_INDEX_PATH"), help="Local guide index (with --real)")
+    parser.add_argument("--map-index", default=os.getenv("LOCAL_INDEX_PATH_2"), help="Local map index (with --real)")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the question set")
+    parser.add_argument("--top", type=int, default=3)
+    parser.add_argument("--synthetic-chunks", type=int, default=0, help="Also time the local engine on N random chunks")
+    parser.add_argument("--dim", type=int, default=1536, help="Vector size for --synthetic-chunks")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    services = None
+    if not args.real:
+        services = FakeServices(config_from_args(args), port=args.port).start()
+        os.environ.update(services.environment())
+        # Compare against the remote path of the plugins regardless of the local .env
+        os.environ["AZURE_SEARCH_BACKEND"] = os.environ["AZURE_SEARCH_BACKEND_2"] = "remote"
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        if services is not None:
+            services.stop()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
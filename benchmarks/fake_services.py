@@ -0,0 +1,527 @@
+"""
+Local stand-ins for every backend the apps call, served by one FastAPI app.
+
+Routes (all on the same host/port):
+  POST /openai/deployments/{deployment}/chat/completions   Azure OpenAI chat completions (tool calls + SSE streaming)
+  POST /indexes('{index}')/docs/search.post.search         Azure AI Search REST query
+  GET  /customsearch/v1                                     Google Custom Search JSON API
+  GET  /pages/{n}                                           HTML result pages linked from the search results
+  GET  /api/shops_inventory[/query|/facets|/bulk]           Inventory function app routes (bulk also POST, NDJSON streamed)
+
+Each service has its own latency / jitter / error-rate profile so load tests can model
+slow or flaky dependencies. Run standalone with:
+
+    python benchmarks/fake_services.py --port 8765 --llm-latency-ms 400
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "api_function_app"))
+
+from inventory_store import InventoryFile, bulk_arguments, ndjson_lines, wants_ndjson  # noqa: E402
+
+# -------------------------------
+# Service profiles
+# -------------------------------
+
+
+@dataclass
+class ServiceProfile:
+    """Latency and failure model for one fake backend."""
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    # HTTP status returned for injected errors (429 exercises retry/backoff paths)
+    error_status: int = 500
+
+    async def delay(self) -> None:
+        seconds = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if seconds:
+            await asyncio.sleep(seconds)
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+@dataclass
+class ScriptedReply:
+    """A chat completion to serve instead of the generated one, with its own timing (e.g. replayed from a trace)."""
+
+    # {"content": text} or {"tool_calls": [...]}, as returned by _plan_reply
+    reply: Dict[str, Any]
+    first_token_ms: float = 0.0
+    # Total time of the response, first token included
+    duration_ms: float = 0.0
+
+
+@dataclass
+class FakeConfig:
+    llm: ServiceProfile = field(default_factory=lambda: ServiceProfile(latency_ms=300, jitter_ms=100))
+    search: ServiceProfile = field(default_factory=lambda: ServiceProfile(latency_ms=80, jitter_ms=30))
+    web: ServiceProfile = field(default_factory=lambda: ServiceProfile(latency_ms=250, jitter_ms=80))
+    inventory: ServiceProfile = field(default_factory=lambda: ServiceProfile(latency_ms=40, jitter_ms=10))
+    # Delay between streamed tokens once the first token is out
+    token_delay_ms: float = 15.0
+    # Deployment quota per minute like Azure OpenAI's (0 = unlimited); exceeding it returns 429 + retry-after-ms
+    llm_rpm: int = 0
+    llm_tpm: int = 0
+    # Extra latency / failures per chat deployment name, on top of `llm`; when set, the apps are
+    # pointed at all of them through AZURE_OPENAI_DEPLOYMENTS (see sk_runtime/deployment_router.py)
+    deployments: Dict[str, ServiceProfile] = field(default_factory=dict)
+    # Chat request body -> reply to serve instead of the generated one (None: generate as usual);
+    # scripted replies replace the llm latency and error profiles
+    scripted_reply: Optional[Callable[[Dict[str, Any]], Optional[ScriptedReply]]] = None
+    # Request counters per service, for sanity checks in reports
+    calls: Dict[str, int] = field(default_factory=dict)
+
+
+# -------------------------------
+# Synthetic corpora
+# -------------------------------
+
+GUIDE_CHUNKS = [
+    "The dolphin show runs daily at 11:00, 14:00 and 17:00 at Dolphin Bay Theatre. Arrive 15 minutes early for seating.",
+    "Stingray feeding takes place at the Lagoon Touch Pool every hour from 10:00 to 16:00. Feeding cups cost 25 AED.",
+    "The park opens at 10:00 and closes at 20:00 on weekdays, and at 22:00 on Fridays and Saturdays.",
+    "Penguin encounters are available for guests aged 8 and above and must be booked in advance for 350 AED.",
+    "Lockers are located near the main entrance and at Ocean Explorer; day lockers cost 40 AED.",
+    "The Manta roller coaster has a minimum height requirement of 122 cm and closes during lightning storms.",
+    "Dining options include Seafood Grill, Polar Cafe and the Lagoon Snack Bar with halal and vegetarian menus.",
+    "Guests can meet the sea lions at Sea Lion Point during the 13:00 keeper talk every day.",
+]
+MAP_CHUNKS = [
+    "Dolphin Bay Theatre is in the Ocean Explorer zone, north of the main plaza next to Hamad's Hideaway shop.",
+    "The Lagoon Touch Pool is at the centre of the park, reached from the main plaza by the Coral Walkway.",
+    "Sea Lion Point is on the east shore beside the Polar Pier shop and the Polar Cafe.",
+    "The Manta coaster entrance is in the Abu Dhabi Ocean zone, west of the Lagoon.",
+    "First aid and guest services are next to the main entrance, opposite the lockers.",
+    "Penguin encounters start at the Endless Ice building in the Polar zone, south-east of the plaza.",
+]
+_WORD = re.compile(r"\w+")
+
+
+def _rank(chunks: List[str], query: str, top: int) -> List[str]:
+    words = set(_WORD.findall(query.casefold()))
+    scored = sorted(chunks, key=lambda chunk: -len(words & set(_WORD.findall(chunk.casefold()))))
+    return scored[:top]
+
+
+# -------------------------------
+# Fake chat completions
+# -------------------------------
+
+INVENTORY_WORDS = {"price", "cost", "toy", "toys", "shop", "shops", "plush", "buy", "souvenir", "stock", "sell", "hoodie"}
+MAP_WORDS = {"where", "direction", "directions", "location", "find", "map", "near", "located"}
+WEB_WORDS = {"weather", "news", "today", "tomorrow", "traffic"}
+
+
+def _pick_tool(tools: List[Dict[str, Any]], text: str) -> Optional[Dict[str, Any]]:
+    """Choose a tool the way a model plausibly would, from keywords in the user text."""
+    names = [tool["function"]["name"] for tool in tools if tool.get("type") == "function"]
+    if not names:
+        return None
+    words = set(_WORD.findall(text.casefold()))
+
+    def find(*needles: str) -> Optional[str]:
+        for needle in needles:
+            for name in names:
+                if needle in name:
+                    return name
+        return None
+
+    if words & INVENTORY_WORDS:
+        items = [w for w in ("dolphin", "jellyfish", "shark", "penguin", "turtle") if w in words]
+        bulk = find("compare_inventory_prices") if "compare" in words else find("lookup_inventory_items")
+        if len(items) > 1 and bulk:
+            name, arguments = bulk, {"items": items}
+        else:
+            name = find("query_inventory", "get_inventory")
+            arguments = {"item": items[0]} if items and "query_inventory" in (name or "") else {}
+    elif words & WEB_WORDS:
+        name, arguments = find("web_search"), {"query": text}
+    elif words & MAP_WORDS:
+        name, arguments = find("ai_search_index_2", "AiSearch2"), {"query": text}
+    else:
+        name, arguments = find("ai_search_index-", "AiSearch-"), {"query": text}
+    name = name or names[0]
+    return {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+
+def _last_user_text(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content")
+            if isinstance(content, list):
+                return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return content or ""
+    return ""
+
+
+def _plan_reply(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Decide between a tool call (first round trip of a turn) and a final answer."""
+    messages = body.get("messages", [])
+    tools = body.get("tools") or []
+    last_role = messages[-1].get("role") if messages else None
+    text = _last_user_text(messages)
+    if tools and last_role == "user":
+        tool_call = _pick_tool(tools, text)
+        if tool_call:
+            return {"tool_calls": [tool_call]}
+    tool_output = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "tool"), "")
+    summary = str(tool_output)[:160].replace("\n", " ")
+    answer = f"Here is what I found about '{text[:60]}': {summary or 'I do not have more details on that.'} Enjoy your visit!"
+    return {"content": answer}
+
+
+def _usage(body: Dict[str, Any], completion_text: str) -> Dict[str, int]:
+    # Tool definitions count towards the prompt, as they do for the real service
+    prompt_tokens = len(json.dumps(body.get("messages", []))) // 4 + len(json.dumps(body.get("tools", []))) // 4
+    completion_tokens = max(1, len(completion_text) // 4)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _chunk(model: str, completion_id: str, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+async def _stream(
+    config: FakeConfig, body: Dict[str, Any], model: str, reply: Dict[str, Any], stream_ms: Optional[float] = None
+) -> AsyncIterator[str]:
+    """SSE chunks of `reply`; `stream_ms` spreads them over that long after the first one instead of token_delay_ms."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    if "tool_calls" in reply:
+        calls = [dict(call, index=i) for i, call in enumerate(reply["tool_calls"])]
+        yield _chunk(model, completion_id, {"role": "assistant", "content": None, "tool_calls": calls})
+        if stream_ms:
+            await asyncio.sleep(stream_ms / 1000)
+        yield _chunk(model, completion_id, {}, "tool_calls")
+        completion_text = json.dumps(reply["tool_calls"])
+    else:
+        completion_text = reply["content"]
+        words = completion_text.split(" ")
+        token_delay_ms = config.token_delay_ms if stream_ms is None else stream_ms / len(words)
+        for i, word in enumerate(words):
+            token = word if i == 0 else f" {word}"
+            delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+            yield _chunk(model, completion_id, delta)
+            if token_delay_ms:
+                await asyncio.sleep(token_delay_ms / 1000)
+        yield _chunk(model, completion_id, {}, "stop")
+    if (body.get("stream_options") or {}).get("include_usage"):
+        usage = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                 "choices": [], "usage": _usage(body, completion_text)}
+        yield f"data: {json.dumps(usage)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+# -------------------------------
+# App factory
+# -------------------------------
+
+
+def create_app(config: Optional[FakeConfig] = None) -> FastAPI:
+    config = config or FakeConfig()
+    app = FastAPI()
+    app.state.config = config
+    inventory = InventoryFile(os.path.join(ROOT, "api_function_app", "shops_inventory.json"))
+
+    async def gate(service: str, profile: ServiceProfile) -> Optional[Response]:
+        config.calls[service] = config.calls.get(service, 0) + 1
+        await profile.delay()
+        if profile.should_fail():
+            headers = {"retry-after-ms": "200"} if profile.error_status == 429 else None
+            return JSONResponse({"error": {"code": str(profile.error_status), "message": f"injected {service} failure"}},
+                                status_code=profile.error_status, headers=headers)
+        return None
+
+    # (time, tokens) of the LLM requests admitted in the last minute
+    llm_window: Deque[Tuple[float, int]] = deque()
+
+    def llm_quota(body: Dict[str, Any]) -> Tuple[Optional[Response], Dict[str, str]]:
+        """Sliding one-minute RPM/TPM quota; returns a 429 when exceeded, else the remaining-quota headers."""
+        if not config.llm_rpm and not config.llm_tpm:
+            return None, {}
+        now = time.monotonic()
+        while llm_window and now - llm_window[0][0] >= 60:
+            llm_window.popleft()
+        tokens = _usage(body, "")["prompt_tokens"] + int(body.get("max_tokens") or body.get("max_completion_tokens") or 500)
+        used_requests, used_tokens = len(llm_window), sum(t for _, t in llm_window)
+        if (config.llm_rpm and used_requests + 1 > config.llm_rpm) or (config.llm_tpm and used_tokens + tokens > config.llm_tpm):
+            wait_ms = int((60 - (now - llm_window[0][0])) * 1000) + 1 if llm_window else 1000
+            config.calls["llm_throttled"] = config.calls.get("llm_throttled", 0) + 1
+            return JSONResponse({"error": {"code": "429", "message": "Rate limit is exceeded."}},
+                                status_code=429, headers={"retry-after-ms": str(wait_ms), "retry-after": str(wait_ms // 1000 + 1)}), {}
+        llm_window.append((now, tokens))
+        headers = {}
+        if config.llm_rpm:
+            headers["x-ratelimit-remaining-requests"] = str(config.llm_rpm - used_requests - 1)
+        if config.llm_tpm:
+            headers["x-ratelimit-remaining-tokens"] = str(config.llm_tpm - used_tokens - tokens)
+        return None, headers
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def chat_completions(deployment: str, request: Request):
+        body = await request.json()
+        scripted = config.scripted_reply(body) if config.scripted_reply else None
+        if scripted is None:
+            failure = await gate("llm", config.llm)
+            if failure:
+                return failure
+            if deployment in config.deployments:
+                failure = await gate(f"llm:{deployment}", config.deployments[deployment])
+                if failure:
+                    return failure
+        else:
+            config.calls["llm"] = config.calls.get("llm", 0) + 1
+            config.calls["llm_scripted"] = config.calls.get("llm_scripted", 0) + 1
+            await asyncio.sleep(scripted.first_token_ms / 1000)
+        throttled, quota_headers = llm_quota(body)
+        if throttled:
+            return throttled
+        reply = scripted.reply if scripted else _plan_reply(body)
+        stream_ms = max(0.0, scripted.duration_ms - scripted.first_token_ms) if scripted else None
+        model = body.get("model") or deployment
+        if body.get("stream"):
+            return StreamingResponse(_stream(config, body, model, reply, stream_ms), media_type="text/event-stream",
+                                     headers=quota_headers)
+        if stream_ms:
+            await asyncio.sleep(stream_ms / 1000)
+        message = {"role": "assistant", "content": reply.get("content")}
+        if "tool_calls" in reply:
+            message["tool_calls"] = reply["tool_calls"]
+        completion_text = reply.get("content") or json.dumps(reply.get("tool_calls"))
+        return JSONResponse(headers=quota_headers, content={
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if "tool_calls" in reply else "stop"}],
+            "usage": _usage(body, completion_text),
+        })
+
+    @app.post("/indexes('{index}')/docs/search.post.search")
+    async def search(index: str, request: Request):
+        body = await request.json()
+        failure = await gate("search", config.search)
+        if failure:
+            return failure
+        corpus = MAP_CHUNKS if "map" in index.lower() or index.endswith("2") else GUIDE_CHUNKS
+        hits = _rank(corpus, body.get("search") or "", int(body.get("top") or 3))
+        value = [{"@search.score": 1.0 / (i + 1), "chunk": text, "text": text} for i, text in enumerate(hits)]
+        result: Dict[str, Any] = {"value": value}
+        if body.get("count"):
+            result["@odata.count"] = len(corpus)
+        return result
+
+    @app.get("/customsearch/v1")
+    async def google(request: Request, q: str = "", num: int = 3):
+        failure = await gate("web", config.web)
+        if failure:
+            return failure
+        items = [
+            {"title": f"Result {i + 1} for {q}", "snippet": f"Public information about {q} (snippet {i + 1}).",
+             "link": f"{str(request.base_url).rstrip('/')}/pages/{i + 1}"}
+            for i in range(num)
+        ]
+        return {"items": items}
+
+    @app.get("/pages/{page}")
+    async def page(page: int):
+        failure = await gate("pages", config.web)
+        if failure:
+            return failure
+        paragraphs = "".join(f"<p>{text}</p>" for text in GUIDE_CHUNKS[page % 3:] + MAP_CHUNKS[:page])
+        html = (
+            f"<html><head><title>Page {page}</title><script>var tracking = 1;</script></head><body>"
+            f"<nav><a href='/'>Home</a><a href='/tickets'>Tickets</a></nav>"
+            f"<main><h1>Visitor information {page}</h1>{paragraphs}</main>"
+            f"<footer>Copyright</footer></body></html>"
+        )
+        return Response(html, media_type="text/html")
+
+    @app.get("/api/shops_inventory")
+    async def shops_inventory(request: Request):
+        failure = await gate("inventory", config.inventory)
+        if failure:
+            return failure
+        snapshot = inventory.current()
+        headers = {"ETag": f'"{snapshot.digest}"', "X-Inventory-Version": snapshot.digest}
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        return Response(snapshot.body, media_type="application/json", headers=headers)
+
+    @app.get("/api/shops_inventory/query")
+    async def shops_inventory_query(request: Request):
+        failure = await gate("inventory", config.inventory)
+        if failure:
+            return failure
+        params = dict(request.query_params)
+        fields = params.pop("fields", None)
+        for key in ("min_price", "max_price"):
+            if key in params:
+                params[key] = float(params[key])
+        for key in ("limit", "offset"):
+            if key in params:
+                params[key] = int(params[key])
+        if "in_stock" in params:
+            params["in_stock"] = params["in_stock"].lower() == "true"
+        snapshot = inventory.current()
+        result = snapshot.store.query(fields=fields.split(",") if fields else None, **params)
+        return JSONResponse(result, headers={"X-Inventory-Version": snapshot.digest})
+
+    @app.api_route("/api/shops_inventory/bulk", methods=["GET", "POST"])
+    async def shops_inventory_bulk(request: Request):
+        failure = await gate("inventory", config.inventory)
+        if failure:
+            return failure
+        params: Dict[str, Any] = dict(request.query_params)
+        if request.method == "POST":
+            params.update(await request.json())
+        try:
+            snapshot = inventory.current()
+            groups = snapshot.store.bulk(**bulk_arguments(params))
+        except (TypeError, ValueError) as e:
+            return Response(f"Invalid bulk request: {e}", status_code=400)
+        headers = {"X-Inventory-Version": snapshot.digest}
+        if wants_ndjson(params.get("format"), request.headers.get("accept")):
+            # Really streamed here, one line per row, so clients see the first rows early
+            return StreamingResponse(ndjson_lines(groups), media_type="application/x-ndjson", headers=headers)
+        return JSONResponse({"results": list(groups)}, headers=headers)
+
+    @app.get("/api/shops_inventory/facets")
+    async def shops_inventory_facets():
+        failure = await gate("inventory", config.inventory)
+        if failure:
+            return failure
+        snapshot = inventory.current()
+        return JSONResponse(snapshot.store.facets(), headers={"X-Inventory-Version": snapshot.digest})
+
+    return app
+
+
+class FakeServices:
+    """Runs the fake backends on a background uvicorn server."""
+
+    def __init__(self, config: Optional[FakeConfig] = None, host: str = "127.0.0.1", port: int = 8765) -> None:
+        self.config = config or FakeConfig()
+        self.host = host
+        self.port = port
+        self._server = uvicorn.Server(uvicorn.Config(create_app(self.config), host=host, port=port, log_level="warning"))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def environment(self) -> Dict[str, str]:
+        """Environment variables that point both apps and all plugins at the fakes."""
+        deployments = [
+            {"name": name, "base_url": f"{self.base_url}/openai", "deployment": name} for name in self.config.deployments
+        ]
+        return {
+            "AZURE_OPENAI_API_KEY": "fake-key",
+            "AZURE_OPENAI_API_VERSION": "2025-01-01-preview",
+            # The SDK settings only accept https endpoints, so the fakes are reached through base URLs
+            "AZURE_OPENAI_ENDPOINT": "https://fake-openai.openai.azure.com/",
+            "AZURE_OPENAI_BASE_URL": f"{self.base_url}/openai",
+            "AZURE_OPENAI_ENDPOINT_OLD": f"{self.base_url}/openai",
+            "AZURE_OPENAI_DEPLOYMENT": "gpt-4.1",
+            "AZURE_OPENAI_DEPLOYMENTS": json.dumps(deployments) if deployments else "",
+            "AZURE_OPENAI_PROMPT": "You are a helpful Water Theme Park assistant.",
+            "AZURE_OPENAI_PROMPT_NEWAPP": "You are a helpful Water Theme Park assistant.",
+            "AZURE_SEARCH_ENDPOINT": self.base_url,
+            "AZURE_SEARCH_INDEX": "guide-index",
+            "AZURE_SEARCH_API_KEY": "fake-key",
+            "AZURE_SEARCH_ENDPOINT_2": self.base_url,
+            "AZURE_SEARCH_INDEX_2": "map-index",
+            "AZURE_SEARCH_API_KEY_2": "fake-key",
+            "GOOGLE_API_KEY": "fake-key",
+            "GOOGLE_SEARCH_ENGINE_ID": "fake-cx",
+            "GOOGLE_SEARCH_URL": f"{self.base_url}/customsearch/v1",
+            "URL_retrieve_data": f"{self.base_url}/api/shops_inventory",
+        }
+
+    def start(self) -> "FakeServices":
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Fake services did not start within 10 seconds.")
+            time.sleep(0.05)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    """CLI flags for per-service latency and error injection (shared with the load test)."""
+    defaults = FakeConfig()
+    for service in ("llm", "search", "web", "inventory"):
+        profile: ServiceProfile = getattr(defaults, service)
+        parser.add_argument(f"--{service}-latency-ms", type=float, default=profile.latency_ms)
+        parser.add_argument(f"--{service}-jitter-ms", type=float, default=profile.jitter_ms)
+        parser.add_argument(f"--{service}-error-rate", type=float, default=profile.error_rate)
+        parser.add_argument(f"--{service}-error-status", type=int, default=profile.error_status)
+    parser.add_argument("--token-delay-ms", type=float, default=defaults.token_delay_ms)
+    parser.add_argument("--llm-rpm", type=int, default=defaults.llm_rpm, help="Fake deployment requests/minute quota (0 = unlimited)")
+    parser.add_argument("--llm-tpm", type=int, default=defaults.llm_tpm, help="Fake deployment tokens/minute quota (0 = unlimited)")
+    parser.add_argument("--llm-deployment", action="append", default=[], metavar="NAME[:LATENCY_MS[:ERROR_RATE]]",
+                        help="Serve and route across several chat deployments, each with extra latency/errors (repeatable)")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    config = FakeConfig(token_delay_ms=args.token_delay_ms, llm_rpm=args.llm_rpm, llm_tpm=args.llm_tpm)
+    for spec in args.llm_deployment:
+        name, *profile = spec.split(":")
+        config.deployments[name] = ServiceProfile(
+            latency_ms=float(profile[0]) if profile else 0.0,
+            error_rate=float(profile[1]) if len(profile) > 1 else 0.0,
+        )
+    for service in ("llm", "search", "web", "inventory"):
+        setattr(config, service, ServiceProfile(
+            latency_ms=getattr(args, f"{service}_latency_ms"),
+            jitter_ms=getattr(args, f"{service}_jitter_ms"),
+            error_rate=getattr(args, f"{service}_error_rate"),
+            error_status=getattr(args, f"{service}_error_status"),
+        ))
+    return config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    services = FakeServices(config_from_args(args), host=args.host, port=args.port)
+    for key, value in services.environment().items():
+        print(f"{key}={value}")
+    uvicorn.run(create_app(services.config), host=args.host, port=args.port, log_level="info")
@@ -0,0 +1,371 @@
+"""
+Offline load test: drives appchainlit, appchainlit-agent and the plugins against local
+fake backends (see fake_services.py) with N concurrent simulated sessions.
+
+No Azure, Google or inventory endpoint is contacted; every service is faked on localhost
+with configurable latency, jitter and error rates, so the numbers isolate the app's own
+overhead and concurrency behaviour.
+
+Usage:
+    python benchmarks/load_test.py --app both --sessions 20 --turns 5
+    python benchmarks/load_test.py --app agent --sessions 50 --llm-latency-ms 800 --search-error-rate 0.05
+    python benchmarks/load_test.py --app plugins --sessions 100 --turns 10 --json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tracemalloc
+import importlib.util
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeServices, add_profile_arguments, config_from_args  # noqa: E402
+
+QUESTIONS = [
+    "What time is the dolphin show?",
+    "Where can I find the stingray feeding pool?",
+    "How much does a dolphin plush toy cost in the shops?",
+    "What is the weather in Abu Dhabi today?",
+    "When does the park close on Friday?",
+    "Where is Sea Lion Point located?",
+    "Which shops sell penguin souvenirs?",
+    "Is there a height limit for the Manta coaster?",
+    "Compare the prices of dolphin and penguin toys across the shops.",
+]
+
+
+# -------------------------------
+# Measurements
+# -------------------------------
+
+
+@dataclass
+class TurnResult:
+    ttft_ms: Optional[float]
+    total_ms: float
+    tool_calls: int
+    error: Optional[str] = None
+    tool_ms: float = 0.0
+    llm_round_trips: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    prefetch_used: bool = False
+    llm_wait_ms: float = 0.0
+    failovers: int = 0
+    tool_result_tokens: int = 0
+    tool_result_tokens_saved: int = 0
+    tool_calls_coalesced: int = 0
+
+
+@dataclass
+class Report:
+    app: str
+    sessions: int
+    turns: int
+    wall_s: float = 0.0
+    results: List[TurnResult] = field(default_factory=list)
+    memory_per_session_kb: Optional[float] = None
+    backend_calls: Dict[str, int] = field(default_factory=dict)
+
+    @staticmethod
+    def _percentile(values: List[float], pct: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 1)
+
+    @staticmethod
+    def _mean(results: List[TurnResult], attribute: str) -> Optional[float]:
+        if not results:
+            return None
+        return round(sum(getattr(r, attribute) for r in results) / len(results), 2)
+
+    def summary(self) -> Dict[str, Any]:
+        ok = [r for r in self.results if r.error is None]
+        totals = [r.total_ms for r in ok]
+        ttfts = [r.ttft_ms for r in ok if r.ttft_ms is not None]
+        errors: Dict[str, int] = {}
+        for r in self.results:
+            if r.error:
+                errors[r.error] = errors.get(r.error, 0) + 1
+        return {
+            "app": self.app,
+            "sessions": self.sessions,
+            "turns_per_session": self.turns,
+            "turns": len(self.results),
+            "errors": sum(errors.values()),
+            "error_kinds": errors,
+            "wall_s": round(self.wall_s, 2),
+            "throughput_turns_per_s": round(len(self.results) / self.wall_s, 2) if self.wall_s else None,
+            "total_p50_ms": self._percentile(totals, 0.50),
+            "total_p95_ms": self._percentile(totals, 0.95),
+            "total_p99_ms": self._percentile(totals, 0.99),
+            "ttft_p50_ms": self._percentile(ttfts, 0.50),
+            "ttft_p95_ms": self._percentile(ttfts, 0.95),
+            "ttft_p99_ms": self._percentile(ttfts, 0.99),
+            "tool_calls_per_turn": self._mean(ok, "tool_calls"),
+            "tool_ms_per_turn": self._mean(ok, "tool_ms"),
+            "tool_calls_coalesced_per_turn": self._mean(ok, "tool_calls_coalesced"),
+            "tool_result_tokens_per_turn": self._mean(ok, "tool_result_tokens"),
+            "tool_result_tokens_saved_per_turn": self._mean(ok, "tool_result_tokens_saved"),
+            "llm_round_trips_per_turn": self._mean(ok, "llm_round_trips"),
+            "prompt_tokens_per_turn": self._mean(ok, "prompt_tokens"),
+            "completion_tokens_per_turn": self._mean(ok, "completion_tokens"),
+            "prefetch_rate": self._mean(ok, "prefetch_used"),
+            "llm_wait_ms_per_turn": self._mean(ok, "llm_wait_ms"),
+            "failovers_per_turn": self._mean(self.results, "failovers"),
+            "memory_per_session_kb": self.memory_per_session_kb,
+            "backend_calls": self.backend_calls,
+        }
+
+
+def print_report(summary: Dict[str, Any]) -> None:
+    print(f"\n=== {summary['app']}: {summary['sessions']} sessions x {summary['turns_per_session']} turns ===")
+    print(f"turns            : {summary['turns']} ({summary['errors']} errors) in {summary['wall_s']} s")
+    print(f"throughput       : {summary['throughput_turns_per_s']} turns/s")
+    print(f"total p50/95/99  : {summary['total_p50_ms']} / {summary['total_p95_ms']} / {summary['total_p99_ms']} ms")
+    print(f"ttft  p50/95/99  : {summary['ttft_p50_ms']} / {summary['ttft_p95_ms']} / {summary['ttft_p99_ms']} ms")
+    print(f"tool calls/turn  : {summary['tool_calls_per_turn']} ({summary['tool_ms_per_turn']} ms in tools, {summary['tool_calls_coalesced_per_turn']} coalesced)")
+    print(f"tool results     : {summary['tool_result_tokens_per_turn']} tokens/turn ({summary['tool_result_tokens_saved_per_turn']} saved by shaping)")
+    print(f"llm trips/turn   : {summary['llm_round_trips_per_turn']}")
+    print(f"tokens/turn      : {summary['prompt_tokens_per_turn']} prompt / {summary['completion_tokens_per_turn']} completion")
+    print(f"prefetch used    : {summary['prefetch_rate']} of turns")
+    print(f"llm wait/turn    : {summary['llm_wait_ms_per_turn']} ms queued or backing off")
+    print(f"failovers/turn   : {summary['failovers_per_turn']}")
+    print(f"memory/session   : {summary['memory_per_session_kb']} KiB")
+    print(f"backend calls    : {summary['backend_calls']}")
+    for kind, count in summary["error_kinds"].items():
+        print(f"  error x{count}: {kind}")
+
+
+# -------------------------------
+# Session drivers
+# -------------------------------
+#
+# Each driver returns an async callable that runs one turn for one session and
+# reports (ttft_ms, tool_calls) through the app's own `track_turn` metrics.
+
+SessionFactory = Callable[[], Awaitable[Callable[[str], Awaitable[TurnResult]]]]
+
+
+def _load_agent_module():
+    spec = importlib.util.spec_from_file_location("appchainlit_agent", os.path.join(ROOT, "appchainlit-agent.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+async def _timed_turn(app: str, session_id: str, stream: Callable[[], Any], question: Optional[str] = None) -> TurnResult:
+    from sk_runtime.turn_metrics import track_turn
+
+    started = time.perf_counter()
+    try:
+        # Chainlit steps need a live UI session; the filter still counts tool calls
+        with track_turn(app, session_id, show_steps=False, question=question) as metrics:
+            async for _ in stream():
+                metrics.mark_first_token()
+    except Exception as e:
+        return TurnResult(None, (time.perf_counter() - started) * 1000, metrics.tool_calls, f"{type(e).__name__}: {e}"[:160],
+                          failovers=metrics.failovers)
+    return TurnResult(
+        metrics.ttft_ms, metrics.total_ms, metrics.tool_calls, tool_ms=metrics.tool_ms,
+        llm_round_trips=metrics.llm_round_trips, prompt_tokens=metrics.prompt_tokens,
+        completion_tokens=metrics.completion_tokens, prefetch_used=metrics.prefetch_used,
+        llm_wait_ms=metrics.llm_wait_ms, failovers=metrics.failovers, tool_result_tokens=metrics.tool_result_tokens,
+        tool_result_tokens_saved=metrics.tool_result_tokens_saved, tool_calls_coalesced=metrics.tool_calls_coalesced,
+    )
+
+
+def appchainlit_sessions() -> SessionFactory:
+    import appchainlit
+    from sk_runtime.intent_router import speculate, stream_with_fallback
+    from sk_runtime.session_store import new_session_id
+
+    async def new_session():
+        provider, store = appchainlit.kernel_provider, appchainlit.session_store
+        session_id = new_session_id()
+
+        async def turn(question: str) -> TurnResult:
+            # Same session handling as handle_message: load from the store, save the new messages
+            history = await store.history(session_id, system_prompt=appchainlit.AZURE_OPENAI_PROMPT, service=provider.chat_completion)
+            history.add_user_message(question)
+            await history.reduce()
+            chunks: List[str] = []
+
+            async def stream():
+                # Same routing as handle_message: narrowed tools and a speculative prefetch
+                router = appchainlit.intent_router
+                route = router.route(question, provider.kernel) if router else None
+                with speculate(route, question):
+                    async for chunk in stream_with_fallback(
+                        route,
+                        history,
+                        lambda plugins: appchainlit.stream_reply(
+                            provider.kernel, provider.chat_completion, history, appchainlit.setup_execution_settings(plugins)
+                        ),
+                    ):
+                        chunks.append(chunk)
+                        yield chunk
+
+            result = await _timed_turn("appchainlit", session_id, stream, question)
+            if chunks:
+                history.add_message({"role": "assistant", "content": "".join(chunks)})
+            await store.save(session_id)
+            return result
+
+        return turn
+
+    return new_session
+
+
+def agent_sessions() -> SessionFactory:
+    module = _load_agent_module()
+    from semantic_kernel.agents import ChatHistoryAgentThread
+    from sk_runtime.intent_router import speculate, stream_with_fallback
+    from sk_runtime.session_store import new_session_id
+
+    async def new_session():
+        store = module.session_store
+        session_id = new_session_id()
+
+        async def turn(question: str) -> TurnResult:
+            history = await store.history(session_id, service=module.kernel_provider.chat_completion)
+            thread = ChatHistoryAgentThread(chat_history=history, thread_id=session_id)
+
+            async def reply(included_plugins):
+                async for token, _ in module.stream_agent_reply(
+                    module.get_agent(), thread, question, module.route_arguments(included_plugins)
+                ):
+                    yield token
+
+            async def stream():
+                router = module.intent_router
+                route = router.route(question, module.kernel_provider.kernel) if router else None
+                with speculate(route, question):
+                    async for token in stream_with_fallback(route, history, reply):
+                        yield token
+
+            result = await _timed_turn("appchainlit-agent", session_id, stream, question)
+            await store.save(session_id)
+            return result
+
+        return turn
+
+    return new_session
+
+
+def plugin_sessions() -> SessionFactory:
+    """Call the plugins directly (no LLM) to isolate retrieval and inventory latency."""
+    from sk_plugins.park_retrieval import ParkRetrieval
+    from sk_plugins.api_inventory import Inventory
+    from sk_plugins.web_search import GoogleWebSearch
+
+    park, inventory, web = ParkRetrieval(), Inventory(), GoogleWebSearch()
+
+    async def new_session():
+        async def turn(question: str) -> TurnResult:
+            async def stream():
+                yield await park.search_park(question)
+                yield await inventory.query_inventory(item=random.choice(["dolphin", "penguin", "shark"]), limit=5)
+                yield await web.web_search(question, fetch_pages=True)
+
+            return await _timed_turn("plugins", f"p{id(turn)}", stream, question)
+
+        return turn
+
+    return new_session
+
+
+async def aclose_app(app: str) -> None:
+    if app == "appchainlit":
+        import appchainlit
+        await appchainlit.kernel_provider.aclose()
+    elif app == "agent":
+        await sys.modules["appchainlit_agent"].kernel_provider.aclose()
+    else:
+        from sk_runtime.http_pool import aclose_http_clients
+        from sk_runtime.search_clients import close_search_indexes
+        await close_search_indexes()
+        await aclose_http_clients()
+
+
+# -------------------------------
+# Runner
+# -------------------------------
+
+
+async def run(app: str, factory: SessionFactory, sessions: int, turns: int, think_ms: float, services: FakeServices) -> Report:
+    report = Report(app=app, sessions=sessions, turns=turns)
+    # Warm up once so lazy kernel/client construction is not counted against the first sessions
+    warm = await factory()
+    await warm(QUESTIONS[0])
+
+    before = dict(services.config.calls)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    session_turns = [await factory() for _ in range(sessions)]
+
+    async def session(index: int, turn_fn) -> None:
+        rng = random.Random(index)
+        for _ in range(turns):
+            report.results.append(await turn_fn(rng.choice(QUESTIONS)))
+            if think_ms:
+                await asyncio.sleep(rng.uniform(0, think_ms) / 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(i, fn) for i, fn in enumerate(session_turns)))
+    report.wall_s = time.perf_counter() - started
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    report.memory_per_session_kb = round(retained / sessions / 1024, 1)
+    report.backend_calls = {key: services.config.calls.get(key, 0) - before.get(key, 0) for key in services.config.calls}
+    return report
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", choices=["appchainlit", "agent", "plugins", "both"], default="both")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Random pause of up to this long between turns")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", action="store_true", help="Print one JSON summary per app instead of text")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    services = FakeServices(config_from_args(args), port=args.port).start()
+    # Must be set before the apps are imported: they read their configuration at import time
+    os.environ.update(services.environment())
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("turn_metrics").setLevel(logging.WARNING)
+
+    apps = ["appchainlit", "agent"] if args.app == "both" else [args.app]
+    factories = {"appchainlit": appchainlit_sessions, "agent": agent_sessions, "plugins": plugin_sessions}
+    try:
+        for app in apps:
+            factory = factories[app]()
+            # The apps reconfigure logging on import; keep per-turn log lines out of the report
+            logging.getLogger().setLevel(logging.WARNING)
+            report = await run(app, factory, args.sessions, args.turns, args.think_ms, services)
+            summary = report.summary()
+            if args.json:
+                print(json.dumps(summary))
+            else:
+                print_report(summary)
+            await aclose_app(app)
+    finally:
+        services.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
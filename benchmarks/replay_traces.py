@@ -0,0 +1,247 @@
+"""
+Replay recorded turn traces (TURN_TRACE_FILE, see sk_runtime/turn_trace.py) offline against
+appchainlit or appchainlit-agent, and record the replayed turns for trace_report.py.
+
+Every recorded session is re-driven as a new session asking the same questions in the same
+order, so histories, routing, caches, filters and admission all run as in production. Only
+the backends are stand-ins (fake_services.py on localhost):
+
+  recorded   (default) the fake LLM answers each request with the reply recorded for that
+             question and function-calling round, after the recorded time to first token and
+             duration; tool calls return the recorded result after the recorded duration
+  synthetic  every backend generates its answers with the latency/error profiles given by
+             the same flags as load_test.py (--llm-latency-ms, --search-latency-ms, ...)
+
+Requests without a recording (e.g. a tool the compared configuration no longer offers, a
+history summary, a speculative prefetch) are answered synthetically and counted as unmatched.
+Calls a prefetch served when recording replay with the median recorded duration of that tool.
+
+Configurations are compared by replaying the same trace with different settings (--env sets
+any app variable before the app is imported) and diffing the runs:
+
+    TURN_TRACE_FILE=traces.jsonl chainlit run appchainlit.py
+    python benchmarks/replay_traces.py traces.jsonl --out base.jsonl
+    python benchmarks/replay_traces.py traces.jsonl --out short.jsonl --env HISTORY_MAX_TOKENS=2000
+    python benchmarks/trace_report.py short.jsonl --baseline base.jsonl
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import statistics
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeServices, ScriptedReply, _last_user_text, add_profile_arguments, config_from_args  # noqa: E402
+
+# Nothing from sk_runtime or the apps is imported at module level: they read their settings
+# at import time, and those are only final once main() has applied --env
+
+# Trace app name -> load_test driver
+APPS = {"appchainlit": "appchainlit", "appchainlit-agent": "agent"}
+
+
+# -------------------------------
+# Recorded backends
+# -------------------------------
+
+
+def _tool_key(name: str, arguments: Dict[str, Any]) -> Tuple[str, str]:
+    return name, json.dumps(arguments, sort_keys=True, default=str)
+
+
+class RecordedBackends:
+    """Recorded LLM replies and tool results, looked up by what the replayed app asks for."""
+
+    def __init__(self, turns: List[Dict[str, Any]]) -> None:
+        from sk_runtime.result_cache import normalize_query
+
+        self._normalize = normalize_query
+        # (question, function-calling round) -> LLM calls; (tool, arguments) -> tool calls
+        self.replies: Dict[Tuple[str, int], Deque[Dict[str, Any]]] = defaultdict(deque)
+        self.results: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = defaultdict(deque)
+        self.unmatched = {"llm": 0, "tool": 0}
+        durations: Dict[str, List[float]] = defaultdict(list)
+        for turn in turns:
+            question = normalize_query(turn.get("question") or "")
+            for call in turn.get("llm", []):
+                if call.get("stream") and not call.get("error") and call.get("end_ms") is not None:
+                    self.replies[(question, call["index"])].append(call)
+            for call in turn.get("tools", []):
+                if call.get("end_ms") is None:
+                    continue
+                self.results[_tool_key(call["name"], call.get("arguments") or {})].append(call)
+                if not call.get("prefetched"):
+                    durations[call["name"]].append(call["end_ms"] - call["start_ms"])
+        self.median_ms = {name: statistics.median(values) for name, values in durations.items()}
+
+    @staticmethod
+    def _take(queue: Deque[Dict[str, Any]]) -> Dict[str, Any]:
+        # Round robin: sessions asking the same question get the recordings in turn
+        call = queue[0]
+        queue.rotate(-1)
+        return call
+
+    def chat_reply(self, body: Dict[str, Any]) -> Optional[ScriptedReply]:
+        """FakeConfig.scripted_reply: the recorded reply to this request, if there is one."""
+        messages = body.get("messages", [])
+        users = [i for i, message in enumerate(messages) if message.get("role") == "user"]
+        queue = None
+        if users:
+            index = sum(1 for message in messages[users[-1] + 1:] if message.get("role") == "assistant")
+            queue = self.replies.get((self._normalize(_last_user_text(messages)), index))
+        if not queue:
+            self.unmatched["llm"] += 1
+            return None
+        call = self._take(queue)
+        if call["tool_calls"]:
+            advertised = {tool["function"]["name"] for tool in body.get("tools") or [] if tool.get("type") == "function"}
+            if not all(tool_call["name"] in advertised for tool_call in call["tool_calls"]):
+                self.unmatched["llm"] += 1
+                return None
+            reply = {"tool_calls": [
+                {"id": tool_call["id"] or f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                 "function": {"name": tool_call["name"], "arguments": tool_call["arguments"] or "{}"}}
+                for tool_call in call["tool_calls"]
+            ]}
+        elif call["content"]:
+            reply = {"content": call["content"]}
+        else:
+            self.unmatched["llm"] += 1
+            return None
+        first_token = call.get("first_token_ms") or call["end_ms"]
+        return ScriptedReply(reply, first_token_ms=first_token - call["start_ms"], duration_ms=call["end_ms"] - call["start_ms"])
+
+    async def tool_filter(self, context: Any, next: Callable[[Any], Awaitable[None]]) -> None:
+        """Innermost function-invocation filter returning the recorded result after the recorded duration."""
+        from semantic_kernel.functions.function_result import FunctionResult
+
+        function = context.function
+        name = f"{function.plugin_name}.{function.name}"
+        parameters = {parameter.name for parameter in function.metadata.parameters}
+        arguments = {key: value for key, value in (context.arguments or {}).items() if key in parameters}
+        queue = self.results.get(_tool_key(name, arguments))
+        if not queue:
+            self.unmatched["tool"] += 1
+            await next(context)
+            return
+        call = self._take(queue)
+        duration = self.median_ms.get(name, 0.0) if call.get("prefetched") else call["end_ms"] - call["start_ms"]
+        await asyncio.sleep(duration / 1000)
+        if call.get("error"):
+            raise RuntimeError(f"Replayed failure of {name}: {call['error']}")
+        context.result = FunctionResult(function=function.metadata, value=call.get("result"))
+
+
+# -------------------------------
+# Runner
+# -------------------------------
+
+
+def sessions_of(turns: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Recorded turns grouped by session, sessions and turns in time order."""
+    sessions: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+    for number, turn in enumerate(turns):
+        sessions[turn.get("session") or f"turn-{number}"].append(turn)
+    for session in sessions.values():
+        session.sort(key=lambda turn: turn.get("at") or 0)
+    return sorted(sessions.values(), key=lambda session: session[0].get("at") or 0)
+
+
+async def replay(sessions: List[List[Dict[str, Any]]], factory: Any, speed: float) -> Tuple[int, int]:
+    """Re-drive every session; returns (turns, errors). speed 0: no pauses, else recorded pacing / speed."""
+    origin = sessions[0][0].get("at") or 0
+    outcomes: List[bool] = []
+
+    async def session(recorded: List[Dict[str, Any]]) -> None:
+        turn_fn = await factory()
+        if speed:
+            await asyncio.sleep(max(0.0, (recorded[0].get("at") or origin) - origin) / speed)
+        for previous, turn in zip([None] + recorded[:-1], recorded):
+            if speed and previous is not None:
+                # The user's pause between the previous answer and this question
+                answered = (previous.get("at") or 0) + (previous.get("total_ms") or 0) / 1000
+                await asyncio.sleep(max(0.0, (turn.get("at") or 0) - answered) / speed)
+            result = await turn_fn(turn.get("question") or "")
+            outcomes.append(result.error is None)
+
+    await asyncio.gather(*(session(recorded) for recorded in sessions))
+    return len(outcomes), outcomes.count(False)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="Recorded turn trace file (JSON lines)")
+    parser.add_argument("--out", required=True, help="Trace file for the replayed turns (overwritten)")
+    parser.add_argument("--app", choices=["appchainlit", "agent"], help="App to drive (default: the one that recorded the trace)")
+    parser.add_argument("--backends", choices=["recorded", "synthetic"], default="recorded")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Replay pacing: 0 = no pauses (default), 1 = recorded arrival times and pauses, 10 = ten times faster")
+    parser.add_argument("--sessions", type=int, default=0, metavar="N", help="Only replay the first N sessions")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="App setting for this run (repeatable)")
+    parser.add_argument("--port", type=int, default=8765)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    services = FakeServices(config, port=args.port)
+    # Must be set before sk_runtime and the app are imported: they read their configuration at import time
+    os.environ.update(services.environment())
+    os.environ.update({"TURN_TRACE_FILE": args.out, "TURN_TRACE_SAMPLE": "1"})
+    for setting in args.env:
+        key, _, value = setting.partition("=")
+        os.environ[key] = value
+    logging.basicConfig(level=logging.WARNING)
+
+    import load_test
+    from trace_report import load_run, print_run
+    from sk_runtime.turn_trace import read_traces
+
+    turns = list(read_traces(args.trace))
+    if not turns:
+        parser.error(f"{args.trace} holds no turns")
+    app = args.app or APPS.get(turns[0].get("app"), "appchainlit")
+    sessions = sessions_of(turns)[: args.sessions or None]
+    backends = RecordedBackends(turns) if args.backends == "recorded" else None
+    if backends is not None:
+        config.scripted_reply = backends.chat_reply
+    services.start()
+
+    try:
+        factory = {"appchainlit": load_test.appchainlit_sessions, "agent": load_test.agent_sessions}[app]()
+        logging.getLogger().setLevel(logging.WARNING)
+        module = sys.modules["appchainlit" if app == "appchainlit" else "appchainlit_agent"]
+        if backends is not None:
+            # Appended last, so it is the innermost filter and replaces only the backend call
+            module.kernel_provider.kernel.add_filter("function_invocation", backends.tool_filter)
+        # One warm-up turn so lazy construction is not counted against the first session; not part of the run
+        warm = await factory()
+        await warm(sessions[0][0].get("question") or "")
+        open(args.out, "w").close()
+        before = dict(config.calls)
+
+        started = time.perf_counter()
+        replayed, errors = await replay(sessions, factory, args.speed)
+        wall_s = time.perf_counter() - started
+        await load_test.aclose_app(app)
+    finally:
+        services.stop()
+
+    print(f"replayed {replayed} turns of {len(sessions)} sessions against {app} ({args.backends} backends) "
+          f"in {wall_s:.1f} s, {errors} errors")
+    if backends is not None:
+        print(f"unmatched (answered synthetically): {backends.unmatched['llm']} LLM requests, {backends.unmatched['tool']} tool calls")
+    print(f"backend calls: { {key: config.calls.get(key, 0) - before.get(key, 0) for key in config.calls} }")
+    print_run(args.out, load_run(args.out))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
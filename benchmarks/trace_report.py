@@ -0,0 +1,208 @@
+"""
+Critical-path breakdown of recorded turns (TURN_TRACE_FILE, see sk_runtime/turn_trace.py) and diff of two runs.
+
+Each turn's wall time is split into what it was waiting on at every instant:
+
+  llm        a chat completion request was in flight (queueing for quota excluded)
+  llm_queue  the part of it spent in admission control (queued, waiting for quota, backing off)
+  tool X     no LLM request was in flight and tool X was the running call that finished last,
+             i.e. the one the turn was waiting for (parallel calls only count the slowest)
+  overhead   neither: our own code (routing, history, prompt building, filters, rendering)
+
+Usage:
+    python benchmarks/trace_report.py run.jsonl
+    python benchmarks/trace_report.py run.jsonl --turns 20
+    python benchmarks/trace_report.py candidate.jsonl --baseline baseline.jsonl
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sk_runtime.result_cache import normalize_query  # noqa: E402
+from sk_runtime.turn_trace import read_traces  # noqa: E402
+
+LLM, QUEUE, OVERHEAD = "llm", "llm_queue", "overhead"
+
+
+# -------------------------------
+# Critical path
+# -------------------------------
+
+
+def critical_path(turn: Dict[str, Any]) -> Dict[str, float]:
+    """Milliseconds of the turn spent on each part of its critical path (plus "total" and "ttft")."""
+    total = turn.get("total_ms") or 0.0
+    llm = [(call["start_ms"], call.get("end_ms") or total) for call in turn.get("llm", [])]
+    tools = [(call["start_ms"], call.get("end_ms") or total, call["name"]) for call in turn.get("tools", [])]
+    bounds = sorted({0.0, total, *(t for span in llm for t in span), *(t for s, e, _ in tools for t in (s, e))})
+    parts: Dict[str, float] = defaultdict(float)
+    for start, end in zip(bounds, bounds[1:]):
+        if end > total or end <= start:
+            continue
+        middle = (start + end) / 2
+        if any(s <= middle < e for s, e in llm):
+            parts[LLM] += end - start
+            continue
+        running = [(e, name) for s, e, name in tools if s <= middle < e]
+        parts[f"tool {max(running)[1]}" if running else OVERHEAD] += end - start
+    # Admission waits happen inside LLM requests
+    queued = min(turn.get("llm_wait_ms") or 0.0, parts.get(LLM, 0.0))
+    if queued:
+        parts[LLM] -= queued
+        parts[QUEUE] = queued
+    parts["total"] = total
+    parts["ttft"] = turn.get("ttft_ms") or 0.0
+    return {key: round(value, 1) for key, value in parts.items()}
+
+
+def _order(part: str) -> Tuple[int, str]:
+    rank = {"total": 0, "ttft": 1, LLM: 2, QUEUE: 3, OVERHEAD: 5}
+    return rank.get(part, 4), part
+
+
+# -------------------------------
+# Summaries
+# -------------------------------
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 1)
+
+
+def load_run(path: str) -> List[Dict[str, Any]]:
+    """Turn records of a run, each with its critical path under "path"."""
+    turns = list(read_traces(path))
+    for turn in turns:
+        turn["path"] = critical_path(turn)
+    return turns
+
+
+def summarize(turns: List[Dict[str, Any]]) -> Dict[str, Dict[str, Optional[float]]]:
+    """Per critical-path part: mean over all turns (0 where absent), p50 and p95."""
+    ok = [turn for turn in turns if not turn.get("error")]
+    parts = sorted({part for turn in ok for part in turn["path"]}, key=_order)
+    summary = {}
+    for part in parts:
+        values = [turn["path"].get(part, 0.0) for turn in ok]
+        summary[part] = {
+            "mean": round(statistics.fmean(values), 1) if values else None,
+            "p50": _percentile(values, 0.50),
+            "p95": _percentile(values, 0.95),
+        }
+    return summary
+
+
+def by_question(turns: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Mean critical path per (normalized) question."""
+    groups: Dict[str, List[Dict[str, float]]] = defaultdict(list)
+    for turn in turns:
+        if not turn.get("error"):
+            groups[normalize_query(turn.get("question") or "")].append(turn["path"])
+    means = {}
+    for question, paths in groups.items():
+        parts = {part for path in paths for part in path}
+        means[question] = {part: round(statistics.fmean(path.get(part, 0.0) for path in paths), 1) for part in parts}
+        means[question]["turns"] = len(paths)
+    return means
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.0f}"
+
+
+def print_run(path: str, turns: List[Dict[str, Any]], show_turns: int = 0) -> None:
+    errors = sum(1 for turn in turns if turn.get("error"))
+    print(f"\n=== {path}: {len(turns)} turns ({errors} errors) ===")
+    print(f"{'critical path (ms)':<44}{'mean':>9}{'p50':>9}{'p95':>9}")
+    for part, stats in summarize(turns).items():
+        print(f"{part:<44}{_fmt(stats['mean']):>9}{_fmt(stats['p50']):>9}{_fmt(stats['p95']):>9}")
+    if show_turns:
+        print(f"\n{'question':<42}{'total':>8}{'llm':>8}{'tools':>8}{'ovh':>8}  tool calls")
+        for turn in turns[:show_turns]:
+            parts = turn["path"]
+            tools = sum(value for part, value in parts.items() if part.startswith("tool "))
+            names = ",".join(call["name"].split(".")[-1] for call in turn.get("tools", []))
+            print(
+                f"{(turn.get('question') or '')[:40]:<42}{_fmt(parts['total']):>8}"
+                f"{_fmt(parts.get(LLM, 0) + parts.get(QUEUE, 0)):>8}{_fmt(tools):>8}"
+                f"{_fmt(parts.get(OVERHEAD, 0)):>8}  {names or '-'}{'  ERROR' if turn.get('error') else ''}"
+            )
+
+
+def _delta(base: Optional[float], value: Optional[float]) -> str:
+    if base is None or value is None:
+        return ""
+    change = f"{value - base:+.0f}"
+    return f"{change} ({(value - base) / base:+.0%})" if base else change
+
+
+def diff(baseline: List[Dict[str, Any]], candidate: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Critical-path summaries of both runs side by side, overall and per question asked in both."""
+    base_summary, summary = summarize(baseline), summarize(candidate)
+    parts = sorted(set(base_summary) | set(summary), key=_order)
+    overall = {
+        part: {
+            stat: (base_summary.get(part, {}).get(stat), summary.get(part, {}).get(stat))
+            for stat in ("mean", "p50", "p95")
+        }
+        for part in parts
+    }
+    base_questions, questions = by_question(baseline), by_question(candidate)
+    shared = sorted(set(base_questions) & set(questions))
+    per_question = {
+        question: {
+            part: (base_questions[question].get(part, 0.0), questions[question].get(part, 0.0))
+            for part in ("total", "ttft", LLM, OVERHEAD)
+        }
+        for question in shared
+    }
+    return {"overall": overall, "questions": per_question}
+
+
+def print_diff(base_path: str, path: str, report: Dict[str, Any]) -> None:
+    print(f"\n=== {path} vs. baseline {base_path} (ms) ===")
+    print(f"{'critical path':<46}{'stat':>6}{'baseline':>10}{'run':>10}  change")
+    for part, stats in report["overall"].items():
+        for stat, (base, value) in stats.items():
+            if stat == "mean" or part == "total":
+                print(f"{part:<46}{stat:>6}{_fmt(base):>10}{_fmt(value):>10}  {_delta(base, value)}")
+    if report["questions"]:
+        print(f"\n{'question (mean total / llm / overhead)':<46}{'baseline':>18}{'run':>18}  total change")
+        for question, parts in report["questions"].items():
+            base = "/".join(_fmt(parts[part][0]) for part in ("total", LLM, OVERHEAD))
+            run = "/".join(_fmt(parts[part][1]) for part in ("total", LLM, OVERHEAD))
+            print(f"{question[:44]:<46}{base:>18}{run:>18}  {_delta(*parts['total'])}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="Turn trace file (JSON lines)")
+    parser.add_argument("--baseline", help="Trace file of the run to compare against")
+    parser.add_argument("--turns", type=int, default=0, metavar="N", help="Also list the first N turns")
+    parser.add_argument("--json", action="store_true", help="Print the summary (or diff) as JSON")
+    args = parser.parse_args()
+
+    turns = load_run(args.trace)
+    baseline = load_run(args.baseline) if args.baseline else None
+    if args.json:
+        print(json.dumps(diff(baseline, turns) if baseline is not None else summarize(turns)))
+        return
+    if baseline is not None:
+        print_run(args.baseline, baseline)
+    print_run(args.trace, turns, args.turns)
+    if baseline is not None:
+        print_diff(args.baseline, args.trace, diff(baseline, turns))
+
+
+if __name__ == "__main__":
+    main()
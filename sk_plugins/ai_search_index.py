@@ -1,43 +1,40 @@
-import os
-from dotenv import load_dotenv
 from semantic_kernel.functions import kernel_function
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents.models import VectorizableTextQuery
 
-load_dotenv()
+from sk_plugins.search_index_plugin import SearchIndexPlugin
+from sk_runtime.settings import get_settings
 
-AZURE_SEARCH_ENDPOINT= os.getenv("AZURE_SEARCH_ENDPOINT")
-AZURE_SEARCH_KEY = os.getenv("AZURE_SEARCH_API_KEY")
-SEARCH_INDEX_NAME = os.getenv("AZURE_SEARCH_INDEX")
+settings = get_settings()
+AZURE_SEARCH_ENDPOINT = settings.search_endpoint
+AZURE_SEARCH_KEY = settings.search_api_key
+SEARCH_INDEX_NAME = settings.search_index
+# "remote" (Azure AI Search) or "local" (in-process index built with `python -m sk_runtime.local_index build`)
+SEARCH_BACKEND = settings.search_backend
+LOCAL_INDEX_PATH = settings.local_index_path
 
 
-class AiSearch:
+# Query parameters; part of the result-cache key so changing them never serves stale results
+SEARCH_PARAMS = {
+    "vector_field": "vector",
+    "k_nearest_neighbors": 50,
+    "semantic_configuration_name": "my-semantic-config",
+    "search_field": "chunk",
+    "top": 3,
+}
+
+class AiSearch(SearchIndexPlugin):
+    # Intent router hints (see sk_runtime/intent_router.py)
+    INTENTS = ("guide",)
+    PREFETCH_FUNCTION = "ai_search"
+
+    ENDPOINT = AZURE_SEARCH_ENDPOINT
+    INDEX_NAME = SEARCH_INDEX_NAME
+    API_KEY = AZURE_SEARCH_KEY
+    BACKEND = SEARCH_BACKEND
+    LOCAL_INDEX_PATH = LOCAL_INDEX_PATH
+    SEARCH_PARAMS = SEARCH_PARAMS
+    TOPIC = "experience guide"
+
     @kernel_function(name="ai_search", description="")
-    def ai_search(self, query: str) -> str:
+    async def ai_search(self, query: str) -> str:
         """Search Water Theme Park data on encounters and experiences at the park. Use for general information about the Water Park."""
-        credential = AzureKeyCredential(AZURE_SEARCH_KEY)
-        client = SearchClient(
-            endpoint=AZURE_SEARCH_ENDPOINT,
-            index_name=SEARCH_INDEX_NAME,
-            credential=credential,
-        )
-        results = client.search(
-            search_text=query,
-            vector_queries=[
-                VectorizableTextQuery(
-                    text=query, k_nearest_neighbors=50, fields="vector"
-                )
-            ],
-            query_type="semantic",
-            semantic_configuration_name="my-semantic-config",
-            search_fields=["chunk"],
-            top=3,
-            include_total_count=True,
-        )
-        retrieved_texts = [result.get("chunk") for result in results]
-        context_str = (
-            "\n".join(retrieved_texts) if retrieved_texts else "No documents found."
-        )
-        return context_str
-    
\ No newline at end of file
+        return await self._context(query)
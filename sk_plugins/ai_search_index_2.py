@@ -1,42 +1,40 @@
-import os
-from dotenv import load_dotenv
 from semantic_kernel.functions import kernel_function
-from azure.search.documents import SearchClient
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents.models import VectorizableTextQuery
 
-load_dotenv()
+from sk_plugins.search_index_plugin import SearchIndexPlugin
+from sk_runtime.settings import get_settings
 
-AZURE_SEARCH_ENDPOINT_2 = os.getenv("AZURE_SEARCH_ENDPOINT_2")
-AZURE_SEARCH_KEY_2 = os.getenv("AZURE_SEARCH_API_KEY_2")
-SEARCH_INDEX_NAME_2 = os.getenv("AZURE_SEARCH_INDEX_2")
+settings = get_settings()
+AZURE_SEARCH_ENDPOINT_2 = settings.search_endpoint_2
+AZURE_SEARCH_KEY_2 = settings.search_api_key_2
+SEARCH_INDEX_NAME_2 = settings.search_index_2
+# "remote" (Azure AI Search) or "local" (in-process index built with `python -m sk_runtime.local_index build`)
+SEARCH_BACKEND_2 = settings.search_backend_2
+LOCAL_INDEX_PATH_2 = settings.local_index_path_2
+
+# Query parameters; part of the result-cache key so changing them never serves stale results
+SEARCH_PARAMS = {
+    "vector_field": "text_vector",
+    "k_nearest_neighbors": 50,
+    "semantic_configuration_name": "my-semantic-config",
+    "search_field": "text",
+    "top": 3,
+}
+
+class AiSearch2(SearchIndexPlugin):
+    # Intent router hints (see sk_runtime/intent_router.py)
+    INTENTS = ("map",)
+    PREFETCH_FUNCTION = "ai_search"
+
+    ENDPOINT = AZURE_SEARCH_ENDPOINT_2
+    INDEX_NAME = SEARCH_INDEX_NAME_2
+    API_KEY = AZURE_SEARCH_KEY_2
+    BACKEND = SEARCH_BACKEND_2
+    LOCAL_INDEX_PATH = LOCAL_INDEX_PATH_2
+    SETTINGS_SUFFIX = "_2"
+    SEARCH_PARAMS = SEARCH_PARAMS
+    TOPIC = "park map"
 
-class AiSearch2:
     @kernel_function(name="ai_search", description="")
-    def ai_search(self, query: str) -> str:
+    async def ai_search(self, query: str) -> str:
         """Search Water Theme Park MAP data when a user asks for directions or for specific locations around the park."""
-        credential = AzureKeyCredential(AZURE_SEARCH_KEY_2)
-        client = SearchClient(
-            endpoint=AZURE_SEARCH_ENDPOINT_2,
-            index_name=SEARCH_INDEX_NAME_2,
-            credential=credential,
-        )
-        results = client.search(
-            search_text=query,
-            vector_queries=[
-                VectorizableTextQuery(
-                    text=query, k_nearest_neighbors=50, fields="text_vector"
-                )
-            ],
-            query_type="semantic",
-            semantic_configuration_name="my-semantic-config",
-            search_fields=["text"],
-            top=3,
-            include_total_count=True,
-        )
-        retrieved_texts = [result.get("text") for result in results]
-        context_str = (
-            "\n".join(retrieved_texts) if retrieved_texts else "No documents found."
-        )
-        return context_str
-    
\ No newline at end of file
+        return await self._context(query)
@@ -1,21 +1,194 @@
-import os
-import requests
-from dotenv import load_dotenv
+import re
+import json
+from typing import Annotated, Any, AsyncIterator, Dict, List, Optional
 from semantic_kernel.functions import kernel_function
 
-load_dotenv()
-URL = os.getenv("URL_retrieve_data")
+from sk_runtime.http_pool import get_async_http_client
+from sk_runtime import data_versions
+from sk_runtime.settings import get_settings
+
+settings = get_settings()
+URL = settings.inventory_url
+# Query/facet routes live under the inventory route unless configured separately
+URL_QUERY = settings.inventory_query_url
+URL_FACETS = settings.inventory_facets_url
+URL_BULK = settings.inventory_bulk_url
+# Data-version source name; the API reports the dataset version in VERSION_HEADER
+DATA_SOURCE = "inventory"
+VERSION_HEADER = "X-Inventory-Version"
+
+_PRICE = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+
+def _price(value: Any) -> Optional[float]:
+    """Numeric part of a price such as "126 AED"."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _PRICE.search(str(value or ""))
+    return float(match.group()) if match else None
+
 
 class Inventory:
+    # Intent router hint (see sk_runtime/intent_router.py)
+    INTENTS = ("inventory",)
+
+    def __init__(self):
+        # Client-side copy of the full inventory, revalidated with If-None-Match
+        self._inventory = None
+        self._etag = None
+
     @kernel_function(
         name="get_inventory",
         description="Retrieve the full Water Theme Park shops inventory as a JSON object."
     )
-    def get_inventory(self) -> list:
+    async def get_inventory(self) -> list:
         """
         Calls the Azure Function API and returns the full inventory as a JSON list.
+
+        Repeated calls send a conditional GET; a 304 reuses the cached copy without a body.
+        """
+        headers = {"If-None-Match": self._etag} if self._etag and self._inventory is not None else {}
+        response = await get_async_http_client("inventory").get(URL, headers=headers)
+        data_versions.observe(DATA_SOURCE, response.headers.get(VERSION_HEADER))
+        if response.status_code == 304:
+            return self._inventory
+        response.raise_for_status()
+        self._inventory = response.json()  # <-- A list of dicts
+        self._etag = response.headers.get("ETag")
+        return self._inventory
+
+    @kernel_function(
+        name="query_inventory",
+        description=(
+            "Look up Water Theme Park shop items matching filters. Prefer this over get_inventory: "
+            "it returns only matching rows and only the requested fields."
+        )
+    )
+    async def query_inventory(
+        self,
+        item: Annotated[str | None, "Words from the item name, e.g. 'dolphin plush'."] = None,
+        store: Annotated[str | None, "Exact store name."] = None,
+        category: Annotated[str | None, "Item category, e.g. Toy, Souvenir, Apparel."] = None,
+        color: Annotated[str | None, "Item color."] = None,
+        min_price: Annotated[float | None, "Minimum price in AED."] = None,
+        max_price: Annotated[float | None, "Maximum price in AED."] = None,
+        in_stock: Annotated[bool | None, "True for items with quantity above zero."] = None,
+        fields: Annotated[str | None, "Comma-separated fields to return, e.g. 'Item,Price,Store'."] = None,
+        limit: Annotated[int, "Maximum rows to return (1-100)."] = 20,
+        offset: Annotated[int, "Rows to skip, for paging."] = 0,
+    ) -> dict:
+        """
+        Calls the Azure Function query API and returns {total, offset, limit, items}.
+        """
+        params = {
+            "item": item,
+            "store": store,
+            "category": category,
+            "color": color,
+            "min_price": min_price,
+            "max_price": max_price,
+            "in_stock": None if in_stock is None else str(in_stock).lower(),
+            "fields": fields,
+            "limit": limit,
+            "offset": offset,
+        }
+        params = {key: value for key, value in params.items() if value is not None}
+        response = await get_async_http_client("inventory").get(URL_QUERY, params=params)
+        response.raise_for_status()
+        data_versions.observe(DATA_SOURCE, response.headers.get(VERSION_HEADER))
+        return response.json()
+
+    @kernel_function(
+        name="list_inventory_facets",
+        description="List the store names, categories and colors that can be used to filter query_inventory."
+    )
+    async def list_inventory_facets(self) -> dict:
+        """
+        Calls the Azure Function facets API.
         """
-        url = URL
-        response = requests.get(url)
+        response = await get_async_http_client("inventory").get(URL_FACETS)
         response.raise_for_status()
-        return response.json()  # <-- Returns a list of dicts
+        data_versions.observe(DATA_SOURCE, response.headers.get(VERSION_HEADER))
+        return response.json()
+
+    async def _stream_bulk(self, items: List[str], **filters: Any) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run one bulk lookup and yield its NDJSON lines as they arrive.
+
+        Row lines are {"query", "item"}; each requested item ends with {"query", "total", "returned"}.
+        """
+        payload = {"items": items, **{key: value for key, value in filters.items() if value is not None}}
+        headers = {"Accept": "application/x-ndjson"}
+        async with get_async_http_client("inventory").stream("POST", URL_BULK, json=payload, headers=headers) as response:
+            response.raise_for_status()
+            data_versions.observe(DATA_SOURCE, response.headers.get(VERSION_HEADER))
+            async for line in response.aiter_lines():
+                if line.strip():
+                    yield json.loads(line)
+
+    @kernel_function(
+        name="lookup_inventory_items",
+        description=(
+            "Look up several Water Theme Park shop items in one call, e.g. every item named in a question. "
+            "Item names may be partial or misspelled. Prefer this over repeated query_inventory calls."
+        )
+    )
+    async def lookup_inventory_items(
+        self,
+        items: Annotated[list[str], "Item names, e.g. ['dolphin plush', 'penguin', 'shark cap']."],
+        store: Annotated[str | None, "Exact store name."] = None,
+        category: Annotated[str | None, "Item category, e.g. Toy, Souvenir, Apparel."] = None,
+        in_stock: Annotated[bool | None, "True for items with quantity above zero."] = None,
+        fields: Annotated[str | None, "Comma-separated fields to return, e.g. 'Item,Price,Store'."] = None,
+        limit_per_item: Annotated[int, "Maximum matches per item name (1-100)."] = 10,
+    ) -> dict:
+        """
+        Calls the Azure Function bulk API and returns {results: [{query, total, items}]} in request order.
+        """
+        results: Dict[str, Dict[str, Any]] = {item: {"query": item, "total": 0, "items": []} for item in items}
+        async for line in self._stream_bulk(
+            items, store=store, category=category, in_stock=in_stock, fields=fields, limit_per_item=limit_per_item
+        ):
+            group = results.setdefault(line["query"], {"query": line["query"], "total": 0, "items": []})
+            if "item" in line:
+                group["items"].append(line["item"])
+            else:
+                group["total"] = line["total"]
+        return {"results": list(results.values())}
+
+    @kernel_function(
+        name="compare_inventory_prices",
+        description=(
+            "Compare prices of several Water Theme Park shop items across stores in one call: "
+            "cheapest and most expensive match per item, and what each store sells it for."
+        )
+    )
+    async def compare_inventory_prices(
+        self,
+        items: Annotated[list[str], "Item names to compare, e.g. ['dolphin', 'penguin plush']."],
+        in_stock: Annotated[bool | None, "True to only consider items with quantity above zero."] = None,
+    ) -> dict:
+        """
+        Calls the Azure Function bulk API and aggregates prices per item while the rows stream in.
+        """
+        comparisons: Dict[str, Dict[str, Any]] = {}
+        async for line in self._stream_bulk(
+            items, in_stock=in_stock, fields="Item,Store,Price,Quantity", limit_per_item=100
+        ):
+            comparison = comparisons.setdefault(
+                line["query"], {"query": line["query"], "matches": 0, "lowest": None, "highest": None, "stores": {}}
+            )
+            row = line.get("item")
+            if row is None:
+                comparison["matches"] = line["total"]
+                continue
+            offer = {"Item": row.get("Item"), "Price": row.get("Price"), "Quantity": row.get("Quantity")}
+            comparison["stores"].setdefault(row.get("Store"), []).append(offer)
+            price = _price(row.get("Price"))
+            if price is None:
+                continue
+            if comparison["lowest"] is None or price < _price(comparison["lowest"]["Price"]):
+                comparison["lowest"] = {"Store": row.get("Store"), **offer}
+            if comparison["highest"] is None or price > _price(comparison["highest"]["Price"]):
+                comparison["highest"] = {"Store": row.get("Store"), **offer}
+        return {"comparisons": [comparisons.get(item, {"query": item, "matches": 0}) for item in items]}
@@ -0,0 +1,136 @@
+import os
+import re
+import asyncio
+import logging
+from typing import Annotated, Dict, List, Optional, Tuple
+from semantic_kernel.functions import kernel_function
+
+from sk_plugins.ai_search_index import AiSearch
+from sk_plugins.ai_search_index_2 import AiSearch2
+from sk_plugins.web_search import GoogleWebSearch
+from sk_runtime.history_reducer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the fused context block returned to the model
+PARK_RETRIEVAL_MAX_TOKENS = int(os.getenv("PARK_RETRIEVAL_MAX_TOKENS", "1500"))
+# Reciprocal-rank-fusion constant; larger values flatten the rank contribution
+RRF_K = 60
+# Chunks sharing more than this fraction of the smaller chunk's word 5-grams are duplicates
+DUPLICATE_OVERLAP = 0.5
+
+_WORD = re.compile(r"\w+")
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = _WORD.findall(text.casefold())
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _is_duplicate(shingles: set, other: set) -> bool:
+    if not shingles or not other:
+        return False
+    # Overlapping chunk windows share a long run of words with each other
+    return len(shingles & other) / min(len(shingles), len(other)) > DUPLICATE_OVERLAP
+
+
+def fuse(ranked_lists: Dict[str, List[str]], k: int = RRF_K) -> List[Tuple[float, str, str]]:
+    """
+    Merge ranked chunk lists with reciprocal-rank fusion and drop overlapping chunks.
+
+    Args:
+        ranked_lists: Source label -> chunks in rank order.
+        k: RRF constant.
+
+    Returns:
+        (score, source, text) tuples, best first.
+    """
+    candidates = []
+    for source, chunks in ranked_lists.items():
+        for rank, text in enumerate(chunks):
+            if text:
+                candidates.append((1.0 / (k + rank + 1), source, text))
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+    fused: List[Tuple[float, str, str, set]] = []
+    for score, source, text in candidates:
+        shingles = _shingles(text)
+        for i, (kept_score, kept_source, kept_text, kept_shingles) in enumerate(fused):
+            if _is_duplicate(shingles, kept_shingles):
+                # The same passage found by several sources is stronger evidence
+                sources = kept_source if source in kept_source.split("+") else f"{kept_source}+{source}"
+                fused[i] = (kept_score + score, sources, kept_text, kept_shingles)
+                break
+        else:
+            fused.append((score, source, text, shingles))
+    fused.sort(key=lambda item: item[0], reverse=True)
+    return [(score, source, text) for score, source, text, _ in fused]
+
+
+class ParkRetrieval:
+    # Intent router hint; not prefetched, the standalone index plugins are
+    INTENTS = ("guide", "map")
+
+    def __init__(
+        self,
+        guide: Optional[AiSearch] = None,
+        park_map: Optional[AiSearch2] = None,
+        web: Optional[GoogleWebSearch] = None,
+    ):
+        # The sub-plugins share pooled search clients and the result cache with the standalone plugins
+        self.guide = guide or AiSearch()
+        self.park_map = park_map or AiSearch2()
+        self.web = web or GoogleWebSearch()
+
+    async def _safe(self, label: str, search) -> List[str]:
+        try:
+            return await search
+        except Exception as e:
+            logger.warning(f"Park retrieval source '{label}' failed: {e}")
+            return []
+
+    async def _web_chunks(self, query: str) -> List[str]:
+        # Search failures raise and are handled by _safe like those of the park indexes
+        results = await self.web.search_results(query)
+        return [self.web.format_result(result) for result in results]
+
+    @kernel_function(
+        name="search_park",
+        description=(
+            "Search the Water Theme Park experience guide AND the park map at the same time and return one "
+            "ranked context block. Use for questions that combine what/when/how-much with where, e.g. "
+            "'where can I feed the stingrays and what does it cost?'."
+        )
+    )
+    async def search_park(
+        self,
+        query: str,
+        include_web: Annotated[bool, "Also search the public web (slower); used automatically when the park indexes find nothing."] = False,
+    ) -> str:
+        """Query both park indexes concurrently, fuse the hits with reciprocal-rank fusion and return a budgeted context block."""
+        searches = {
+            "guide": self._safe("guide", self.guide.search_chunks(query)),
+            "map": self._safe("map", self.park_map.search_chunks(query)),
+        }
+        if include_web:
+            searches["web"] = self._safe("web", self._web_chunks(query))
+        results = dict(zip(searches, await asyncio.gather(*searches.values())))
+
+        if not include_web and not any(results.values()):
+            results["web"] = await self._safe("web", self._web_chunks(query))
+
+        fused = fuse(results)
+        if not fused:
+            return "No documents found."
+
+        blocks, used = [], 0
+        for _, source, text in fused:
+            block = f"[{source}] {text}"
+            tokens = count_tokens(block)
+            if blocks and used + tokens > PARK_RETRIEVAL_MAX_TOKENS:
+                break
+            blocks.append(block)
+            used += tokens
+        return "\n\n".join(blocks)
@@ -0,0 +1,91 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from sk_runtime.search_clients import get_search_index
+from sk_runtime.local_index import get_local_index
+from sk_runtime.result_cache import get_search_cache
+from sk_runtime import data_versions
+
+
+class SearchIndexPlugin:
+    """
+    Cached retrieval from one Azure AI Search index (or its local copy).
+
+    Subclasses name the index and its fields and declare the kernel function, with
+    the description the model sees; everything else is shared.
+    """
+
+    ENDPOINT: Optional[str] = None
+    INDEX_NAME: Optional[str] = None
+    API_KEY: Optional[str] = None
+    # "remote" (Azure AI Search) or "local" (in-process index built with `python -m sk_runtime.local_index build`)
+    BACKEND = "remote"
+    LOCAL_INDEX_PATH: Optional[str] = None
+    # Appended to AZURE_SEARCH_BACKEND and LOCAL_INDEX_PATH in configuration errors
+    SETTINGS_SUFFIX = ""
+    # Query parameters; part of the result-cache key so changing them never serves stale results
+    SEARCH_PARAMS: Dict[str, Any] = {}
+    # What the index holds, for messages to the model
+    TOPIC = "search"
+
+    def __init__(self):
+        # Long-lived async client shared with every other user of this index
+        self._index = get_search_index(self.ENDPOINT, self.INDEX_NAME, self.API_KEY)
+        self._local = None
+        self._params = self.SEARCH_PARAMS
+        if self.BACKEND == "local":
+            if not self.LOCAL_INDEX_PATH:
+                suffix = self.SETTINGS_SUFFIX
+                raise ValueError(f"AZURE_SEARCH_BACKEND{suffix}=local needs LOCAL_INDEX_PATH{suffix}.")
+            # Memory-mapped index shared by every user of this plugin; its build id keeps cache keys apart
+            self._local = get_local_index(self.LOCAL_INDEX_PATH)
+            self._params = {**self.SEARCH_PARAMS, "backend": f"local:{self._local.build_id}"}
+        # Answers built on this index go stale when its cached results are invalidated
+        name = self.INDEX_NAME
+        data_versions.register_resolver(name, lambda: get_search_cache().version(name))
+
+    async def search_chunks(self, query: str) -> List[str]:
+        """Return the top matching chunks for `query`."""
+        data_versions.observe(self.INDEX_NAME, get_search_cache().version(self.INDEX_NAME))
+        return await get_search_cache().get_or_load(
+            self.INDEX_NAME, query, self._params, lambda: self._search(query)
+        )
+
+    async def _search(self, query: str) -> List[str]:
+        params = self.SEARCH_PARAMS
+        if self._local is not None:
+            hits = await self._local.search(query, top=params["top"], k_nearest=params["k_nearest_neighbors"])
+            return [hit.text for hit in hits]
+        # Imported on first remote query; the search SDK is not needed to start the app
+        from azure.search.documents.models import VectorizableTextQuery
+
+        results = await self._index.search(
+            query,
+            vector_queries=[
+                VectorizableTextQuery(
+                    text=query,
+                    k_nearest_neighbors=params["k_nearest_neighbors"],
+                    fields=params["vector_field"],
+                )
+            ],
+            query_type="semantic",
+            semantic_configuration_name=params["semantic_configuration_name"],
+            search_fields=[params["search_field"]],
+            top=params["top"],
+            include_total_count=True,
+        )
+        return [result.get(params["search_field"]) for result in results]
+
+    async def _context(self, query: str) -> str:
+        """The matching chunks as one tool result, or a message saying why there are none."""
+        try:
+            retrieved_texts = await self.search_chunks(query)
+        except asyncio.TimeoutError:
+            return f"The {self.TOPIC} search timed out. Please try again."
+        context_str = (
+            "\n".join(retrieved_texts) if retrieved_texts else "No documents found."
+        )
+        return context_str
+
+    async def close(self) -> None:
+        await self._index.close()
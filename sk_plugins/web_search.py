@@ -1,45 +1,212 @@
 import os
-import requests
-from dotenv import load_dotenv
+import re
+import asyncio
+import logging
+from html.parser import HTMLParser
+from typing import Annotated, Any, Dict, List, Optional
 from semantic_kernel.functions import kernel_function
 
-load_dotenv()
+from sk_runtime.http_pool import build_timeout, get_async_http_client
+from sk_runtime.result_cache import get_search_cache
+from sk_runtime import data_versions
+from sk_runtime.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+GOOGLE_API_KEY = settings.google_api_key
+GOOGLE_SEARCH_ENGINE_ID = settings.google_search_engine_id
+GOOGLE_SEARCH_URL = settings.google_search_url
+
+# Results per query (Google allows 1-10)
+WEB_SEARCH_NUM_RESULTS = int(os.getenv("WEB_SEARCH_NUM_RESULTS", "3"))
+WEB_SEARCH_READ_TIMEOUT = float(os.getenv("WEB_SEARCH_READ_TIMEOUT", "5"))
+# Page fetching (fetch_pages=True): caps per page, so one slow or huge site cannot stall the turn
+WEB_PAGE_TIMEOUT = float(os.getenv("WEB_PAGE_TIMEOUT", "3"))
+WEB_PAGE_MAX_BYTES = int(os.getenv("WEB_PAGE_MAX_BYTES", str(512 * 1024)))
+WEB_PAGE_MAX_CHARS = int(os.getenv("WEB_PAGE_MAX_CHARS", "3000"))
+
+# Result-cache namespace; its TTL can be overridden with SEARCH_CACHE_TTLS="web=300"
+WEB_CACHE_NAMESPACE = "web"
+RESULT_SEPARATOR = "\n\n---\n\n"
+
+_WHITESPACE = re.compile(r"[ \t\r\f\v]+")
+
+
+class _MainTextParser(HTMLParser):
+    """Collects readable text blocks, skipping scripts, navigation and other page chrome."""
+
+    SKIP = {"script", "style", "noscript", "svg", "nav", "header", "footer", "aside", "form", "iframe", "template"}
+    BLOCKS = {"p", "li", "h1", "h2", "h3", "h4", "h5", "h6", "td", "th", "blockquote", "pre", "dd", "dt", "br", "div", "section"}
+    MAIN = {"main", "article"}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self._skip_depth = 0
+        self._main_depth = 0
+        self._current: List[str] = []
+        self.blocks: List[str] = []
+        self.main_blocks: List[str] = []
+
+    def _flush(self) -> None:
+        text = _WHITESPACE.sub(" ", "".join(self._current)).strip()
+        self._current = []
+        if len(text) >= 2:
+            self.blocks.append(text)
+            if self._main_depth:
+                self.main_blocks.append(text)
+
+    def handle_starttag(self, tag: str, attrs: Any) -> None:
+        if tag in self.SKIP:
+            self._skip_depth += 1
+        elif tag in self.MAIN:
+            self._flush()
+            self._main_depth += 1
+        elif tag in self.BLOCKS:
+            self._flush()
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self.SKIP:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.MAIN:
+            self._flush()
+            self._main_depth = max(0, self._main_depth - 1)
+        elif tag in self.BLOCKS:
+            self._flush()
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip_depth:
+            self._current.append(data)
+
+
+def extract_main_text(html: str, max_chars: int = WEB_PAGE_MAX_CHARS) -> str:
+    """
+    Extract the readable text of an HTML page, preferring <main>/<article> content.
+
+    Short fragments (menu items, buttons) are dropped when enough longer paragraphs exist.
+    """
+    parser = _MainTextParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception as e:  # malformed markup; keep whatever was parsed
+        logger.debug(f"HTML parsing stopped early: {e}")
+    parser._flush()
+    blocks = parser.main_blocks or parser.blocks
+    paragraphs = [block for block in blocks if len(block) >= 40]
+    if len(paragraphs) >= 3:
+        blocks = paragraphs
+
+    kept, used = [], 0
+    for block in blocks:
+        if used + len(block) > max_chars:
+            remaining = max_chars - used
+            if remaining > 80:
+                kept.append(block[:remaining].rsplit(" ", 1)[0] + " …")
+            break
+        kept.append(block)
+        used += len(block) + 1
+    return "\n".join(kept)
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-GOOGLE_SEARCH_ENGINE_ID = os.getenv("GOOGLE_SEARCH_ENGINE_ID")
 
 class GoogleWebSearch:
-    @kernel_function(
-        name="web_search",
-        description="Search the public internet using Google Search API to retrieve recent or real-time information."
-    )
-    def web_search(self, query: str) -> str:
-        """Search the internet using Google Programmable Search Engine."""
-        base_url = "https://www.googleapis.com/customsearch/v1"
+    # Intent router hints (see sk_runtime/intent_router.py)
+    INTENTS = ("web",)
+    PREFETCH_FUNCTION = "web_search"
+
+    def __init__(self):
+        # Shared keep-alive pool; closed with the other pooled clients on app shutdown
+        self._client = get_async_http_client("web")
+
+    async def _search(self, query: str, num: int) -> List[Dict[str, str]]:
         params = {
             "key": GOOGLE_API_KEY,
             "cx": GOOGLE_SEARCH_ENGINE_ID,
             "q": query,
-            "num": 3
+            "num": num,
         }
+        response = await self._client.get(GOOGLE_SEARCH_URL, params=params, timeout=build_timeout(WEB_SEARCH_READ_TIMEOUT))
+        response.raise_for_status()
+        items = response.json().get("items", [])
+        return [
+            {"title": item.get("title", ""), "snippet": item.get("snippet", ""), "link": item.get("link", "")}
+            for item in items
+        ]
 
-        try:
-            response = requests.get(base_url, params=params)
+    async def _read_capped(self, url: str) -> Optional[str]:
+        async with self._client.stream("GET", url, timeout=build_timeout(WEB_PAGE_TIMEOUT), follow_redirects=True) as response:
             response.raise_for_status()
-            data = response.json()
-            items = data.get("items", [])
+            content_type = response.headers.get("content-type", "")
+            if "html" not in content_type and "text/plain" not in content_type:
+                return None
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) >= WEB_PAGE_MAX_BYTES:
+                    break
+            text = bytes(body[:WEB_PAGE_MAX_BYTES]).decode(response.encoding or "utf-8", errors="replace")
+        if "html" in content_type:
+            return extract_main_text(text)
+        return text[:WEB_PAGE_MAX_CHARS]
+
+    @staticmethod
+    def format_result(result: Dict[str, str]) -> str:
+        """One search result as the text block web_search returns for it."""
+        block = f"{result['title']}\n{result['snippet']}\n{result['link']}"
+        if result.get("content"):
+            block += f"\n\n{result['content']}"
+        return block
+
+    async def _fetch_page(self, url: str) -> Optional[str]:
+        """Fetch and extract one result page within the time and size caps; None on any failure."""
+        if not url.startswith(("http://", "https://")):
+            return None
+        try:
+            return await asyncio.wait_for(self._read_capped(url), WEB_PAGE_TIMEOUT)
+        except Exception as e:
+            logger.info(f"Skipping page content for {url}: {type(e).__name__}: {e}")
+            return None
+
+    async def search_results(self, query: str, fetch_pages: bool = False) -> List[Dict[str, str]]:
+        """
+        Return search results (title, snippet, link and optionally page text), served from the result cache when fresh.
 
-            if not items:
-                return "No search results found."
+        Failures (HTTP errors, timeouts) are raised; no results is an empty list.
+        """
+        # Live data: answers that used the web are never reused by the answer cache
+        data_versions.observe(WEB_CACHE_NAMESPACE, None)
+        params = {"num": WEB_SEARCH_NUM_RESULTS, "fetch_pages": fetch_pages, "max_chars": WEB_PAGE_MAX_CHARS}
 
-            results = []
-            for item in items:
-                title = item.get("title", "")
-                snippet = item.get("snippet", "")
-                link = item.get("link", "")
-                results.append(f"{title}\n{snippet}\n{link}")
+        async def load() -> List[Dict[str, str]]:
+            results = await self._search(query, WEB_SEARCH_NUM_RESULTS)
+            if fetch_pages and results:
+                pages = await asyncio.gather(*(self._fetch_page(result["link"]) for result in results))
+                for result, page in zip(results, pages):
+                    if page:
+                        result["content"] = page
+            return results
 
-            return "\n\n---\n\n".join(results)
+        return await get_search_cache().get_or_load(WEB_CACHE_NAMESPACE, query, params, load)
 
+    @kernel_function(
+        name="web_search",
+        description=(
+            "Search the public internet using Google Search API to retrieve recent or real-time information. "
+            "Set fetch_pages to also read the main text of the top result pages when snippets are not enough."
+        )
+    )
+    async def web_search(
+        self,
+        query: str,
+        fetch_pages: Annotated[bool, "Also fetch and return the main text of the top result pages (slower, more complete)."] = False,
+    ) -> str:
+        """Search the internet using Google Programmable Search Engine."""
+        try:
+            results = await self.search_results(query, fetch_pages)
         except Exception as e:
-            return f"Error during Google web search: {e}"
+            return f"Error during Google web search: {type(e).__name__}: {e}"
+
+        if not results:
+            return "No search results found."
+
+        return RESULT_SEPARATOR.join(self.format_result(result) for result in results)
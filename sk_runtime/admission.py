@@ -0,0 +1,451 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+import httpx
+from opentelemetry import metrics
+
+from sk_runtime.http_pool import register_transport_wrapper
+from sk_runtime.turn_metrics import current_turn
+
+# -------------------------------
+# Admission control for Azure OpenAI
+# -------------------------------
+#
+# Wraps the transport of the pooled "azure_openai" HTTP client, so every chat
+# completion (streaming or not), summary and embedding request from both apps
+# goes through one scheduler:
+#
+#   * at most LLM_MAX_CONCURRENCY requests in flight; the rest wait in a fair
+#     queue with one FIFO per session, served round-robin, so a chatty session
+#     cannot starve the others; requests made outside a user turn (background
+#     history summaries) are served only when no turn is waiting
+#   * token buckets for the deployment's requests and tokens per minute, seeded
+#     from LLM_RPM_LIMIT / LLM_TPM_LIMIT or learned from x-ratelimit-* headers and
+#     corrected by every response's remaining-quota headers
+#   * 429 and transient 5xx/connection failures are retried with jittered
+#     exponential backoff, honouring retry-after(-ms); a 429 also pauses the
+#     buckets so other requests do not run into the same limit
+#
+# The OpenAI SDK's own retries are disabled for wrapped pools (see KernelProvider).
+# Queue depth, queue wait, quota wait and retries are exported as OpenTelemetry
+# metrics, added to the turn's `llm_wait_ms`, and summarized by `snapshot()`.
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "true").lower() == "true"
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Deployment quota; 0 learns it from x-ratelimit-limit-* (or the largest remaining quota seen)
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE_MS = float(os.getenv("LLM_RETRY_BASE_MS", "500"))
+# A retry-after longer than this is not waited for; the error goes back to the caller
+LLM_RETRY_MAX_WAIT = float(os.getenv("LLM_RETRY_MAX_WAIT", "20"))
+# Completion tokens assumed for a request without max_tokens, when charging the token bucket
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "500"))
+
+BUSY_MESSAGE = "The assistant is very busy right now. Please try again in a moment."
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+INTERACTIVE, BACKGROUND = 0, 1
+# Retry limit for the current request when the caller has a better fallback than waiting
+# (another deployment, see deployment_router.py); None uses the controller's max_retries
+max_retries_override: ContextVar[Optional[int]] = ContextVar("llm_max_retries_override", default=None)
+
+meter = metrics.get_meter("sk_runtime")
+queue_depth = meter.create_up_down_counter("sk.llm.queue.depth", unit="{request}", description="Requests waiting for an LLM slot")
+in_flight_requests = meter.create_up_down_counter("sk.llm.in_flight", unit="{request}", description="LLM requests in flight")
+queue_wait = meter.create_histogram("sk.llm.queue.wait", unit="ms", description="Time waiting for an LLM slot")
+quota_wait = meter.create_histogram("sk.llm.quota.wait", unit="ms", description="Time waiting for RPM/TPM quota")
+retries = meter.create_counter("sk.llm.retries", unit="{request}", description="Retried LLM requests by reason")
+
+
+class TokenBucket:
+    """
+    Per-minute quota as a continuously refilled bucket.
+
+    Args:
+        per_minute: Quota per minute; 0 means unknown (never waits until a limit is learned).
+    """
+
+    def __init__(self, per_minute: float = 0) -> None:
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.capacity / 60)
+        self._updated = now
+
+    def set_limit(self, per_minute: float) -> None:
+        if per_minute > 0 and per_minute != self.capacity:
+            self._refill(time.monotonic())
+            grown = per_minute - self.capacity
+            self.capacity = float(per_minute)
+            self.level = min(self.capacity, self.level + max(0.0, grown))
+
+    def observe_remaining(self, remaining: float) -> None:
+        """The service's remaining quota is the truth; never believe more than it reports."""
+        now = time.monotonic()
+        self._refill(now)
+        self.level = min(self.level, remaining)
+
+    def block(self, seconds: float) -> None:
+        """Throttled by the service: nothing is available for `seconds`."""
+        now = time.monotonic()
+        self._refill(now)
+        self._blocked_until = max(self._blocked_until, now + seconds)
+        self.level = min(self.level, 0.0)
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (requests larger than the bucket wait for a full bucket)."""
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return 0.0 if missing <= 0 else missing * 60 / self.capacity
+
+    def take(self, amount: float) -> None:
+        self._refill(time.monotonic())
+        self.level -= min(amount, self.capacity) if self.capacity > 0 else 0
+
+
+class FairScheduler:
+    """
+    Concurrency limit with per-session FIFO queues served round-robin, interactive before background.
+
+    Args:
+        max_concurrency: Requests allowed in flight at once.
+    """
+
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY) -> None:
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.queued = 0
+        # priority -> session -> waiters; the OrderedDict order is the round-robin order
+        self._queues: Dict[int, "OrderedDict[str, Deque[asyncio.Future]]"] = {INTERACTIVE: OrderedDict(), BACKGROUND: OrderedDict()}
+
+    async def acquire(self, session: str, priority: int = INTERACTIVE) -> None:
+        if self.in_flight < self.max_concurrency and not self.queued:
+            self.in_flight += 1
+            in_flight_requests.add(1)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(session, deque()).append(future)
+        self.queued += 1
+        queue_depth.add(1)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # the slot was handed over as we were cancelled
+            else:
+                self._remove(priority, session, future)
+            raise
+
+    def _remove(self, priority: int, session: str, future: asyncio.Future) -> None:
+        waiters = self._queues[priority].get(session)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            queue_depth.add(-1)
+            if not waiters:
+                del self._queues[priority][session]
+
+    def release(self) -> None:
+        """Hand the slot to the next waiter (round-robin across sessions) or free it."""
+        for priority in (INTERACTIVE, BACKGROUND):
+            sessions = self._queues[priority]
+            while sessions:
+                session, waiters = next(iter(sessions.items()))
+                future = waiters.popleft()
+                self.queued -= 1
+                queue_depth.add(-1)
+                if waiters:
+                    sessions.move_to_end(session)
+                else:
+                    del sessions[session]
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.in_flight -= 1
+        in_flight_requests.add(-1)
+
+    def sessions_waiting(self) -> int:
+        return sum(len(sessions) for sessions in self._queues.values())
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives the concurrency slot back when the stream is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]) -> None:
+        self._stream = stream
+        self._release: Optional[Callable[[], None]] = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+        await self._stream.aclose()
+
+
+def _header_float(headers: httpx.Headers, name: str) -> Optional[float]:
+    value = headers.get(name)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def retry_after(headers: httpx.Headers) -> Optional[float]:
+    """Seconds to wait from retry-after-ms or retry-after (seconds or HTTP date)."""
+    milliseconds = _header_float(headers, "retry-after-ms")
+    if milliseconds is not None:
+        return milliseconds / 1000
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff in seconds."""
+    return random.uniform(0, LLM_RETRY_BASE_MS * (2 ** attempt)) / 1000
+
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """Prompt (~4 bytes per token) plus the completion budget the request asks for."""
+    try:
+        body = request.content
+    except httpx.RequestNotRead:
+        return LLM_COMPLETION_TOKENS_ESTIMATE
+    completion = LLM_COMPLETION_TOKENS_ESTIMATE
+    if body[:1] == b"{":
+        try:
+            payload = json.loads(body)
+            completion = payload.get("max_completion_tokens") or payload.get("max_tokens") or completion
+        except ValueError:
+            pass
+    return len(body) // 4 + int(completion)
+
+
+def _caller() -> Tuple[str, int]:
+    turn = current_turn.get()
+    if turn is None:
+        return "background", BACKGROUND
+    return turn.session_id or f"turn-{id(turn)}", INTERACTIVE
+
+
+class AdmissionTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that schedules, rate-limits and retries requests before handing them to `inner`.
+
+    Args:
+        inner: The real transport.
+        controller: Shared scheduler, buckets and counters.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, controller: "AdmissionController") -> None:
+        self.inner = inner
+        self.controller = controller
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        controller = self.controller
+        session, priority = _caller()
+        tokens = estimate_tokens(request)
+        max_retries = max_retries_override.get()
+        max_retries = controller.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            await controller.scheduler.acquire(session, priority)
+            waited = controller.record_wait(queue_wait, started)
+            try:
+                started = time.perf_counter()
+                await controller.await_quota(tokens)
+                waited += controller.record_wait(quota_wait, started)
+                response = await self.inner.handle_async_request(request)
+            except RETRY_ERRORS as e:
+                controller.scheduler.release()
+                if attempt >= max_retries:
+                    raise
+                delay = backoff(attempt)
+                reason = type(e).__name__
+            except BaseException:
+                controller.scheduler.release()
+                raise
+            else:
+                controller.observe(response.headers)
+                delay = retry_after(response.headers) if response.status_code in RETRY_STATUSES else None
+                if response.status_code not in RETRY_STATUSES or attempt >= max_retries or (
+                    delay is not None and delay > controller.max_retry_wait
+                ):
+                    controller.add_turn_wait(waited)
+                    return httpx.Response(
+                        status_code=response.status_code,
+                        headers=response.headers,
+                        stream=_ReleasingStream(response.stream, controller.scheduler.release),
+                        extensions=response.extensions,
+                        request=request,
+                    )
+                await response.aclose()
+                controller.scheduler.release()
+                delay = backoff(attempt) if delay is None else delay
+                reason = str(response.status_code)
+                if response.status_code == 429:
+                    controller.throttled(delay)
+
+            attempt += 1
+            controller.retries += 1
+            retries.add(1, {"sk.llm.retry.reason": reason})
+            logger.info(f"Azure OpenAI request retry {attempt}/{max_retries} in {delay:.2f}s ({reason}).")
+            controller.add_turn_wait(waited + delay * 1000)
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+
+class AdmissionController:
+    """Scheduler, quota buckets and counters shared by every request through the wrapped pool."""
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        rpm: int = LLM_RPM_LIMIT,
+        tpm: int = LLM_TPM_LIMIT,
+        max_retries: int = LLM_MAX_RETRIES,
+        max_retry_wait: float = LLM_RETRY_MAX_WAIT,
+    ) -> None:
+        self.scheduler = FairScheduler(max_concurrency)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self.retries = 0
+        self.throttles = 0
+        self._waits: Deque[float] = deque(maxlen=1000)
+
+    def wrap(self, transport: httpx.AsyncBaseTransport) -> httpx.AsyncBaseTransport:
+        return AdmissionTransport(transport, self)
+
+    async def await_quota(self, tokens: int) -> None:
+        while True:
+            delay = max(self.requests.delay_for(1), self.tokens.delay_for(tokens))
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        self.requests.take(1)
+        self.tokens.take(tokens)
+
+    def observe(self, headers: httpx.Headers) -> None:
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = _header_float(headers, f"x-ratelimit-limit-{kind}")
+            remaining = _header_float(headers, f"x-ratelimit-remaining-{kind}")
+            if limit is not None:
+                bucket.set_limit(limit)
+            elif remaining is not None and remaining > bucket.capacity:
+                bucket.set_limit(remaining)  # best guess at the limit until the service reports it
+            if remaining is not None:
+                bucket.observe_remaining(remaining)
+
+    def throttled(self, seconds: float) -> None:
+        self.throttles += 1
+        self.requests.block(seconds)
+        self.tokens.block(seconds)
+
+    def record_wait(self, histogram: Any, started: float) -> float:
+        waited = (time.perf_counter() - started) * 1000
+        histogram.record(waited)
+        if histogram is queue_wait:
+            self._waits.append(waited)
+        return waited
+
+    @staticmethod
+    def add_turn_wait(milliseconds: float) -> None:
+        turn = current_turn.get()
+        if turn is not None:
+            turn.llm_wait_ms += milliseconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Queue and quota state plus recent queue-wait percentiles, for logs or capacity sizing."""
+        waits = sorted(self._waits)
+
+        def percentile(pct: float) -> Optional[float]:
+            return round(waits[min(len(waits) - 1, int(len(waits) * pct))], 1) if waits else None
+
+        return {
+            "in_flight": self.scheduler.in_flight,
+            "queued": self.scheduler.queued,
+            "sessions_waiting": self.scheduler.sessions_waiting(),
+            "queue_wait_p50_ms": percentile(0.50),
+            "queue_wait_p95_ms": percentile(0.95),
+            "retries": self.retries,
+            "throttles": self.throttles,
+            "rpm_limit": self.requests.capacity or None,
+            "tpm_limit": self.tokens.capacity or None,
+        }
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """True when `error` (or an exception it wraps) is a 429 that outlasted the retries."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if getattr(error, "status_code", None) == 429:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+_controllers: Dict[str, AdmissionController] = {}
+
+
+def enable_admission_control(
+    pool: str = "azure_openai", rpm: int = LLM_RPM_LIMIT, tpm: int = LLM_TPM_LIMIT
+) -> Optional[AdmissionController]:
+    """
+    Put the named HTTP pool behind admission control (once per process); returns its controller.
+
+    Call before the pool's client is first used. Returns None when ADMISSION_CONTROL is off.
+
+    Args:
+        pool: Name of the pooled HTTP client (one per Azure OpenAI deployment when routing across several).
+        rpm: Requests-per-minute quota of the deployment behind the pool (0 = learn it from headers).
+        tpm: Tokens-per-minute quota of the deployment behind the pool (0 = learn it from headers).
+    """
+    if not ADMISSION_CONTROL:
+        return None
+    controller = _controllers.get(pool)
+    if controller is None:
+        controller = AdmissionController(rpm=rpm, tpm=tpm)
+        _controllers[pool] = controller
+        register_transport_wrapper(pool, controller.wrap)
+    return controller
+
+
+def get_admission_controller(pool: str = "azure_openai") -> Optional[AdmissionController]:
+    return _controllers.get(pool)
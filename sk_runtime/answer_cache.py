@@ -0,0 +1,303 @@
+import os
+import re
+import time
+import zlib
+import logging
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Protocol, Tuple
+
+import numpy as np
+from opentelemetry import metrics
+
+from sk_runtime import data_versions
+from sk_runtime.result_cache import normalize_query, parse_ttls
+from sk_runtime.turn_metrics import TurnMetrics
+
+# -------------------------------
+# Semantic answer cache
+# -------------------------------
+#
+# Near-duplicate FAQ questions ("what time is the dolphin show?") are answered from
+# recent answers instead of a full tool-calling turn. Questions are embedded and
+# matched by cosine similarity against a fixed-size NumPy matrix of recent
+# questions (least recently used slots are evicted when it is full).
+#
+# Each answer remembers the data versions its tools read (see data_versions.py);
+# a hit is only served while every one of them is still current and the answer is
+# younger than its TTL. Answers built on live data (web search), failed turns and
+# follow-up questions that depend on the conversation are never stored.
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_CAPACITY = int(os.getenv("ANSWER_CACHE_CAPACITY", "512"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Per-source maximum answer age, e.g. "inventory=120" (stock changes without a version bump being seen)
+ANSWER_CACHE_MAX_AGES = os.getenv("ANSWER_CACHE_MAX_AGES", "inventory=120")
+# Optional Azure OpenAI embedding deployment; the local hashing embedder is used otherwise
+ANSWER_CACHE_EMBEDDING_DEPLOYMENT = os.getenv("ANSWER_CACHE_EMBEDDING_DEPLOYMENT")
+
+meter = metrics.get_meter("sk_runtime")
+cache_lookups = meter.create_counter("sk.answer_cache.lookups", unit="{lookup}", description="Answer cache lookups by result")
+
+# Question words carry the intent ("when" vs "where"), so they are not stop words
+STOP_WORDS = frozenset(
+    "a an the is are was were be do does did of to in on at for and or can i we you my our me "
+    "it its this that there please tell about".split()
+)
+# Openers that refer back to the conversation; such questions cannot be answered out of context
+_FOLLOW_UP = re.compile(r"^(and|but|also|what about|how about|then|so|it|its|that|this|those|these|they|them|there|he|she)\b")
+
+
+def is_standalone(question: str) -> bool:
+    """Heuristic: True when the question does not lean on earlier turns."""
+    text = normalize_query(question)
+    return len(text) >= 8 and not _FOLLOW_UP.match(text)
+
+
+class Embedder(Protocol):
+    async def embed(self, text: str) -> np.ndarray:
+        """Return an L2-normalized float32 vector."""
+
+
+class HashingEmbedder:
+    """
+    Dependency-free lexical embedding: hashed words, word bigrams and character 4-grams.
+
+    Catches rephrasings that differ in casing, punctuation, stop words and word
+    forms; use an embedding deployment for paraphrases with different vocabulary.
+    """
+
+    def __init__(self, dim: int = 2048) -> None:
+        self.dim = dim
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        words = [word for word in normalize_query(text).split() if word not in STOP_WORDS]
+        features = [(word, 1.0) for word in words]
+        features += [(f"{a}_{b}", 0.7) for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [(padded[i:i + 4], 0.3) for i in range(max(1, len(padded) - 3))]
+        return features
+
+    async def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += weight if h & 1 else -weight
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class AzureEmbedder:
+    """Embeddings from an Azure OpenAI embedding deployment (one short request per question)."""
+
+    def __init__(self, client, deployment: str) -> None:
+        self.client = client
+        self.deployment = deployment
+
+    async def embed(self, text: str) -> np.ndarray:
+        response = await self.client.embeddings.create(model=self.deployment, input=normalize_query(text) or text)
+        vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    stored_at: float
+    data_versions: Dict[str, str]
+    tools: List[str] = field(default_factory=list)
+    similarity: float = 1.0
+
+
+@dataclass
+class AnswerCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stale: int = 0
+    stored: int = 0
+    skipped: int = 0
+    evictions: int = 0
+
+
+class AnswerCache:
+    """
+    Similarity-matched cache of final answers.
+
+    Args:
+        embedder: Turns questions into normalized vectors.
+        capacity: Number of answers kept; the least recently used is evicted.
+        threshold: Minimum cosine similarity for a hit.
+        ttl: Maximum answer age in seconds.
+        max_ages: Per-source maximum age overrides (shorter wins).
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        capacity: int = ANSWER_CACHE_CAPACITY,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL,
+        max_ages: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.embedder = embedder
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_ages = dict(max_ages or {})
+        self.stats = AnswerCacheStats()
+        self._vectors: Optional[np.ndarray] = None  # (capacity, dim), allocated on first store
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._answers: List[Optional[CachedAnswer]] = [None] * capacity
+        # The last question embedded, so a miss followed by a store embeds once
+        self._recent: Tuple[str, Optional[np.ndarray]] = ("", None)
+
+    async def _embed(self, question: str) -> np.ndarray:
+        key = normalize_query(question)
+        if self._recent[0] == key and self._recent[1] is not None:
+            return self._recent[1]
+        vector = await self.embedder.embed(question)
+        self._recent = (key, vector)
+        return vector
+
+    def _drop(self, slot: int) -> None:
+        self._answers[slot] = None
+        self._last_used[slot] = 0.0
+        if self._vectors is not None:
+            self._vectors[slot] = 0.0
+
+    def _is_fresh(self, entry: CachedAnswer, now: float) -> bool:
+        age = now - entry.stored_at
+        if age > min([self.ttl, *(self.max_ages[s] for s in entry.data_versions if s in self.max_ages)]):
+            return False
+        return all(data_versions.current_version(source) == version for source, version in entry.data_versions.items())
+
+    def _record(self, result: str) -> None:
+        cache_lookups.add(1, {"sk.answer_cache.result": result})
+
+    async def lookup(self, question: str) -> Optional[CachedAnswer]:
+        """Return a fresh cached answer for a similar question, or None."""
+        if not is_standalone(question):
+            return None
+        if self._vectors is None:
+            self.stats.misses += 1
+            self._record("miss")
+            return None
+        try:
+            vector = await self._embed(question)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup skipped, embedding failed: {e}")
+            return None
+        similarities = self._vectors @ vector
+        slot = int(np.argmax(similarities))
+        entry = self._answers[slot]
+        if entry is None or similarities[slot] < self.threshold:
+            self.stats.misses += 1
+            self._record("miss")
+            return None
+        now = time.time()
+        if not self._is_fresh(entry, now):
+            self._drop(slot)
+            self.stats.stale += 1
+            self._record("stale")
+            return None
+        self._last_used[slot] = now
+        self.stats.hits += 1
+        self._record("hit")
+        return CachedAnswer(**{**asdict(entry), "similarity": float(similarities[slot])})
+
+    async def store(self, question: str, answer: str, turn: TurnMetrics) -> bool:
+        """Remember the answer to a finished turn if it is safe to reuse; returns whether it was stored."""
+        versions = turn.data_versions
+        if (
+            not answer
+            or turn.error is not None
+            or not is_standalone(question)
+            # Only tool-grounded answers on versioned data are reused
+            or not versions
+            or any(version is None for version in versions.values())
+        ):
+            self.stats.skipped += 1
+            return False
+
+        try:
+            vector = await self._embed(question)
+        except Exception as e:
+            logger.warning(f"Answer not cached, embedding failed: {e}")
+            self.stats.skipped += 1
+            return False
+        if self._vectors is None:
+            self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+
+        similarities = self._vectors @ vector
+        best = int(np.argmax(similarities))
+        if self._answers[best] is not None and similarities[best] >= self.threshold:
+            slot = best  # refresh the near-duplicate instead of storing it twice
+        else:
+            empty = [i for i, entry in enumerate(self._answers) if entry is None]
+            slot = empty[0] if empty else int(np.argmin(self._last_used))
+            if not empty:
+                self.stats.evictions += 1
+
+        now = time.time()
+        self._vectors[slot] = vector
+        self._last_used[slot] = now
+        self._answers[slot] = CachedAnswer(
+            question=question, answer=answer, stored_at=now, data_versions=dict(versions), tools=list(turn.tools)
+        )
+        self.stats.stored += 1
+        return True
+
+    def invalidate(self, source: Optional[str] = None) -> int:
+        """Drop answers that depend on `source` (or all answers); returns how many were removed."""
+        removed = 0
+        for slot, entry in enumerate(self._answers):
+            if entry is not None and (source is None or source in entry.data_versions):
+                self._drop(slot)
+                removed += 1
+        logger.info(f"Invalidated {removed} cached answers for '{source or '*'}'.")
+        return removed
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters plus current size, suitable for logging or a metrics exporter."""
+        return {**asdict(self.stats), "size": sum(entry is not None for entry in self._answers)}
+
+
+_answer_caches: Dict[str, AnswerCache] = {}
+
+
+def azure_embedder(deployment: str) -> AzureEmbedder:
+    """AzureEmbedder for an embedding deployment, configured from the app settings."""
+    from openai import AsyncAzureOpenAI
+    from sk_runtime.http_pool import get_async_http_client
+    from sk_runtime.settings import get_settings
+
+    settings = get_settings()
+    client = AsyncAzureOpenAI(
+        api_key=settings.azure_openai_api_key,
+        api_version=settings.azure_openai_api_version,
+        azure_endpoint=settings.azure_openai_embedding_endpoint or settings.azure_openai_endpoint,
+        http_client=get_async_http_client("azure_openai"),
+    )
+    return AzureEmbedder(client, deployment)
+
+
+def _default_embedder() -> Embedder:
+    if not ANSWER_CACHE_EMBEDDING_DEPLOYMENT:
+        return HashingEmbedder()
+    return azure_embedder(ANSWER_CACHE_EMBEDDING_DEPLOYMENT)
+
+
+def get_answer_cache(name: str) -> Optional[AnswerCache]:
+    """Return the answer cache for an app (each app has its own prompt), or None when disabled."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    cache = _answer_caches.get(name)
+    if cache is None:
+        cache = AnswerCache(_default_embedder(), max_ages=parse_ttls(ANSWER_CACHE_MAX_AGES))
+        _answer_caches[name] = cache
+    return cache
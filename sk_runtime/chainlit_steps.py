@@ -0,0 +1,55 @@
+import json
+from typing import Any, Awaitable, Callable
+
+import chainlit as cl
+from semantic_kernel.filters import FunctionInvocationContext
+
+from sk_runtime.turn_metrics import current_turn
+
+# -------------------------------
+# Tool-call progress steps for the Chainlit UI
+# -------------------------------
+
+# Longest tool output shown inside a step; the model still receives the full result
+STEP_OUTPUT_PREVIEW_CHARS = 2000
+
+
+def _preview(value: Any) -> str:
+    if isinstance(value, str):
+        text = value
+    else:
+        try:
+            text = json.dumps(value, ensure_ascii=False, default=str)
+        except (TypeError, ValueError):
+            text = str(value)
+    if len(text) > STEP_OUTPUT_PREVIEW_CHARS:
+        return text[:STEP_OUTPUT_PREVIEW_CHARS] + " …"
+    return text
+
+
+async def tool_step_filter(
+    context: FunctionInvocationContext,
+    next: Callable[[FunctionInvocationContext], Awaitable[None]],
+) -> None:
+    """
+    Kernel function-invocation filter that counts tool calls and shows each one as a Chainlit step.
+
+    Only active while a turn is being tracked (see `track_turn`); untracked calls pass
+    straight through, and steps are skipped when the turn has `show_steps` off.
+    """
+    metrics = current_turn.get()
+    if metrics is None:
+        await next(context)
+        return
+
+    name = f"{context.function.plugin_name}.{context.function.name}"
+    metrics.tool_calls += 1
+    metrics.tools.append(name)
+    if not metrics.show_steps:
+        await next(context)
+        return
+
+    async with cl.Step(name=name, type="tool") as step:
+        step.input = _preview(dict(context.arguments))
+        await next(context)
+        step.output = _preview(context.result.value if context.result is not None else None)
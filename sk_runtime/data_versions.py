@@ -0,0 +1,47 @@
+import logging
+from typing import Callable, Dict, Optional
+
+from sk_runtime.turn_metrics import current_turn
+
+# -------------------------------
+# Data versions of the sources behind an answer
+# -------------------------------
+#
+# Plugins call `observe(source, version)` whenever they read data, which records the
+# dependency on the current turn. Anything that reuses an answer later (the answer
+# cache) compares those versions with `current_version(source)` and discards the
+# answer if a source has changed since.
+#
+# A version of None marks live data (e.g. web search): answers built on it are
+# never reused.
+
+logger = logging.getLogger(__name__)
+
+_observed: Dict[str, str] = {}
+_resolvers: Dict[str, Callable[[], Optional[str]]] = {}
+
+
+def register_resolver(source: str, resolver: Callable[[], Optional[str]]) -> None:
+    """Let `current_version(source)` ask the owner of the data (e.g. a cache generation) instead of the last observation."""
+    _resolvers[source] = resolver
+
+
+def observe(source: str, version: Optional[str]) -> None:
+    """Record that the current turn used `source` at `version`."""
+    if version is not None:
+        _observed[source] = version
+    turn = current_turn.get()
+    if turn is not None:
+        turn.data_versions[source] = version
+
+
+def current_version(source: str) -> Optional[str]:
+    """The newest known version of `source`, or None when it is unknown or live."""
+    resolver = _resolvers.get(source)
+    if resolver is not None:
+        try:
+            return resolver()
+        except Exception as e:
+            logger.warning(f"Could not resolve the data version of '{source}': {e}")
+            return None
+    return _observed.get(source)
@@ -0,0 +1,418 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from openai import APIError, APIStatusError, AsyncAzureOpenAI, AsyncStream
+from opentelemetry import metrics
+
+from sk_runtime.admission import AdmissionController, enable_admission_control, max_retries_override
+from sk_runtime.http_pool import get_async_http_client, has_transport_wrapper
+from sk_runtime.turn_metrics import current_turn
+
+# -------------------------------
+# Routing across Azure OpenAI deployments
+# -------------------------------
+#
+# AZURE_OPENAI_DEPLOYMENTS lists several deployments (regions, resources) of the
+# chat model, inline as JSON or as the path of a JSON file:
+#
+#   [{"name": "swedencentral", "endpoint": "https://a.openai.azure.com/", "deployment": "gpt-4.1",
+#     "api_key_env": "AZURE_OPENAI_API_KEY_SWEDEN", "weight": 2, "rpm": 300, "tpm": 50000},
+#    {"name": "eastus2", "base_url": "https://b.openai.azure.com/openai", "deployment": "gpt-41"}]
+#
+# Missing api_key / api_version / deployment fall back to the app's own settings.
+# Each deployment gets its own pooled HTTP client and admission controller (its
+# quota), and every chat request is sent to the deployment with the best recent
+# record: time to first chunk over the last LLM_ROUTER_WINDOW_S seconds, inflated
+# by its error rate and by any wait for its quota, with `weight` as a preference.
+# A request that fails with a 429, 5xx, timeout or connection error before its
+# first chunk moves on to the next deployment, and LLM_ROUTER_EJECT_AFTER failures
+# in a row take a deployment out of rotation for LLM_ROUTER_COOLDOWN_S.
+#
+# With LLM_HEDGE_AFTER_MS set, a streaming request that has produced nothing
+# after that long (or "auto": the deployment's recent p95) is also sent to the
+# runner-up; the first to answer wins and the other is cancelled. Hedging spends
+# quota on the duplicates, so it is off by default.
+
+logger = logging.getLogger(__name__)
+
+LLM_ROUTER_WINDOW_S = float(os.getenv("LLM_ROUTER_WINDOW_S", "60"))
+LLM_ROUTER_EJECT_AFTER = int(os.getenv("LLM_ROUTER_EJECT_AFTER", "3"))
+LLM_ROUTER_COOLDOWN_S = float(os.getenv("LLM_ROUTER_COOLDOWN_S", "30"))
+# Other deployments tried after the first one fails
+LLM_FAILOVER_ATTEMPTS = int(os.getenv("LLM_FAILOVER_ATTEMPTS", "2"))
+LLM_HEDGE_AFTER_MS = os.getenv("LLM_HEDGE_AFTER_MS", "0").lower()
+# Latency samples needed before "auto" hedging trusts a deployment's p95
+HEDGE_MIN_SAMPLES = 20
+# Each failed request in the window counts as this many extra average latencies
+ERROR_PENALTY = 4.0
+FAILOVER_STATUSES = frozenset({408, 409, 429})
+
+meter = metrics.get_meter("sk_runtime")
+first_chunk_latency = meter.create_histogram(
+    "sk.llm.deployment.latency", unit="ms", description="Time to first chunk (or full response) per deployment"
+)
+failover_counter = meter.create_counter("sk.llm.failovers", unit="{request}", description="Requests moved to another deployment")
+hedge_counter = meter.create_counter("sk.llm.hedges", unit="{request}", description="Hedged streaming requests")
+
+
+@dataclass
+class Deployment:
+    """One Azure OpenAI deployment the chat service can route to."""
+
+    name: str
+    deployment: Optional[str] = None
+    endpoint: Optional[str] = None
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    api_version: Optional[str] = None
+    weight: float = 1.0
+    rpm: int = 0
+    tpm: int = 0
+
+
+def load_deployments(spec: Optional[str] = None) -> List[Deployment]:
+    """
+    Parse `spec` or AZURE_OPENAI_DEPLOYMENTS (inline JSON list or path to a JSON file); empty when unset.
+
+    Read at call time, so a .env loaded after import still applies.
+
+    Raises:
+        ValueError: If an entry has neither an endpoint nor a base_url.
+    """
+    spec = os.getenv("AZURE_OPENAI_DEPLOYMENTS") if spec is None else spec
+    if not spec or not spec.strip():
+        return []
+    text = spec.strip()
+    if not text.startswith("["):
+        with open(text, encoding="utf-8") as f:
+            text = f.read()
+    deployments = []
+    for index, entry in enumerate(json.loads(text)):
+        if not entry.get("endpoint") and not entry.get("base_url"):
+            raise ValueError(f"AZURE_OPENAI_DEPLOYMENTS entry {index} needs an endpoint or a base_url.")
+        api_key = entry.get("api_key")
+        if api_key is None and entry.get("api_key_env"):
+            api_key = os.getenv(entry["api_key_env"])
+        deployments.append(Deployment(
+            name=entry.get("name") or f"deployment-{index}",
+            deployment=entry.get("deployment"),
+            endpoint=entry.get("endpoint"),
+            base_url=entry.get("base_url"),
+            api_key=api_key,
+            api_version=entry.get("api_version"),
+            weight=float(entry.get("weight", 1.0)),
+            rpm=int(entry.get("rpm", 0)),
+            tpm=int(entry.get("tpm", 0)),
+        ))
+    return deployments
+
+
+def build_async_client(deployment: Deployment, http_pool: str) -> AsyncAzureOpenAI:
+    """AsyncAzureOpenAI client for `deployment` on top of the pooled HTTP client `http_pool`."""
+    client_args: Dict[str, Any] = {
+        "api_key": deployment.api_key,
+        "api_version": deployment.api_version,
+        "azure_deployment": deployment.deployment,
+        "http_client": get_async_http_client(http_pool),
+    }
+    if has_transport_wrapper(http_pool):
+        # The pool's transport schedules and retries (see admission.py); SDK retries would multiply them
+        client_args["max_retries"] = 0
+    if deployment.base_url:
+        client_args["base_url"] = deployment.base_url
+    else:
+        client_args["azure_endpoint"] = deployment.endpoint
+    return AsyncAzureOpenAI(**client_args)
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Errors another deployment may not have: throttling, server errors, timeouts, broken connections."""
+    if isinstance(error, APIStatusError):
+        return error.status_code in FAILOVER_STATUSES or error.status_code >= 500
+    return isinstance(error, (APIError, httpx.TransportError, asyncio.TimeoutError))
+
+
+class DeploymentHealth:
+    """Moving-window latency and outcome record of one deployment, with a simple circuit breaker."""
+
+    def __init__(self, window_s: float = LLM_ROUTER_WINDOW_S) -> None:
+        self.window_s = window_s
+        self.latencies: Deque[Tuple[float, float]] = deque()
+        self.outcomes: Deque[Tuple[float, bool]] = deque()
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.in_flight = 0
+
+    def _trim(self, now: float) -> None:
+        for samples in (self.latencies, self.outcomes):
+            while samples and now - samples[0][0] > self.window_s:
+                samples.popleft()
+
+    def record_latency(self, milliseconds: float) -> None:
+        now = time.monotonic()
+        self.latencies.append((now, milliseconds))
+        self._trim(now)
+
+    def record_success(self, milliseconds: float) -> None:
+        self.record_latency(milliseconds)
+        self.outcomes.append((time.monotonic(), True))
+        self.consecutive_failures = 0
+
+    def record_failure(self) -> bool:
+        """Count a failure; True when it takes the deployment out of rotation."""
+        now = time.monotonic()
+        self.outcomes.append((now, False))
+        self._trim(now)
+        self.consecutive_failures += 1
+        # Past the threshold a single failure re-ejects, so a recovered deployment gets one probe at a time
+        if self.consecutive_failures >= LLM_ROUTER_EJECT_AFTER:
+            self.ejected_until = now + LLM_ROUTER_COOLDOWN_S
+            return True
+        return False
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def latency_ms(self, pct: float = 0.5) -> Optional[float]:
+        self._trim(time.monotonic())
+        if not self.latencies:
+            return None
+        ordered = sorted(latency for _, latency in self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def error_rate(self) -> float:
+        self._trim(time.monotonic())
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for _, ok in self.outcomes if not ok) / len(self.outcomes)
+
+
+@dataclass
+class Backend:
+    deployment: Deployment
+    client: AsyncAzureOpenAI
+    controller: Optional[AdmissionController]
+    health: DeploymentHealth = field(default_factory=DeploymentHealth)
+
+    @property
+    def name(self) -> str:
+        return self.deployment.name
+
+    def quota_delay_ms(self) -> float:
+        if self.controller is None:
+            return 0.0
+        return max(self.controller.requests.delay_for(1), self.controller.tokens.delay_for(1)) * 1000
+
+
+class PrimedStream(AsyncStream):
+    """
+    AsyncStream whose first chunk has already been read (see `_prime`).
+
+    It wraps the original stream through its public interface only (iteration and
+    `close`); it stays an AsyncStream because the Semantic Kernel connector checks that.
+    """
+
+    def __init__(self, stream: AsyncStream, first: Any) -> None:
+        # No AsyncStream.__init__: decoding the response stays with the wrapped stream
+        self._stream = stream
+        self._first: Optional[Tuple[Any]] = (first,)
+        self.response = stream.response
+
+    async def __anext__(self) -> Any:
+        if self._first is not None:
+            (first,), self._first = self._first, None
+            return first
+        return await self._stream.__anext__()
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        while True:
+            try:
+                yield await self.__anext__()
+            except StopAsyncIteration:
+                return
+
+    async def close(self) -> None:
+        await self._stream.close()
+
+
+async def _prime(stream: AsyncStream) -> AsyncStream:
+    """Wait for the first chunk, so a stream that fails before any output can still fail over."""
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        return stream
+    except BaseException:
+        await stream.close()
+        raise
+    return PrimedStream(stream, first)
+
+
+async def _discard(response: Any) -> None:
+    if isinstance(response, AsyncStream):
+        await response.close()
+
+
+class DeploymentRouter:
+    """
+    Picks a deployment per chat request and fails over (or hedges) to the others.
+
+    Args:
+        deployments: The deployments to route across (at least one).
+        http_pool: Prefix of the per-deployment pooled HTTP clients ("<http_pool>:<name>").
+    """
+
+    def __init__(self, deployments: Sequence[Deployment], http_pool: str = "azure_openai") -> None:
+        if not deployments:
+            raise ValueError("DeploymentRouter needs at least one deployment.")
+        self.backends: List[Backend] = []
+        for deployment in deployments:
+            pool = f"{http_pool}:{deployment.name}"
+            controller = enable_admission_control(pool, rpm=deployment.rpm, tpm=deployment.tpm)
+            self.backends.append(Backend(deployment, build_async_client(deployment, pool), controller))
+
+    # -------------------------------
+    # Selection
+    # -------------------------------
+
+    def _cost(self, backend: Backend, fallback_ms: float) -> float:
+        latency = backend.health.latency_ms()
+        # Deployments without recent samples are assumed as fast as the best one, so they get probed
+        latency = fallback_ms if latency is None else latency
+        return latency * (1 + ERROR_PENALTY * backend.health.error_rate()) + backend.quota_delay_ms()
+
+    def order(self) -> List[Backend]:
+        """Deployments in the order to try them: a weighted pick of the healthy ones first, then by cost."""
+        now = time.monotonic()
+        healthy = [backend for backend in self.backends if backend.health.available(now)]
+        if not healthy:
+            # Everything is ejected: try the one that comes back first rather than refusing the request
+            return sorted(self.backends, key=lambda backend: backend.health.ejected_until)
+        known = [latency for latency in (backend.health.latency_ms() for backend in healthy) if latency is not None]
+        fallback_ms = min(known) if known else 1.0
+        costs = {backend.name: max(self._cost(backend, fallback_ms), 1.0) for backend in healthy}
+        # Squared cost: a deployment twice as slow gets a quarter of the traffic, enough to keep its samples fresh
+        first = random.choices(healthy, weights=[backend.deployment.weight / costs[backend.name] ** 2 for backend in healthy])[0]
+        rest = sorted((backend for backend in healthy if backend is not first), key=lambda backend: costs[backend.name])
+        ejected = [backend for backend in self.backends if not backend.health.available(now)]
+        return [first] + rest + sorted(ejected, key=lambda backend: backend.health.ejected_until)
+
+    def hedge_delay(self, backend: Backend) -> Optional[float]:
+        """Seconds to wait for the first chunk before hedging, or None to not hedge."""
+        if LLM_HEDGE_AFTER_MS == "auto":
+            if len(backend.health.latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            return backend.health.latency_ms(0.95) / 1000
+        milliseconds = float(LLM_HEDGE_AFTER_MS)
+        return milliseconds / 1000 if milliseconds > 0 else None
+
+    # -------------------------------
+    # Requests
+    # -------------------------------
+
+    async def _attempt(self, backend: Backend, request: Dict[str, Any], last: bool = True) -> Any:
+        """One request to `backend`; only the last candidate waits out 429s and retries 5xx in its pool."""
+        started = time.perf_counter()
+        backend.health.in_flight += 1
+        token = max_retries_override.set(None if last else 0)
+        try:
+            response = await backend.client.chat.completions.create(**dict(request, model=backend.deployment.deployment))
+            if request.get("stream"):
+                response = await _prime(response)
+        except asyncio.CancelledError:
+            # Lost a hedge: it was at least this slow
+            backend.health.record_latency((time.perf_counter() - started) * 1000)
+            raise
+        except Exception as e:
+            if is_backend_failure(e) and backend.health.record_failure():
+                logger.warning(f"Azure OpenAI deployment '{backend.name}' taken out of rotation for {LLM_ROUTER_COOLDOWN_S:.0f}s: {e}")
+            raise
+        finally:
+            max_retries_override.reset(token)
+            backend.health.in_flight -= 1
+        latency = (time.perf_counter() - started) * 1000
+        backend.health.record_success(latency)
+        first_chunk_latency.record(latency, {"sk.llm.deployment": backend.name})
+        turn = current_turn.get()
+        if turn is not None:
+            turn.deployment = backend.name
+        return response
+
+    async def _hedged(
+        self, primary: Backend, backup: Backend, request: Dict[str, Any], delay: float, tried: List[Backend], last: bool
+    ) -> Any:
+        first = asyncio.ensure_future(self._attempt(primary, request, last=False))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        hedge_counter.add(1, {"sk.llm.deployment": backup.name})
+        tried.append(backup)
+        pending = {first, asyncio.ensure_future(self._attempt(backup, request, last=last))}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                if winners:
+                    for task in winners[1:]:
+                        await _discard(task.result())
+                    return winners[0].result()
+                error = next(iter(done)).exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def create(self, request: Dict[str, Any]) -> Any:
+        """
+        Send a chat completions request (settings dict) to the best deployment, failing over on backend errors.
+
+        Streaming responses are returned once their first chunk has arrived; failures after that are not retried.
+        """
+        candidates = self.order()[: 1 + LLM_FAILOVER_ATTEMPTS]
+        delay = self.hedge_delay(candidates[0]) if request.get("stream") and len(candidates) > 1 else None
+        tried: List[Backend] = []
+        error: Optional[Exception] = None
+        for backend in candidates:
+            if backend in tried:
+                continue
+            if tried:
+                failover_counter.add(1, {"sk.llm.deployment": backend.name})
+                turn = current_turn.get()
+                if turn is not None:
+                    turn.failovers += 1
+                logger.info(f"Failing over to Azure OpenAI deployment '{backend.name}': {error}")
+            tried.append(backend)
+            try:
+                if len(tried) == 1 and delay is not None and candidates[1].quota_delay_ms() == 0:
+                    return await self._hedged(backend, candidates[1], request, delay, tried, last=len(candidates) == 2)
+                return await self._attempt(backend, request, last=backend is candidates[-1])
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                error = e
+        raise error
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Per-deployment health, for logs and dashboards."""
+        now = time.monotonic()
+        return [
+            {
+                "name": backend.name,
+                "available": backend.health.available(now),
+                "latency_p50_ms": backend.health.latency_ms(0.50),
+                "latency_p95_ms": backend.health.latency_ms(0.95),
+                "error_rate": round(backend.health.error_rate(), 3),
+                "in_flight": backend.health.in_flight,
+                "quota_delay_ms": round(backend.quota_delay_ms(), 1),
+            }
+            for backend in self.backends
+        ]
+
@@ -0,0 +1,256 @@
+import os
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import Field, PrivateAttr
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.prompt_execution_settings import PromptExecutionSettings
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.contents.function_result_content import FunctionResultContent
+from semantic_kernel.contents.history_reducer.chat_history_reducer import ChatHistoryReducer
+from semantic_kernel.contents.history_reducer.chat_history_reducer_utils import SUMMARY_METADATA_KEY
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character-based estimate
+    tiktoken = None
+
+# -------------------------------
+# Token-budgeted chat history
+# -------------------------------
+#
+# Keeps the system prompt and the last N turns verbatim and fits everything else
+# into a token budget: stale tool results are collapsed first, then the oldest
+# turns are dropped. Dropped turns are summarized in a background task and the
+# summary is folded in on a later reduce, so summarization never blocks a turn.
+
+logger = logging.getLogger(__name__)
+
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "8000"))
+HISTORY_KEEP_LAST_TURNS = int(os.getenv("HISTORY_KEEP_LAST_TURNS", "4"))
+HISTORY_TOOL_RESULT_MAX_TOKENS = int(os.getenv("HISTORY_TOOL_RESULT_MAX_TOKENS", "150"))
+HISTORY_SUMMARIZE = os.getenv("HISTORY_SUMMARIZE", "true").lower() == "true"
+
+SUMMARIZATION_PROMPT = (
+    "Summarize the conversation between a Water Theme Park visitor and the assistant in at most 5 sentences. "
+    "Merge in the existing summary if one is given. Keep names, places, times, prices and open questions; "
+    "omit raw tool output."
+)
+# Rough per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, otherwise ~4 characters per token."""
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def message_text(message: ChatMessageContent) -> str:
+    """All text the model sees for a message, including tool call arguments and results."""
+    parts = [message.content or ""]
+    for item in message.items:
+        if isinstance(item, FunctionCallContent):
+            parts.append(f"{item.name} {item.arguments or ''}")
+        elif isinstance(item, FunctionResultContent):
+            parts.append(str(item.result))
+    return "\n".join(part for part in parts if part)
+
+
+def _is_system(message: ChatMessageContent) -> bool:
+    return message.role in (AuthorRole.SYSTEM, AuthorRole.DEVELOPER) and not message.metadata.get(SUMMARY_METADATA_KEY)
+
+
+def _is_tool_result(message: ChatMessageContent) -> bool:
+    return any(isinstance(item, FunctionResultContent) for item in message.items)
+
+
+class TokenBudgetHistoryReducer(ChatHistoryReducer):
+    """
+    A ChatHistory that keeps itself within a token budget.
+
+    Args:
+        max_tokens: Token budget for the whole history.
+        keep_last_turns: Number of most recent turns (user message onwards) never dropped or collapsed.
+        tool_result_max_tokens: Stale tool results larger than this are collapsed to a short stub.
+        service: Chat service used for background summarization; None disables summaries.
+        summarization_prompt: Instructions for the summarizer.
+    """
+
+    target_count: int = Field(default=1, gt=0, description="Unused; the budget is expressed in tokens.")
+    max_tokens: int = Field(default=HISTORY_MAX_TOKENS, gt=0)
+    keep_last_turns: int = Field(default=HISTORY_KEEP_LAST_TURNS, ge=1)
+    tool_result_max_tokens: int = Field(default=HISTORY_TOOL_RESULT_MAX_TOKENS, ge=0)
+    service: Optional[ChatCompletionClientBase] = Field(default=None, exclude=True)
+    summarization_prompt: str = SUMMARIZATION_PROMPT
+
+    _token_cache: Dict[int, Tuple[ChatMessageContent, int]] = PrivateAttr(default_factory=dict)
+    _summary: Optional[str] = PrivateAttr(default=None)
+    _summary_task: Optional[asyncio.Task] = PrivateAttr(default=None)
+    _pending: List[ChatMessageContent] = PrivateAttr(default_factory=list)
+
+    @property
+    def summary(self) -> Optional[str]:
+        """Running summary of dropped turns (persisted with the session, see session_store.py)."""
+        return self._summary
+
+    @summary.setter
+    def summary(self, value: Optional[str]) -> None:
+        self._summary = value
+
+    # -------------------------------
+    # Token accounting
+    # -------------------------------
+
+    def message_tokens(self, message: ChatMessageContent) -> int:
+        cached = self._token_cache.get(id(message))
+        if cached is not None and cached[0] is message:
+            return cached[1]
+        tokens = count_tokens(message_text(message)) + MESSAGE_OVERHEAD_TOKENS
+        self._token_cache[id(message)] = (message, tokens)
+        return tokens
+
+    def total_tokens(self, messages: Optional[List[ChatMessageContent]] = None) -> int:
+        return sum(self.message_tokens(message) for message in (self.messages if messages is None else messages))
+
+    # -------------------------------
+    # Reduction
+    # -------------------------------
+
+    def _turn_starts(self, messages: List[ChatMessageContent]) -> List[int]:
+        return [i for i, message in enumerate(messages) if message.role == AuthorRole.USER]
+
+    def _collapse(self, message: ChatMessageContent) -> ChatMessageContent:
+        items = []
+        for item in message.items:
+            if isinstance(item, FunctionResultContent):
+                text = str(item.result)
+                stub = f"[stale {item.function_name} result collapsed: {text[:200]}…]"
+                item = item.model_copy(update={"result": stub})
+            items.append(item)
+        return message.model_copy(update={"items": items})
+
+    def _summary_message(self) -> Optional[ChatMessageContent]:
+        if not self._summary:
+            return None
+        return ChatMessageContent(
+            role=AuthorRole.SYSTEM,
+            content=f"Summary of the earlier conversation: {self._summary}",
+            metadata={SUMMARY_METADATA_KEY: True},
+        )
+
+    async def reduce(self) -> "TokenBudgetHistoryReducer | None":
+        """
+        Fit the history into `max_tokens`; returns self if anything changed, else None.
+
+        Order of operations: fold in a finished background summary, collapse stale
+        tool results, then drop the oldest turns outside the protected window.
+        """
+        messages = [message for message in self.messages if not message.metadata.get(SUMMARY_METADATA_KEY)]
+        system = [message for message in messages if _is_system(message)]
+        conversation = [message for message in messages if not _is_system(message)]
+        summary = self._summary_message()
+        existing = next((m for m in self.messages if m.metadata.get(SUMMARY_METADATA_KEY)), None)
+        changed = summary is not None and (existing is None or existing.content != summary.content)
+        if summary is not None and not changed:
+            summary = existing
+
+        def assemble() -> List[ChatMessageContent]:
+            return [*system, *([summary] if summary else []), *conversation]
+
+        if self.total_tokens(assemble()) <= self.max_tokens:
+            if changed:
+                self.messages = assemble()
+                return self
+            return None
+
+        # 1. Collapse large tool results outside the protected window
+        starts = self._turn_starts(conversation)
+        protected_from = starts[-self.keep_last_turns] if len(starts) >= self.keep_last_turns else 0
+        for i in range(protected_from):
+            message = conversation[i]
+            if _is_tool_result(message) and self.message_tokens(message) > self.tool_result_max_tokens:
+                conversation[i] = self._collapse(message)
+                changed = True
+
+        # 2. Drop whole turns, oldest first, until within budget; the last N turns are never dropped
+        dropped: List[ChatMessageContent] = []
+        while self.total_tokens(assemble()) > self.max_tokens:
+            starts = self._turn_starts(conversation)
+            if len(starts) <= self.keep_last_turns:
+                logger.warning("History exceeds its token budget within the protected recent turns.")
+                break
+            cut = starts[1]
+            dropped.extend(conversation[:cut])
+            conversation = conversation[cut:]
+            changed = True
+
+        if dropped:
+            logger.info(f"History reducer dropped {len(dropped)} messages; {self.total_tokens(assemble())} tokens kept.")
+            self._schedule_summary(dropped)
+
+        if changed:
+            self.messages = assemble()
+            kept = {id(m) for m in self.messages}
+            self._token_cache = {key: value for key, value in self._token_cache.items() if key in kept}
+            return self
+        return None
+
+    # -------------------------------
+    # Background summarization
+    # -------------------------------
+
+    def _schedule_summary(self, dropped: List[ChatMessageContent]) -> None:
+        if self.service is None or not HISTORY_SUMMARIZE:
+            return
+        self._pending.extend(m for m in dropped if m.role in (AuthorRole.USER, AuthorRole.ASSISTANT) and m.content)
+        if self._summary_task is None or self._summary_task.done():
+            self._summary_task = asyncio.create_task(self._summarize_pending())
+
+    async def _summarize_pending(self) -> None:
+        while self._pending:
+            batch, self._pending = self._pending, []
+            transcript = "\n".join(f"{m.role.value}: {m.content}" for m in batch)
+            if self._summary:
+                transcript = f"Existing summary: {self._summary}\n\n{transcript}"
+            chat_history = ChatHistory()
+            chat_history.add_system_message(self.summarization_prompt)
+            chat_history.add_user_message(transcript)
+            try:
+                settings = self.service.get_prompt_execution_settings_from_settings(PromptExecutionSettings())
+                result = await self.service.get_chat_message_content(chat_history=chat_history, settings=settings)
+            except Exception as e:
+                logger.warning(f"History summarization failed, continuing without summary: {e}")
+                return
+            if result is not None and result.content:
+                self._summary = result.content
+
+    def __eq__(self, other: object) -> bool:
+        return self is other
+
+    def __hash__(self) -> int:
+        return id(self)
+
+
+def create_history(
+    system_prompt: Optional[str] = None,
+    service: Optional[ChatCompletionClientBase] = None,
+    **kwargs: Any,
+) -> TokenBudgetHistoryReducer:
+    """Build a budgeted history (optionally seeded with a system prompt) using the deployment defaults."""
+    history = TokenBudgetHistoryReducer(service=service, **kwargs)
+    if system_prompt:
+        history.add_system_message(system_prompt)
+    return history
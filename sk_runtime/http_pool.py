@@ -0,0 +1,83 @@
+import os
+import logging
+from typing import Callable, Dict
+
+import httpx
+
+# -------------------------------
+# Shared, pooled async HTTP transport
+# -------------------------------
+#
+# Every outbound HTTP call made by the apps (Azure OpenAI, plugins) goes through
+# one long-lived httpx.AsyncClient per named pool, so keep-alive connections and
+# TLS sessions are reused across turns and across Chainlit sessions.
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+# Per-pool transport wrappers (e.g. admission control around Azure OpenAI)
+_transport_wrappers: Dict[str, Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]] = {}
+
+
+def build_limits() -> httpx.Limits:
+    """Return the connection pool limits shared by every pooled client."""
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def build_timeout(read: float = HTTP_READ_TIMEOUT) -> httpx.Timeout:
+    """Return a timeout with an explicit connect budget and the given read budget."""
+    return httpx.Timeout(read, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def register_transport_wrapper(
+    name: str, wrapper: Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport]
+) -> None:
+    """Wrap the transport of pool `name`; applies to clients created from now on."""
+    if name in _clients:
+        logger.warning(f"HTTP client '{name}' already exists; the transport wrapper applies after it is recreated.")
+    _transport_wrappers[name] = wrapper
+
+
+def has_transport_wrapper(name: str) -> bool:
+    return name in _transport_wrappers
+
+
+def get_async_http_client(name: str = "default") -> httpx.AsyncClient:
+    """
+    Return the process-wide pooled async HTTP client registered under `name`.
+
+    The client is created on first use and reused afterwards. Clients must be
+    used from the event loop that first drove them (one loop per process for
+    both the CLI and the Chainlit server).
+    """
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        wrapper = _transport_wrappers.get(name)
+        if wrapper is None:
+            client = httpx.AsyncClient(limits=build_limits(), timeout=build_timeout())
+        else:
+            transport = wrapper(httpx.AsyncHTTPTransport(limits=build_limits()))
+            client = httpx.AsyncClient(transport=transport, timeout=build_timeout())
+        _clients[name] = client
+        logger.info(f"Created pooled HTTP client '{name}'.")
+    return client
+
+
+async def aclose_http_clients() -> None:
+    """Close every pooled client; called from the app shutdown hooks."""
+    while _clients:
+        name, client = _clients.popitem()
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing HTTP client '{name}': {e}")
@@ -0,0 +1,473 @@
+import os
+import sys
+import json
+import math
+import asyncio
+import inspect
+import logging
+import argparse
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from opentelemetry import metrics
+from semantic_kernel import Kernel
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.filters import FunctionInvocationContext
+from semantic_kernel.functions.function_result import FunctionResult
+from semantic_kernel.functions.kernel_function import KernelFunction
+
+from sk_runtime.result_cache import normalize_query
+from sk_runtime.turn_metrics import TurnMetrics, current_turn
+
+# -------------------------------
+# Local intent router
+# -------------------------------
+#
+# A small multinomial naive Bayes model (word unigrams + bigrams) classifies the
+# question before the first LLM request, in well under a millisecond:
+#
+#   * confident  -> only plugins serving the likely intents are advertised to the model
+#   * very confident -> the matching retrieval starts right away, concurrently with
+#     the first LLM request; when the model's tool call arrives with a similar query
+#     the prefetched result is returned instead of calling the backend again
+#
+# Anything else (low confidence, a different tool or query, a failed prefetch)
+# falls back to the normal behaviour: all tools, real calls. A confident but
+# wrong narrowing shows as a reply that used none of the advertised tools (the
+# model answered from nothing, or asked for a hidden one and was refused):
+# `stream_with_fallback` holds back the text of a narrowed reply until a tool
+# has run and, if none did, discards that reply and asks again with all tools.
+#
+# Plugins opt in with class attributes:
+#   INTENTS = ("guide",)               intents the plugin serves (plugins without it are always exposed)
+#   PREFETCH_FUNCTION = "ai_search"    kernel function taking `query`, safe to run speculatively
+#
+# The model starts from built-in seed questions and is retrained from logged
+# traffic (ROUTER_TRAINING_LOG) with `python -m sk_runtime.intent_router train`.
+
+logger = logging.getLogger(__name__)
+
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "true").lower() == "true"
+ROUTER_MODEL_PATH = os.getenv("ROUTER_MODEL_PATH")
+ROUTER_TRAINING_LOG = os.getenv("ROUTER_TRAINING_LOG")
+# Top-intent probability needed to narrow the tool set, and to prefetch
+ROUTER_NARROW_THRESHOLD = float(os.getenv("ROUTER_NARROW_THRESHOLD", "0.7"))
+ROUTER_PREFETCH_THRESHOLD = float(os.getenv("ROUTER_PREFETCH_THRESHOLD", "0.9"))
+# Intents at least this likely stay exposed when narrowing
+ROUTER_KEEP_THRESHOLD = float(os.getenv("ROUTER_KEEP_THRESHOLD", "0.1"))
+# Word overlap (Jaccard) between the model's tool query and the question needed to reuse a prefetch
+ROUTER_PREFETCH_MATCH = float(os.getenv("ROUTER_PREFETCH_MATCH", "0.5"))
+
+meter = metrics.get_meter("sk_runtime")
+route_decisions = meter.create_counter("sk.router.decisions", unit="{turn}", description="Router decisions by outcome")
+prefetch_outcomes = meter.create_counter("sk.router.prefetch", unit="{call}", description="Speculative prefetch outcomes")
+
+STOP_WORDS = frozenset("a an the is are was were be do does did of to in on at for and or i we you my our me it".split())
+
+SEED_EXAMPLES: Dict[str, List[str]] = {
+    "guide": [
+        "what time is the dolphin show",
+        "when does the park open",
+        "what are the opening hours on friday",
+        "how much is the penguin encounter",
+        "is there a height requirement for the roller coaster",
+        "what shows are on today",
+        "can i feed the stingrays",
+        "what dining options are there",
+        "do you have halal food",
+        "how do i book an animal encounter",
+        "what experiences are available for kids",
+        "how long is the sea lion show",
+    ],
+    "map": [
+        "where is the dolphin theatre",
+        "where can i find the lockers",
+        "how do i get to sea lion point",
+        "where is the first aid station",
+        "which zone is the manta coaster in",
+        "where is the nearest restroom",
+        "directions to the lagoon touch pool",
+        "what is near the main entrance",
+        "where is the penguin building located",
+        "show me the map of the park",
+    ],
+    "inventory": [
+        "how much does the dolphin plush cost",
+        "which shops sell penguin souvenirs",
+        "is the shark hoodie in stock",
+        "what toys can i buy",
+        "price of the turtle keychain",
+        "do you sell t shirts in blue",
+        "what souvenirs are available under 50 aed",
+        "which store has jellyfish plush toys",
+        "list the items in the gift shop",
+        "are there any discounts on merchandise",
+    ],
+    "web": [
+        "what is the weather in abu dhabi today",
+        "latest news about the park",
+        "how is the traffic to yas island",
+        "what is the exchange rate for dollars to dirhams",
+        "what are the covid rules in the uae",
+        "weather forecast for tomorrow",
+        "what other attractions are on yas island",
+        "is there a public holiday this week",
+    ],
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalized words plus adjacent-word bigrams."""
+    words = [word for word in normalize_query(text).split() if word not in STOP_WORDS]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def _jaccard(a: str, b: str) -> float:
+    left, right = set(normalize_query(a).split()) - STOP_WORDS, set(normalize_query(b).split()) - STOP_WORDS
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+class IntentModel:
+    """Multinomial naive Bayes over question tokens; multi-intent examples count once per intent."""
+
+    def __init__(self, intents: Sequence[str] = ()) -> None:
+        self.doc_counts: Counter = Counter({intent: 0 for intent in intents})
+        self.token_counts: Dict[str, Counter] = {intent: Counter() for intent in intents}
+        self.vocabulary: set = set()
+
+    def update(self, text: str, intents: Iterable[str]) -> None:
+        tokens = tokenize(text)
+        for intent in intents:
+            self.doc_counts[intent] += 1
+            self.token_counts.setdefault(intent, Counter()).update(tokens)
+        self.vocabulary.update(tokens)
+
+    def fit(self, examples: Iterable[Tuple[str, Iterable[str]]]) -> "IntentModel":
+        for text, intents in examples:
+            self.update(text, intents)
+        return self
+
+    def predict(self, text: str) -> Dict[str, float]:
+        """Posterior probability per intent."""
+        tokens = [token for token in tokenize(text) if token in self.vocabulary]
+        total_docs = sum(self.doc_counts.values())
+        if not total_docs:
+            return {}
+        vocabulary_size = len(self.vocabulary) + 1
+        scores = {}
+        for intent, docs in self.doc_counts.items():
+            if not docs:
+                continue
+            counts = self.token_counts[intent]
+            denominator = sum(counts.values()) + vocabulary_size
+            scores[intent] = math.log(docs / total_docs) + sum(math.log((counts[t] + 1) / denominator) for t in tokens)
+        top = max(scores.values())
+        weights = {intent: math.exp(score - top) for intent, score in scores.items()}
+        norm = sum(weights.values())
+        return {intent: weight / norm for intent, weight in weights.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"doc_counts": dict(self.doc_counts), "token_counts": {k: dict(v) for k, v in self.token_counts.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "IntentModel":
+        model = cls()
+        model.doc_counts = Counter(data["doc_counts"])
+        model.token_counts = {intent: Counter(counts) for intent, counts in data["token_counts"].items()}
+        model.vocabulary = {token for counts in model.token_counts.values() for token in counts}
+        return model
+
+
+def seed_model() -> IntentModel:
+    return IntentModel(SEED_EXAMPLES).fit(
+        (question, [intent]) for intent, questions in SEED_EXAMPLES.items() for question in questions
+    )
+
+
+def read_training_log(path: str) -> Iterator[Tuple[str, List[str]]]:
+    """Yield (question, intents) pairs from a ROUTER_TRAINING_LOG JSONL file."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("question") and record.get("intents"):
+                yield record["question"], record["intents"]
+
+
+def load_model(path: Optional[str] = ROUTER_MODEL_PATH) -> IntentModel:
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return IntentModel.from_dict(json.load(f))
+    return seed_model()
+
+
+# -------------------------------
+# Routing and speculative prefetch
+# -------------------------------
+
+
+@dataclass
+class Route:
+    """Routing decision for one question."""
+
+    probabilities: Dict[str, float]
+    intent: Optional[str] = None
+    # Plugins to advertise; None means all of them
+    included_plugins: Optional[List[str]] = None
+    prefetch: Optional[KernelFunction] = None
+    # The narrowed reply used no tool and the turn was answered with all tools instead
+    fell_back: bool = False
+
+
+@dataclass
+class Prefetch:
+    function: KernelFunction
+    query: str
+    task: "asyncio.Task"
+    # Data versions the prefetch read; they become the turn's only if it is used
+    observed: TurnMetrics = field(default_factory=lambda: TurnMetrics(app="prefetch", show_steps=False))
+    used: bool = False
+
+
+_current_prefetch: "contextvars.ContextVar[Optional[Prefetch]]" = contextvars.ContextVar("current_prefetch", default=None)
+
+
+class IntentRouter:
+    """
+    Routes questions to the plugins likely to answer them.
+
+    Args:
+        plugins: Plugin name -> plugin class or factory (as given to KernelProvider); read for INTENTS and PREFETCH_FUNCTION
+            on first use, so lazily imported plugins stay unimported until then.
+        model: Intent model; defaults to ROUTER_MODEL_PATH or the built-in seeds.
+    """
+
+    def __init__(self, plugins: Mapping[str, Any], model: Optional[IntentModel] = None) -> None:
+        self.model = model or load_model()
+        self._plugins = dict(plugins)
+
+    @cached_property
+    def plugin_intents(self) -> Dict[str, Tuple[str, ...]]:
+        return {name: tuple(getattr(factory, "INTENTS", ())) for name, factory in self._plugins.items()}
+
+    @cached_property
+    def prefetch_functions(self) -> Dict[str, str]:
+        return {
+            name: factory.PREFETCH_FUNCTION
+            for name, factory in self._plugins.items()
+            if getattr(factory, "PREFETCH_FUNCTION", None)
+        }
+
+    def route(self, question: str, kernel: Optional[Kernel] = None) -> Route:
+        """Classify `question` and decide which plugins to expose and what to prefetch."""
+        probabilities = self.model.predict(question)
+        if not probabilities:
+            return Route(probabilities)
+        intent, confidence = max(probabilities.items(), key=lambda item: item[1])
+        route = Route(probabilities, intent=intent)
+        if confidence < ROUTER_NARROW_THRESHOLD:
+            route_decisions.add(1, {"sk.router.outcome": "all_tools"})
+            return route
+
+        keep = {name for name, p in probabilities.items() if p >= ROUTER_KEEP_THRESHOLD}
+        route.included_plugins = [
+            name for name, intents in self.plugin_intents.items() if not intents or keep.intersection(intents)
+        ]
+        outcome = "narrowed"
+        if confidence >= ROUTER_PREFETCH_THRESHOLD and kernel is not None:
+            for name, intents in self.plugin_intents.items():
+                if intent in intents and name in self.prefetch_functions:
+                    route.prefetch = kernel.get_function(name, self.prefetch_functions[name])
+                    outcome = "prefetch"
+                    break
+        route_decisions.add(1, {"sk.router.outcome": outcome, "sk.router.intent": intent})
+        return route
+
+    async def record(self, question: str, tools: Sequence[str], route: Optional[Route] = None) -> None:
+        """
+        Append a finished turn's tool calls to ROUTER_TRAINING_LOG and learn from them.
+
+        Turns whose tools were narrowed only go to the log: learning online from
+        them would reinforce the router's own decision. Turns that fell back to
+        all tools are learned from, they correct it.
+        """
+        plugins = {tool.split(".", 1)[0] for tool in tools}
+        intents = sorted({intent for plugin in plugins for intent in self.plugin_intents.get(plugin, ())})
+        if not intents:
+            return
+        if route is None or route.included_plugins is None or route.fell_back:
+            self.model.update(question, intents)
+        if ROUTER_TRAINING_LOG:
+            line = json.dumps({"question": question, "intents": intents}) + "\n"
+            try:
+                await asyncio.to_thread(_append_line, ROUTER_TRAINING_LOG, line)
+            except OSError as e:
+                logger.warning(f"Could not append to the router training log: {e}")
+
+
+def _append_line(path: str, line: str) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+async def stream_with_fallback(
+    route: Optional[Route],
+    history: ChatHistory,
+    attempt: Callable[[Optional[List[str]]], AsyncIterator[str]],
+) -> AsyncIterator[str]:
+    """
+    Stream `attempt(route.included_plugins)`, falling back to `attempt(None)` (all tools) on a misprediction.
+
+    A narrowed reply's text is held back until one of its tool calls has run (on the
+    current turn's `tools`). When the reply ends without any, its text and the messages
+    it added to `history` are discarded and the question is asked again with all tools.
+    Must run inside a tracked turn to detect that; outside one, nothing is held back.
+    """
+    turn = current_turn.get()
+    if route is None or route.included_plugins is None or turn is None:
+        async for text in attempt(route.included_plugins if route else None):
+            yield text
+        return
+
+    calls_before = len(turn.tools)
+    earlier = {id(message) for message in history.messages}
+    held: List[str] = []
+    async for text in attempt(route.included_plugins):
+        if len(turn.tools) == calls_before:
+            held.append(text)
+            continue
+        if held:
+            yield "".join(held)
+            held.clear()
+        yield text
+    if len(turn.tools) > calls_before:
+        if held:
+            yield "".join(held)
+        return
+
+    route.fell_back = True
+    route_decisions.add(1, {"sk.router.outcome": "fallback", "sk.router.intent": route.intent or ""})
+    logger.info(f"Narrowed reply used no tool (intent {route.intent}); asking again with all tools.")
+    while history.messages and id(history.messages[-1]) not in earlier:
+        history.messages.pop()
+    async for text in attempt(None):
+        yield text
+
+
+@contextmanager
+def speculate(route: Optional[Route], question: str) -> Iterator[Optional[Prefetch]]:
+    """
+    Run the route's prefetch (if any) for the duration of a turn; must be used inside the event loop.
+
+    The pending prefetch is cancelled when the turn ends without using it.
+    """
+    if route is None or route.prefetch is None:
+        yield None
+        return
+    function = route.prefetch
+    prefetch: Optional[Prefetch] = None
+
+    async def run() -> Any:
+        # The task has its own context copy: record data versions aside instead of on the turn
+        current_turn.set(prefetch.observed)
+        result = function.method(query=question)
+        return await result if inspect.isawaitable(result) else result
+
+    prefetch = Prefetch(function=function, query=question, task=asyncio.ensure_future(run()))
+    token = _current_prefetch.set(prefetch)
+    try:
+        yield prefetch
+    finally:
+        _current_prefetch.reset(token)
+        if not prefetch.used:
+            prefetch.task.cancel()
+            prefetch_outcomes.add(1, {"sk.router.prefetch": "unused"})
+
+
+def _matches(prefetch: Prefetch, context: FunctionInvocationContext) -> bool:
+    """The model called the prefetched function with a similar query and default values for everything else."""
+    if context.function.fully_qualified_name != prefetch.function.fully_qualified_name:
+        return False
+    defaults = {parameter.name: parameter.default_value for parameter in context.function.metadata.parameters}
+    for name, value in context.arguments.items():
+        if name != "query" and (name not in defaults or defaults[name] != value):
+            return False
+    return _jaccard(str(context.arguments.get("query", "")), prefetch.query) >= ROUTER_PREFETCH_MATCH
+
+
+async def prefetch_filter(
+    context: FunctionInvocationContext,
+    next: Callable[[FunctionInvocationContext], Awaitable[None]],
+) -> None:
+    """
+    Kernel function-invocation filter that serves a matching speculative prefetch.
+
+    Register it last (innermost) so step and telemetry filters still see the call.
+    """
+    prefetch = _current_prefetch.get()
+    if prefetch is None or prefetch.used or not _matches(prefetch, context):
+        await next(context)
+        return
+
+    prefetch.used = True
+    try:
+        value = await prefetch.task
+    except Exception as e:
+        logger.info(f"Prefetch for {prefetch.function.fully_qualified_name} failed, calling it normally: {e}")
+        prefetch_outcomes.add(1, {"sk.router.prefetch": "failed"})
+        await next(context)
+        return
+    prefetch_outcomes.add(1, {"sk.router.prefetch": "used"})
+    turn = current_turn.get()
+    if turn is not None:
+        turn.prefetch_used = True
+        turn.data_versions.update(prefetch.observed.data_versions)
+    context.result = FunctionResult(function=context.function.metadata, value=value)
+
+
+def create_intent_router(plugins: Mapping[str, Any]) -> Optional[IntentRouter]:
+    """Return a router for the given plugins, or None when ROUTER_ENABLED is off."""
+    if not ROUTER_ENABLED:
+        return None
+    return IntentRouter(plugins)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Train or inspect the local intent router.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="Train from seed questions plus logged traffic")
+    train.add_argument("logs", nargs="*", help="ROUTER_TRAINING_LOG files")
+    train.add_argument("--out", required=True, help="Model JSON path (use as ROUTER_MODEL_PATH)")
+    train.add_argument("--no-seeds", action="store_true", help="Train on logged traffic only")
+    predict = commands.add_parser("predict", help="Print intent probabilities for questions")
+    predict.add_argument("questions", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        model = IntentModel(SEED_EXAMPLES) if args.no_seeds else seed_model()
+        examples = 0
+        for path in args.logs:
+            for question, intents in read_training_log(path):
+                model.update(question, intents)
+                examples += 1
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(model.to_dict(), f)
+        print(f"Trained on {examples} logged examples; model written to {args.out}")
+    else:
+        model = load_model()
+        for question in args.questions:
+            probabilities = model.predict(question)
+            ranked = ", ".join(f"{intent}={p:.2f}" for intent, p in sorted(probabilities.items(), key=lambda item: -item[1]))
+            print(f"{question!r}: {ranked}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import importlib
+import threading
+from dataclasses import replace
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from semantic_kernel import Kernel
+
+from sk_runtime.deployment_router import Deployment, DeploymentRouter, build_async_client
+from sk_runtime.http_pool import aclose_http_clients, get_async_http_client
+
+if TYPE_CHECKING:
+    from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+
+# -------------------------------
+# Process-wide Kernel / Chat Service Provider
+# -------------------------------
+#
+# The Kernel, the AzureChatCompletion service (and its pooled HTTP transport) and
+# the workflow plugins are built once per process. Plugins are stateless and the
+# kernel is only read during invocation, so every Chainlit session shares them and
+# only keeps its own ChatHistory (and per-turn execution settings, which Semantic
+# Kernel mutates while advertising tools).
+#
+# Nothing expensive happens at import: the Semantic Kernel OpenAI connector, the
+# plugin modules given as LazyPlugin and their SDKs are imported when the kernel
+# is built, which `warm_up` does on a worker thread so the event loop keeps serving.
+
+
+class LazyPlugin:
+    """
+    Plugin factory that imports its class on first use, e.g. LazyPlugin("sk_plugins.web_search:GoogleWebSearch").
+
+    Class attributes (such as the intent router's INTENTS and PREFETCH_FUNCTION) are
+    read through to the class, which imports it too.
+    """
+
+    def __init__(self, target: str) -> None:
+        self.target = target
+        self._cls: Optional[type] = None
+
+    def resolve(self) -> type:
+        """Import and return the plugin class."""
+        if self._cls is None:
+            module_name, _, class_name = self.target.partition(":")
+            self._cls = getattr(importlib.import_module(module_name), class_name)
+        return self._cls
+
+    def __call__(self) -> Any:
+        return self.resolve()()
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __repr__(self) -> str:
+        return f"LazyPlugin({self.target!r})"
+
+
+class KernelProvider:
+    """
+    Lazily builds and caches the Kernel and AzureChatCompletion service for the process.
+
+    Args:
+        deployment_name: Azure OpenAI deployment used for chat completions.
+        api_key: Azure OpenAI API key.
+        api_version: Azure OpenAI API version.
+        plugins: Mapping of plugin name to a zero-argument factory returning the plugin instance
+            (a plugin class, or a LazyPlugin to defer importing it until the kernel is built).
+        endpoint: Azure OpenAI resource endpoint (e.g. https://<resource>.openai.azure.com/).
+        base_url: Full base URL (e.g. https://<resource>.openai.azure.com/openai); used instead of endpoint.
+        http_pool: Name of the pooled HTTP client used for Azure OpenAI traffic.
+        filters: (filter_type, filter) pairs registered on the kernel, e.g. ("function_invocation", fn).
+        deployments: Several deployments to route chat requests across (see deployment_router.py); their
+            missing deployment, api_key and api_version default to the arguments above. Empty: one deployment.
+        chat_service_mixins: Classes mixed into the chat service class, outermost first
+            (e.g. turn_trace.RecordingChatCompletion to record every chat request).
+    """
+
+    def __init__(
+        self,
+        deployment_name: str,
+        api_key: Optional[str],
+        api_version: Optional[str],
+        plugins: Dict[str, Callable[[], Any]],
+        endpoint: Optional[str] = None,
+        base_url: Optional[str] = None,
+        http_pool: str = "azure_openai",
+        filters: Sequence[Tuple[str, Callable]] = (),
+        deployments: Sequence[Deployment] = (),
+        chat_service_mixins: Sequence[type] = (),
+    ) -> None:
+        self.deployment_name = deployment_name
+        self.api_key = api_key
+        self.api_version = api_version
+        self.endpoint = endpoint
+        self.base_url = base_url
+        self.http_pool = http_pool
+        self._plugin_factories = plugins
+        self._filters = list(filters)
+        self._chat_service_mixins = tuple(chat_service_mixins)
+        self.deployments = [
+            replace(
+                deployment,
+                deployment=deployment.deployment or deployment_name,
+                api_key=deployment.api_key or api_key,
+                api_version=deployment.api_version or api_version,
+            )
+            for deployment in deployments
+        ]
+        self._router: Optional[DeploymentRouter] = None
+        self._kernel: Optional[Kernel] = None
+        self._chat_completion: Optional["AzureChatCompletion"] = None
+        self._plugins: List[Any] = []
+        self._lock = threading.Lock()
+        self._warmed_up = False
+        self._warm_up_task: Optional[asyncio.Task] = None
+
+    # -------------------------------
+    # Construction
+    # -------------------------------
+
+    def _service_class(self, base: type) -> type:
+        if not self._chat_service_mixins:
+            return base
+        return type(base.__name__, (*self._chat_service_mixins, base), {})
+
+    def _build_chat_completion(self) -> "AzureChatCompletion":
+        """Create the chat service on top of the shared pooled HTTP client(s)."""
+        # The connector pulls in the whole OpenAI SDK surface (realtime, audio, ...): import it here, not at startup
+        from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+
+        if self.deployments:
+            from sk_runtime.routed_chat_completion import RoutedChatCompletion
+
+            self._router = DeploymentRouter(self.deployments, http_pool=self.http_pool)
+            return self._service_class(RoutedChatCompletion)(self._router)
+        deployment = Deployment(
+            name=self.deployment_name,
+            deployment=self.deployment_name,
+            endpoint=self.endpoint,
+            base_url=self.base_url,
+            api_key=self.api_key,
+            api_version=self.api_version,
+        )
+        return self._service_class(AzureChatCompletion)(
+            deployment_name=self.deployment_name,
+            api_version=self.api_version,
+            async_client=build_async_client(deployment, self.http_pool),
+        )
+
+    def _build(self) -> None:
+        kernel = Kernel()
+        try:
+            chat_completion = self._build_chat_completion()
+            kernel.add_service(chat_completion)
+            logging.info("Azure OpenAI chat completion service added.")
+        except Exception as e:
+            logging.error(f"Error initializing Azure OpenAI service: {e}")
+            raise e
+
+        plugins = []
+        try:
+            for plugin_name, factory in self._plugin_factories.items():
+                plugin = factory()
+                kernel.add_plugin(plugin, plugin_name=plugin_name)
+                plugins.append(plugin)
+            logging.info("All workflow plugins registered successfully.")
+        except Exception as e:
+            logging.error(f"Error registering plugins: {e}")
+            raise e
+
+        for filter_type, filter_func in self._filters:
+            kernel.add_filter(filter_type, filter_func)
+
+        # The kernel goes last: the lock-free check in _ensure_built takes it as "everything is built"
+        self._chat_completion = chat_completion
+        self._plugins = plugins
+        self._kernel = kernel
+
+    def _ensure_built(self) -> None:
+        if self._kernel is None:
+            with self._lock:
+                if self._kernel is None:
+                    self._build()
+
+    async def ready(self) -> None:
+        """
+        Wait until the kernel and chat service are built, without blocking the event loop.
+
+        Call it before the properties below in async code: while a background warm-up
+        is building, they would block the loop on the build lock.
+        """
+        if self._kernel is None:
+            await asyncio.to_thread(self._ensure_built)
+
+    @property
+    def plugin_factories(self) -> Dict[str, Callable[[], Any]]:
+        """Plugin name -> factory, as registered (available without building the kernel)."""
+        return dict(self._plugin_factories)
+
+    @property
+    def kernel(self) -> Kernel:
+        """The shared Kernel, built on first access."""
+        self._ensure_built()
+        return self._kernel
+
+    @property
+    def chat_completion(self) -> "AzureChatCompletion":
+        """The shared AzureChatCompletion service, built on first access."""
+        self._ensure_built()
+        return self._chat_completion
+
+    @property
+    def router(self) -> Optional[DeploymentRouter]:
+        """The deployment router when several deployments are configured, else None."""
+        self._ensure_built()
+        return self._router
+
+    # -------------------------------
+    # Lifecycle
+    # -------------------------------
+
+    async def warm_up(self) -> None:
+        """
+        Build everything and pre-open a pooled connection to Azure OpenAI (to every routed deployment).
+
+        The build (imports, clients, plugins) runs on a worker thread so the event
+        loop keeps serving meanwhile. The probe request only establishes TCP/TLS so
+        the first user turn does not pay for the handshake; its HTTP status is
+        irrelevant. Probe failures are logged and ignored.
+        """
+        await asyncio.to_thread(self._ensure_built)
+        if self._warmed_up:
+            return
+        self._warmed_up = True
+        probes = [(self.http_pool, str(self._chat_completion.client.base_url))]
+        if self._router is not None:
+            probes = [(f"{self.http_pool}:{backend.name}", str(backend.client.base_url)) for backend in self._router.backends]
+        results = await asyncio.gather(
+            *(get_async_http_client(pool).get(url) for pool, url in probes), return_exceptions=True
+        )
+        for (pool, _), result in zip(probes, results):
+            if isinstance(result, Exception):
+                logging.warning(f"Azure OpenAI warm-up of '{pool}' failed (continuing): {result}")
+            else:
+                logging.info(f"Azure OpenAI connection pool '{pool}' warmed up.")
+
+    def start_warm_up(self) -> asyncio.Task:
+        """
+        Run `warm_up` in the background and return its task (must be called inside the event loop).
+
+        Handlers arriving before the build is done `await ready()`, which waits for the
+        build in progress on a worker thread; they do not wait for the connection probes.
+        """
+        if self._warm_up_task is None or self._warm_up_task.done():
+            self._warm_up_task = asyncio.create_task(self._background_warm_up())
+        return self._warm_up_task
+
+    async def _background_warm_up(self) -> None:
+        try:
+            await self.warm_up()
+        except Exception as e:
+            logging.error(f"Background warm-up failed; the first turn will build the kernel: {e}")
+
+    async def aclose(self) -> None:
+        """
+        Release pooled connections and run each plugin's async `close()` shutdown hook.
+
+        The provider rebuilds everything on next use.
+        """
+        task, self._warm_up_task = self._warm_up_task, None
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        with self._lock:
+            plugins, self._plugins = self._plugins, []
+            self._kernel = None
+            self._chat_completion = None
+            self._router = None
+            self._warmed_up = False
+        for plugin in plugins:
+            close = getattr(plugin, "close", None)
+            if close is None:
+                continue
+            try:
+                await close()
+            except Exception as e:
+                logging.warning(f"Error closing plugin {type(plugin).__name__}: {e}")
+        await aclose_http_clients()
@@ -0,0 +1,425 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sk_runtime.answer_cache import Embedder, HashingEmbedder, azure_embedder
+from sk_runtime.result_cache import normalize_query
+
+# -------------------------------
+# In-process hybrid retrieval
+# -------------------------------
+#
+# A low-latency alternative to querying Azure AI Search for small corpora. The
+# offline builder exports the chunks and their vectors into a directory of
+# memory-mapped NumPy arrays:
+#
+#   meta.json                       count, dim, embedder, BM25 parameters, build id
+#   vectors.npy                     (N, dim) float32, L2-normalized
+#   text.bin + text_offsets.npy     UTF-8 chunk texts, decoded on demand
+#   vocab.json                      BM25 terms, in term-id order
+#   idf.npy                         (V,) BM25 idf per term
+#   postings_offsets.npy            (V + 1,) start of each term's postings
+#   postings_docs.npy / _tf.npy     inverted index: doc ids and term frequencies
+#   doc_norm.npy                    (N,) BM25 length normalization k1 * (1 - b + b * len / avgdl)
+#
+# A query is embedded once (embeddings are cached per normalized query), scored
+# against every vector with one matrix-vector product and against the inverted
+# index with BM25; the two candidate lists are merged with reciprocal-rank fusion.
+# The query must be embedded with the embedder the index was built with, which
+# meta.json records.
+#
+# Build:
+#   python -m sk_runtime.local_index build --from-search guide --out indexes/guide
+#   python -m sk_runtime.local_index build --from-jsonl chunks.jsonl --out indexes/guide
+
+logger = logging.getLogger(__name__)
+
+LOCAL_INDEX_QUERY_CACHE_SIZE = int(os.getenv("LOCAL_INDEX_QUERY_CACHE_SIZE", "2048"))
+# Above this many chunks, scoring runs in a worker thread instead of on the event loop
+LOCAL_INDEX_THREAD_THRESHOLD = int(os.getenv("LOCAL_INDEX_THREAD_THRESHOLD", "20000"))
+# Embedding deployment used by the builder when chunks come without vectors
+LOCAL_INDEX_EMBEDDING_DEPLOYMENT = os.getenv("LOCAL_INDEX_EMBEDDING_DEPLOYMENT")
+
+FORMAT_VERSION = 1
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Reciprocal-rank-fusion constant, as in park_retrieval
+FUSION_K = 60
+
+_TERM = re.compile(r"\w+")
+
+
+def bm25_terms(text: str) -> List[str]:
+    return _TERM.findall(normalize_query(text))
+
+
+# -------------------------------
+# Query embeddings
+# -------------------------------
+
+
+def embedder_from_spec(spec: str) -> Embedder:
+    """Build the embedder named in meta.json: "hashing:<dim>" or "azure:<deployment>"."""
+    kind, _, value = spec.partition(":")
+    if kind == "hashing":
+        return HashingEmbedder(dim=int(value or 2048))
+    if kind == "azure":
+        return azure_embedder(value)
+    raise ValueError(f"Unknown embedder '{spec}'.")
+
+
+class QueryEmbeddingCache:
+    """LRU cache of query embeddings keyed on the normalized query; concurrent misses share one request."""
+
+    def __init__(self, embedder: Embedder, capacity: int = LOCAL_INDEX_QUERY_CACHE_SIZE) -> None:
+        self.embedder = embedder
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Future"] = {}
+
+    async def embed(self, query: str) -> np.ndarray:
+        key = normalize_query(query)
+        vector = self._vectors.get(key)
+        if vector is not None:
+            self._vectors.move_to_end(key)
+            self.hits += 1
+            return vector
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+            # The caller embedding the query was cancelled, not this one
+            return await self.embed(query)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            vector = await self.embedder.embed(query)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                future.exception()  # mark retrieved when nobody else is waiting
+            else:
+                future.cancel()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self._vectors[key] = vector
+        while len(self._vectors) > self.capacity:
+            self._vectors.popitem(last=False)
+        future.set_result(vector)
+        return vector
+
+
+# -------------------------------
+# Query engine
+# -------------------------------
+
+
+@dataclass
+class LocalHit:
+    doc_id: int
+    score: float
+    text: str
+
+
+class LocalIndex:
+    """
+    Read-only hybrid index over a directory written by `build_index`.
+
+    Args:
+        path: Index directory.
+        embedder: Query embedder; defaults to the one recorded in meta.json.
+    """
+
+    def __init__(self, path: str, embedder: Optional[Embedder] = None) -> None:
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported local index format in {path}: {self.meta.get('format')}")
+        self.count: int = self.meta["count"]
+        self.build_id: str = self.meta["build_id"]
+
+        def array(name: str) -> np.ndarray:
+            return np.load(os.path.join(path, name), mmap_mode="r")
+
+        self.vectors = array("vectors.npy")
+        self.text_offsets = array("text_offsets.npy")
+        self.idf = array("idf.npy")
+        self.postings_offsets = array("postings_offsets.npy")
+        self.postings_docs = array("postings_docs.npy")
+        self.postings_tf = array("postings_tf.npy")
+        self.doc_norm = array("doc_norm.npy")
+        self._text = np.memmap(os.path.join(path, "text.bin"), dtype=np.uint8, mode="r") if self.count else None
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            self.vocabulary = {term: term_id for term_id, term in enumerate(json.load(f))}
+        self.embeddings = QueryEmbeddingCache(embedder or embedder_from_spec(self.meta["embedder"]))
+
+    def text(self, doc_id: int) -> str:
+        start, end = int(self.text_offsets[doc_id]), int(self.text_offsets[doc_id + 1])
+        return bytes(self._text[start:end]).decode("utf-8")
+
+    @staticmethod
+    def _top(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k best positive scores, best first."""
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return candidates[scores[candidates] > 0]
+
+    def vector_scores(self, query_vector: np.ndarray) -> np.ndarray:
+        return self.vectors @ query_vector.astype(np.float32, copy=False)
+
+    def bm25_scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in set(bm25_terms(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.postings_offsets[term_id], self.postings_offsets[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end]
+            # Doc ids are unique within one posting list, so fancy-index addition is exact
+            scores[docs] += self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + self.doc_norm[docs])
+        return scores
+
+    def rank(self, query: str, query_vector: np.ndarray, top: int, k_nearest: int = 50) -> List[LocalHit]:
+        """Fuse the vector and BM25 top `k_nearest` candidate lists and return the best `top` chunks."""
+        if not self.count:
+            return []
+        fused: Dict[int, float] = {}
+        for scores in (self.vector_scores(query_vector), self.bm25_scores(query)):
+            for rank, doc_id in enumerate(self._top(scores, k_nearest)):
+                fused[int(doc_id)] = fused.get(int(doc_id), 0.0) + 1.0 / (FUSION_K + rank + 1)
+        best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top]
+        return [LocalHit(doc_id, score, self.text(doc_id)) for doc_id, score in best]
+
+    async def search(self, query: str, top: int = 3, k_nearest: int = 50) -> List[LocalHit]:
+        """Embed the query (cached) and return the top fused hits."""
+        query_vector = await self.embeddings.embed(query)
+        if self.count > LOCAL_INDEX_THREAD_THRESHOLD:
+            return await asyncio.to_thread(self.rank, query, query_vector, top, k_nearest)
+        return self.rank(query, query_vector, top, k_nearest)
+
+
+_local_indexes: Dict[str, LocalIndex] = {}
+
+
+def get_local_index(path: str) -> LocalIndex:
+    """Return the process-wide LocalIndex for the directory at `path`."""
+    key = os.path.abspath(path)
+    index = _local_indexes.get(key)
+    if index is None:
+        index = LocalIndex(key)
+        _local_indexes[key] = index
+        logger.info(f"Loaded local index {key} ({index.count} chunks, build {index.build_id}).")
+    return index
+
+
+# -------------------------------
+# Offline builder
+# -------------------------------
+
+
+def _normalized(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+def _save(path: str, name: str, array: np.ndarray) -> None:
+    np.save(os.path.join(path, name), array, allow_pickle=False)
+
+
+async def build_index(
+    chunks: Sequence[Tuple[str, Optional[Sequence[float]]]],
+    out: str,
+    embedder_spec: str,
+    embedder: Optional[Embedder] = None,
+) -> Dict[str, object]:
+    """
+    Write a local index for `chunks` ((text, vector or None) pairs) into the directory `out`.
+
+    Chunks without a vector are embedded with the embedder named by `embedder_spec`,
+    which is also what queries will use; exported vectors must come from the same model.
+    Returns the written metadata.
+    """
+    texts = [text for text, _ in chunks]
+    missing = [i for i, (_, vector) in enumerate(chunks) if vector is None]
+    vectors: List[Optional[np.ndarray]] = [None if vector is None else _normalized(vector) for _, vector in chunks]
+    if missing:
+        embedder = embedder or embedder_from_spec(embedder_spec)
+        embedded = await asyncio.gather(*(embedder.embed(texts[i]) for i in missing))
+        for i, vector in zip(missing, embedded):
+            vectors[i] = _normalized(vector)
+    dim = vectors[0].shape[0] if vectors else 0
+    if any(vector.shape[0] != dim for vector in vectors):
+        raise ValueError("Chunk vectors have different dimensions.")
+
+    # BM25 inverted index
+    term_counts = [Counter(bm25_terms(text)) for text in texts]
+    doc_len = np.array([sum(counts.values()) for counts in term_counts], dtype=np.float32)
+    avgdl = float(doc_len.mean()) if len(texts) else 0.0
+    vocabulary = sorted({term for counts in term_counts for term in counts})
+    term_ids = {term: term_id for term_id, term in enumerate(vocabulary)}
+    postings: List[List[Tuple[int, int]]] = [[] for _ in vocabulary]
+    for doc_id, counts in enumerate(term_counts):
+        for term, tf in counts.items():
+            postings[term_ids[term]].append((doc_id, tf))
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(p) for p in postings])
+    docs = np.array([doc_id for p in postings for doc_id, _ in p], dtype=np.int32)
+    tfs = np.array([tf for p in postings for _, tf in p], dtype=np.float32)
+    idf = np.array(
+        [math.log(1 + (len(texts) - len(p) + 0.5) / (len(p) + 0.5)) for p in postings], dtype=np.float32
+    )
+    doc_norm = (BM25_K1 * (1 - BM25_B + BM25_B * doc_len / avgdl)).astype(np.float32) if avgdl else doc_len
+
+    encoded = [text.encode("utf-8") for text in texts]
+    text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    text_offsets[1:] = np.cumsum([len(blob) for blob in encoded])
+    digest = hashlib.sha256(b"".join(encoded))
+    digest.update(embedder_spec.encode("utf-8"))
+
+    os.makedirs(out, exist_ok=True)
+    _save(out, "vectors.npy", np.vstack(vectors).astype(np.float32) if vectors else np.zeros((0, 0), np.float32))
+    _save(out, "text_offsets.npy", text_offsets)
+    _save(out, "idf.npy", idf)
+    _save(out, "postings_offsets.npy", offsets)
+    _save(out, "postings_docs.npy", docs)
+    _save(out, "postings_tf.npy", tfs)
+    _save(out, "doc_norm.npy", doc_norm)
+    with open(os.path.join(out, "text.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    with open(os.path.join(out, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(vocabulary, f, ensure_ascii=False)
+    meta = {
+        "format": FORMAT_VERSION,
+        "count": len(texts),
+        "dim": int(dim),
+        "embedder": embedder_spec,
+        "embedded_locally": len(missing),
+        "avgdl": avgdl,
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "build_id": digest.hexdigest()[:16],
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    with open(os.path.join(out, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def read_jsonl_chunks(path: str, text_field: str = "text", vector_field: str = "vector") -> List[Tuple[str, Optional[List[float]]]]:
+    chunks = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                chunks.append((record[text_field], record.get(vector_field)))
+    return chunks
+
+
+async def export_search_chunks(index: str) -> Tuple[List[Tuple[str, Optional[List[float]]]], str]:
+    """
+    Page through every document of a configured Azure AI Search index ("guide" or "map").
+
+    Vectors are exported when the vector field is retrievable; otherwise the builder re-embeds the chunks.
+    Returns the chunks and the index name.
+    """
+    from sk_runtime.search_clients import get_search_index
+
+    if index == "guide":
+        from sk_plugins import ai_search_index as plugin
+        endpoint, name, key = plugin.AZURE_SEARCH_ENDPOINT, plugin.SEARCH_INDEX_NAME, plugin.AZURE_SEARCH_KEY
+    elif index == "map":
+        from sk_plugins import ai_search_index_2 as plugin
+        endpoint, name, key = plugin.AZURE_SEARCH_ENDPOINT_2, plugin.SEARCH_INDEX_NAME_2, plugin.AZURE_SEARCH_KEY_2
+    else:
+        raise ValueError(f"Unknown index '{index}' (expected 'guide' or 'map').")
+    text_field, vector_field = plugin.SEARCH_PARAMS["search_field"], plugin.SEARCH_PARAMS["vector_field"]
+
+    search_index = get_search_index(endpoint, name, key)
+    search_index.timeout = None
+    try:
+        documents = await search_index.search("*", select=[text_field, vector_field])
+    except Exception as e:
+        logger.info(f"Could not export '{vector_field}' from {name} ({e}); exporting text only.")
+        documents = await search_index.search("*", select=[text_field])
+    finally:
+        await search_index.close()
+    return [(doc[text_field], doc.get(vector_field)) for doc in documents if doc.get(text_field)], name
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Build an in-process hybrid (vector + BM25) index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Export chunks and vectors into a memory-mapped index")
+    source = build.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-search", choices=["guide", "map"], help="Export the configured Azure AI Search index")
+    source.add_argument("--from-jsonl", help="JSON lines with a text field and an optional vector field")
+    build.add_argument("--text-field", default="text")
+    build.add_argument("--vector-field", default="vector")
+    build.add_argument("--out", required=True, help="Index directory (use as LOCAL_INDEX_PATH / LOCAL_INDEX_PATH_2)")
+    build.add_argument(
+        "--embedder",
+        help="Query/chunk embedder: 'azure:<deployment>' (the model the index vectors were made with) or 'hashing:<dim>'; "
+             "defaults to azure:$LOCAL_INDEX_EMBEDDING_DEPLOYMENT, else hashing:2048",
+    )
+    query = commands.add_parser("query", help="Run queries against a built index")
+    query.add_argument("path")
+    query.add_argument("questions", nargs="+")
+    query.add_argument("--top", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        spec = args.embedder or (f"azure:{LOCAL_INDEX_EMBEDDING_DEPLOYMENT}" if LOCAL_INDEX_EMBEDDING_DEPLOYMENT else "hashing:2048")
+
+        async def run_build() -> Dict[str, object]:
+            if args.from_search:
+                chunks, name = await export_search_chunks(args.from_search)
+                logger.info(f"Exported {len(chunks)} chunks from {name}.")
+            else:
+                chunks = read_jsonl_chunks(args.from_jsonl, args.text_field, args.vector_field)
+            return await build_index(chunks, args.out, spec)
+
+        meta = asyncio.run(run_build())
+        print(json.dumps(meta, indent=2))
+    else:
+        index = LocalIndex(args.path)
+
+        async def run_queries() -> None:
+            for question in args.questions:
+                started = time.perf_counter()
+                hits = await index.search(question, top=args.top)
+                print(f"{question!r} ({(time.perf_counter() - started) * 1000:.2f} ms)")
+                for hit in hits:
+                    print(f"  {hit.score:.4f}  {hit.text[:100]}")
+
+        asyncio.run(run_queries())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main(sys.argv[1:])
@@ -0,0 +1,266 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Tuple
+
+# -------------------------------
+# Shared TTL/LRU cache for retrieval results
+# -------------------------------
+#
+# Sits in front of the search plugins. Entries are keyed on (namespace, normalized
+# query, query parameters), expire after a per-namespace TTL and are evicted LRU
+# once the cache is full. Concurrent misses for the same key are coalesced so only
+# one backend call is made (single-flight).
+#
+# Invalidation: call `invalidate(namespace)` in-process, or have the ingestion
+# pipeline touch `<SEARCH_CACHE_INVALIDATION_DIR>/<index>.stamp`; a newer stamp
+# than the cached entry drops everything cached for that index.
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+# Per-index overrides, e.g. "guide-index=3600,map-index=86400"
+SEARCH_CACHE_TTLS = os.getenv("SEARCH_CACHE_TTLS", "")
+SEARCH_CACHE_INVALIDATION_DIR = os.getenv("SEARCH_CACHE_INVALIDATION_DIR")
+STAMP_CHECK_INTERVAL = 5.0
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case, strip punctuation and collapse whitespace so trivially different phrasings share a key."""
+    query = _PUNCTUATION.sub(" ", query.casefold())
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def parse_ttls(spec: str) -> Dict[str, float]:
+    """Parse a `name=seconds,name=seconds` TTL override string."""
+    ttls = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, seconds = item.partition("=")
+        try:
+            ttls[name.strip()] = float(seconds)
+        except ValueError:
+            logger.warning(f"Ignoring invalid cache TTL override '{item}'.")
+    return ttls
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+
+class ResultCache:
+    """
+    Size-bounded TTL/LRU cache with single-flight loading.
+
+    Args:
+        max_entries: Maximum number of cached results across all namespaces.
+        default_ttl: Time-to-live in seconds for namespaces without an override.
+        ttls: Per-namespace TTL overrides in seconds.
+        invalidation_dir: Optional directory of `<namespace>.stamp` files used for cross-process invalidation.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        default_ttl: float = SEARCH_CACHE_TTL,
+        ttls: Optional[Mapping[str, float]] = None,
+        invalidation_dir: Optional[str] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.invalidation_dir = invalidation_dir
+        self.stats = CacheStats()
+        # key -> (expires_at, stored_at, value)
+        self._entries: "OrderedDict[Tuple, Tuple[float, float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._stamps: Dict[str, Tuple[float, float]] = {}
+
+    # -------------------------------
+    # Keys and TTLs
+    # -------------------------------
+
+    @staticmethod
+    def make_key(namespace: str, query: str, params: Optional[Mapping[str, Any]] = None) -> Tuple:
+        """Build the cache key for a query against `namespace` with the given parameters."""
+        params_key = json.dumps(params or {}, sort_keys=True, default=str)
+        return (namespace, normalize_query(query), params_key)
+
+    def ttl_for(self, namespace: str) -> float:
+        return self.ttls.get(namespace, self.default_ttl)
+
+    def version(self, namespace: str) -> str:
+        """Opaque data version of a namespace; changes whenever it is invalidated in-process or by stamp."""
+        return f"{self._epoch}.{self._generations.get(namespace, 0)}.{self._stamp_time(namespace):.0f}"
+
+    # -------------------------------
+    # Lookup
+    # -------------------------------
+
+    def _stamp_time(self, namespace: str) -> float:
+        """Modification time of the namespace's invalidation stamp (checked at most every few seconds)."""
+        if not self.invalidation_dir:
+            return 0.0
+        now = time.monotonic()
+        checked_at, mtime = self._stamps.get(namespace, (0.0, 0.0))
+        if now - checked_at >= STAMP_CHECK_INTERVAL:
+            try:
+                mtime = os.path.getmtime(os.path.join(self.invalidation_dir, f"{namespace}.stamp"))
+            except OSError:
+                mtime = 0.0
+            self._stamps[namespace] = (now, mtime)
+        return mtime
+
+    def get(self, key: Tuple) -> Tuple[bool, Any]:
+        """Return `(found, value)` for a key, honouring TTL and invalidation stamps."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, stored_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            return False, None
+        if stored_at < self._stamp_time(key[0]):
+            self.invalidate(key[0])
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def put(self, key: Tuple, value: Any) -> None:
+        now = time.monotonic()
+        self._entries[key] = (now + self.ttl_for(key[0]), time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        query: str,
+        params: Optional[Mapping[str, Any]],
+        loader: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Return the cached result for the query or load it once, sharing the load with concurrent callers.
+
+        Exceptions from the loader propagate to every waiter and are not cached. When the
+        leading caller is cancelled, its waiters load the result again (one of them leads).
+        """
+        key = self.make_key(namespace, query, params)
+        found, value = self.get(key)
+        if found:
+            self.stats.hits += 1
+            return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+            # The leading caller was cancelled, not this one
+            return await self.get_or_load(namespace, query, params, loader)
+
+        self.stats.misses += 1
+        generation = (self._epoch, self._generations.get(namespace, 0))
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        # Skip storing results that raced with an invalidation of this namespace
+        if (self._epoch, self._generations.get(namespace, 0)) == generation:
+            self.put(key, value)
+        future.set_result(value)
+        return value
+
+    # -------------------------------
+    # Invalidation and metrics
+    # -------------------------------
+
+    def invalidate(self, namespace: Optional[str] = None) -> int:
+        """Drop cached entries for one namespace (or all); returns how many were removed."""
+        if namespace is None:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._epoch += 1
+        else:
+            keys = [key for key in self._entries if key[0] == namespace]
+            for key in keys:
+                del self._entries[key]
+            removed = len(keys)
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+        self.stats.invalidations += 1
+        logger.info(f"Invalidated {removed} cached results for '{namespace or '*'}'.")
+        return removed
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus current size, suitable for logging or a metrics exporter."""
+        return {**asdict(self.stats), "size": len(self._entries)}
+
+
+_search_cache: Optional[ResultCache] = None
+
+
+def get_search_cache() -> ResultCache:
+    """Return the process-wide cache shared by the search plugins."""
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = ResultCache(
+            ttls=parse_ttls(SEARCH_CACHE_TTLS),
+            invalidation_dir=SEARCH_CACHE_INVALIDATION_DIR,
+        )
+    return _search_cache
+
+
+def invalidate_search_cache(index_name: Optional[str] = None) -> int:
+    """Invalidate cached search results for an index (e.g. after re-ingestion) in this process."""
+    return get_search_cache().invalidate(index_name)
+
+
+def touch_invalidation_stamp(index_name: str, directory: Optional[str] = SEARCH_CACHE_INVALIDATION_DIR) -> None:
+    """Mark `index_name` as re-ingested for every process sharing `directory`."""
+    if not directory:
+        raise ValueError("SEARCH_CACHE_INVALIDATION_DIR is not configured.")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{index_name}.stamp")
+    with open(path, "a"):
+        pass
+    os.utime(path, None)
+
+
+if __name__ == "__main__":
+    # Usage: python -m sk_runtime.result_cache <index-name>   (run after re-ingesting the index)
+    import sys
+
+    for name in sys.argv[1:]:
+        touch_invalidation_stamp(name)
+        print(f"Invalidation stamp updated for '{name}'.")
@@ -0,0 +1,363 @@
+import os
+import re
+import json
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from opentelemetry import metrics
+from semantic_kernel.filters import FunctionInvocationContext
+from semantic_kernel.functions.function_result import FunctionResult
+
+from sk_runtime.history_reducer import count_tokens
+from sk_runtime.telemetry import result_text
+from sk_runtime.turn_metrics import current_turn
+
+# -------------------------------
+# Tool result shaping
+# -------------------------------
+#
+# Tool results used to reach the prompt verbatim (JSON lists of inventory rows
+# with the same templated Description on every row, three full search chunks).
+# `result_shaping_filter` rewrites each result into what the model needs:
+#
+#   * lists of records (and {"items": [...]} pages) become one pipe-separated
+#     table; columns with one value for every row are stated once, word runs
+#     every value of a column starts or ends with become a column template
+#     ("Price = {} AED"), columns that only repeat the row's other columns are
+#     dropped, and long values seen on several rows are written once in a legend
+#   * results over the tool's token budget are cut by relevance to the function
+#     arguments and the user's question: whole rows or paragraphs that match best
+#     are kept (in their original order), the rest is summarized in one line
+#
+# Budgets: TOOL_RESULT_MAX_TOKENS for every tool, overridden per tool with
+# TOOL_RESULT_BUDGETS="get_inventory=800,AiSearch.ai_search=600" (function or
+# plugin.function). Bytes and tokens saved are exported as metrics and added to
+# the turn's `tool_result_tokens_saved`.
+
+logger = logging.getLogger(__name__)
+
+TOOL_RESULT_SHAPING = os.getenv("TOOL_RESULT_SHAPING", "true").lower() == "true"
+TOOL_RESULT_MAX_TOKENS = int(os.getenv("TOOL_RESULT_MAX_TOKENS", "1500"))
+TOOL_RESULT_BUDGETS = {
+    name.strip(): int(tokens)
+    for name, _, tokens in (pair.partition("=") for pair in os.getenv("TOOL_RESULT_BUDGETS", "").split(",") if "=" in pair)
+}
+# Results longer than this (characters) are shaped in a worker thread instead of on the event loop
+TOOL_RESULT_THREAD_CHARS = int(os.getenv("TOOL_RESULT_THREAD_CHARS", "100000"))
+# Values at least this long that occur on several rows go to the legend; columns this long on
+# average are free text, the only ones whose cells may be blanked as repeating the row
+LEGEND_MIN_CHARS = 24
+TEXT_MIN_CHARS = 24
+# Column affixes shorter than this are not worth a template
+AFFIX_MIN_CHARS = 3
+
+STOPWORDS = frozenset({"a", "an", "and", "the", "of", "from", "for", "with", "in", "on", "at", "to", "is", "s"})
+_WORD = re.compile(r"\w+")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+# Ends a table that had to leave rows out; counted in its budget
+_NARROW_QUERY = "\nNarrow the query (filters, fields, offset) for other rows."
+
+meter = metrics.get_meter("sk_runtime")
+saved_bytes = meter.create_counter("sk.tool.result.saved_bytes", unit="By", description="Tool result bytes removed by shaping")
+saved_tokens = meter.create_counter("sk.tool.result.saved_tokens", unit="{token}", description="Tool result tokens removed by shaping")
+
+
+def _words(text: str) -> List[str]:
+    return _WORD.findall(text.casefold())
+
+
+def _terms(text: str) -> Set[str]:
+    return {word for word in _words(text) if word not in STOPWORDS}
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return " ".join(str(value).split()).replace("|", "/")
+
+
+def _column_template(values: Sequence[str]) -> Tuple[str, str, Set[int]]:
+    """
+    Word runs most values of a column start and end with.
+
+    Returns:
+        (head, tail, members): the affixes and the indices of the values that have both; empty when
+        fewer than half of the values (or fewer than two) share an affix worth templating.
+    """
+    split = [value.split(" ") for value in values]
+    common_last = Counter(words[-1] for words in split).most_common(1)[0][0]
+    members = {index for index, words in enumerate(split) if words[-1] == common_last and len(words) > 1}
+    if len(members) < max(2, (len(values) + 1) // 2):
+        return "", "", set()
+    group = [split[index] for index in sorted(members)]
+    shortest = min(len(words) for words in group)
+    first = group[0]
+    suffix = 0
+    while suffix < shortest - 1 and all(words[-1 - suffix] == first[-1 - suffix] for words in group):
+        suffix += 1
+    prefix = 0
+    while prefix < shortest - suffix - 1 and all(words[prefix] == first[prefix] for words in group):
+        prefix += 1
+    head = " ".join(first[:prefix]) + " " if prefix else ""
+    tail = " " + " ".join(first[len(first) - suffix:])
+    # Punctuation glued to the variable part ("Hideaway, great for kids") belongs to the template too
+    glued = os.path.commonprefix([words[-1 - suffix][::-1] for words in group])[::-1]
+    if glued and all(len(words[-1 - suffix]) > len(glued) for words in group) and not glued[0].isalnum():
+        tail = glued + tail
+    head = head if len(head) >= AFFIX_MIN_CHARS else ""
+    tail = tail if len(tail) >= AFFIX_MIN_CHARS else ""
+    return (head, tail, members) if head or tail else ("", "", set())
+
+
+def _blank_redundant(rows: List[Dict[str, str]], originals: List[Dict[str, str]], columns: Sequence[str]) -> Dict[str, int]:
+    """
+    Blank free-text cells whose words all appear in the row's other cells, longest columns first.
+
+    Returns:
+        Column -> number of cells blanked.
+    """
+    blanked: Dict[str, int] = {}
+    text_columns = [column for column in columns if sum(len(row[column]) for row in originals) / len(originals) >= TEXT_MIN_CHARS]
+    for column in sorted(text_columns, key=lambda c: -sum(len(row[c]) for row in originals)):
+        for row, original in zip(rows, originals):
+            own = _terms(row[column])
+            if not own:
+                continue
+            others: Set[str] = set()
+            for other in columns:
+                if other != column and row[other]:
+                    others.update(_words(original[other]))
+            if own <= others:
+                row[column] = ""
+                blanked[column] = blanked.get(column, 0) + 1
+    return blanked
+
+
+def encode_records(records: List[Dict[str, Any]], omitted: int = 0) -> str:
+    """
+    Encode a list of flat dicts as a compact table with constant columns, templates and a legend hoisted out.
+
+    Args:
+        records: Rows to encode (nested values are written as compact JSON).
+        omitted: Rows left out by the caller, mentioned in the header.
+    """
+    if not records:
+        return "No rows."
+    columns: List[str] = []
+    for record in records:
+        columns.extend(key for key in record if key not in columns)
+    rows = [{column: _cell(record.get(column)) for column in columns} for record in records]
+    columns = [column for column in columns if any(row[column] for row in rows)]
+    originals = [dict(row) for row in rows]
+
+    notes: List[str] = []
+    if len(rows) > 1:
+        constant = [column for column in columns if len({row[column] for row in rows}) == 1]
+        if constant:
+            notes.append("Same on every row: " + "; ".join(f"{column}={rows[0][column]}" for column in constant))
+            columns = [column for column in columns if column not in constant]
+
+        templates: Dict[str, str] = {}
+        for column in columns:
+            values = [row[column] for row in rows]
+            if not all(values):
+                continue
+            head, tail, members = _column_template(values)
+            partial = " (cells starting with = are given in full)" if len(members) < len(rows) else ""
+            note = f"{column} = \"{head}{{}}{tail}\"{partial}"
+            # Only worth it when the affix saved on every member clearly outweighs the note and the = marks
+            if not members or len(members) * len(head + tail) - (len(rows) - len(members)) < 2 * len(note):
+                continue
+            for index, row in enumerate(rows):
+                value = row[column]
+                # Values that do not follow the template are marked as given in full
+                row[column] = value[len(head): len(value) - len(tail)] if index in members else f"={value}"
+            templates[column] = note
+
+        if len(columns) > 1:
+            blanked = _blank_redundant(rows, originals, columns)
+            dropped = [column for column in columns if blanked.get(column) == len(rows)]
+            if dropped:
+                columns = [column for column in columns if column not in dropped]
+                notes.append("Omitted (repeats the other columns): " + ", ".join(dropped))
+            partly = [column for column in columns if blanked.get(column)]
+            if partly:
+                notes.append(f"Blank {', '.join(partly)}: only repeats the row's other columns")
+            for column in dropped:
+                templates.pop(column, None)
+        if templates:
+            notes.append("Templates: " + "; ".join(templates.values()))
+
+    counts = Counter(row[column] for row in rows for column in columns if len(row[column]) >= LEGEND_MIN_CHARS)
+    legend = {value: f"^{index}" for index, value in enumerate((v for v, n in counts.items() if n > 1), start=1)}
+
+    total = len(rows) + omitted
+    shown = f"{total} row{'s' if total != 1 else ''}" if not omitted else f"{len(rows)} of {total} rows (most relevant)"
+    lines = [shown + (". " + ". ".join(notes) if notes else "")]
+    lines.append("|".join(columns))
+    lines.extend("|".join(legend.get(row[column], row[column]) for column in columns) for row in rows)
+    lines.extend(f"{ref} = {value}" for value, ref in legend.items())
+    return "\n".join(lines)
+
+
+def _relevance(text: str, terms: Set[str]) -> int:
+    return len(terms & set(_words(text))) if terms else 0
+
+
+def _ranked(texts: List[str], terms: Set[str]) -> List[int]:
+    """Indices of `texts`, most relevant to `terms` first (ties: earliest)."""
+    return sorted(range(len(texts)), key=lambda i: (-_relevance(texts[i], terms), i))
+
+
+def _select(
+    items: List[Any],
+    texts: List[str],
+    terms: Set[str],
+    costs: List[int],
+    budget: int,
+    fits: Callable[[List[Any]], bool],
+) -> List[Any]:
+    """
+    The most relevant items (ties: earliest) that `fits`, in their original order.
+
+    Items are taken by relevance while their token `costs` (counted once per item) stay within
+    `budget`; the selection is then checked once with `fits` and, only when that fails, cut back
+    to the longest most-relevant part that fits (binary search).
+    """
+    chosen: List[int] = []
+    spent = 0
+    for index in _ranked(texts, terms):
+        if spent + costs[index] <= budget:
+            chosen.append(index)
+            spent += costs[index]
+
+    def selection(count: int) -> List[Any]:
+        return [items[i] for i in sorted(chosen[:count])]
+
+    low, high = 0, len(chosen)
+    if fits(selection(high)):
+        return selection(high)
+    high -= 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(selection(middle)):
+            low = middle
+        else:
+            high = middle - 1
+    return selection(low)
+
+
+def shape_records(records: List[Dict[str, Any]], terms: Set[str], budget: int, header: str = "") -> str:
+    """Table of `records` within `budget` tokens, keeping the rows most relevant to `terms`."""
+    prefix = f"{header}\n" if header else ""
+    text = prefix + encode_records(records)
+    if count_tokens(text) <= budget:
+        return text
+    texts = [" ".join(_cell(value) for value in record.values()) for record in records]
+    # A row costs what its line of the full table costs. The legend of a selection is much shorter
+    # than that of the full table, so only the header and column lines are counted up front
+    lines = text[len(prefix):].split("\n")
+    costs = [count_tokens(line) + 1 for line in lines[2: 2 + len(records)]]
+    fixed = count_tokens(prefix + "\n".join(lines[:2]) + _NARROW_QUERY)
+    kept = _select(
+        records, texts, terms, costs, budget - fixed,
+        lambda rows: count_tokens(prefix + encode_records(rows, omitted=len(records) - len(rows)) + _NARROW_QUERY) <= budget,
+    )
+    return prefix + encode_records(kept, omitted=len(records) - len(kept)) + _NARROW_QUERY
+
+
+def shape_text(text: str, terms: Set[str], budget: int) -> str:
+    """`text` within `budget` tokens: whole paragraphs (then sentences) most relevant to `terms`, in order."""
+    if count_tokens(text) <= budget:
+        return text
+    paragraphs = [paragraph.strip() for paragraph in text.split("\n") if paragraph.strip()]
+    if len(paragraphs) == 1:
+        paragraphs = _SENTENCE.split(paragraphs[0])
+    costs = [count_tokens(paragraph) + 1 for paragraph in paragraphs]
+    kept = _select(
+        paragraphs, paragraphs, terms, costs, budget - 12,
+        lambda parts: count_tokens("\n".join(parts)) <= budget - 12,
+    )
+    if not kept:
+        # Even the best paragraph is too long: keep as much of its leading part as fits
+        best = paragraphs[_ranked(paragraphs, terms)[0]]
+        length = max(0, budget - 20) * 4
+        while length and count_tokens(best[:length]) > budget - 20:
+            length = length * 3 // 4
+        return best[:length] + f"\n[passage truncated; {len(paragraphs) - 1} less relevant passages omitted]"
+    return "\n".join(kept) + f"\n[{len(paragraphs) - len(kept)} less relevant passages omitted]"
+
+
+def _is_records(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, dict) for item in value)
+
+
+def shape_result(value: Any, terms: Set[str], budget: int) -> Optional[str]:
+    """Shaped text for a tool result, or None to leave it unchanged."""
+    if _is_records(value):
+        return shape_records(value, terms, budget)
+    if isinstance(value, dict):
+        pages = [key for key, item in value.items() if _is_records(item)]
+        if len(pages) == 1:
+            header = ", ".join(f"{key}={_cell(item)}" for key, item in value.items() if key != pages[0])
+            return shape_records(value[pages[0]], terms, budget, header=header)
+        text = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+        return shape_text(text, terms, budget) if count_tokens(text) > budget else text
+    if isinstance(value, str):
+        shaped = shape_text(value, terms, budget)
+        return shaped if shaped is not value else None
+    return None
+
+
+def budget_for(plugin: Optional[str], function: str) -> int:
+    return TOOL_RESULT_BUDGETS.get(f"{plugin}.{function}", TOOL_RESULT_BUDGETS.get(function, TOOL_RESULT_MAX_TOKENS))
+
+
+def _relevance_terms(context: FunctionInvocationContext) -> Set[str]:
+    terms: Set[str] = set()
+    for value in (context.arguments or {}).values():
+        if isinstance(value, str):
+            terms |= _terms(value)
+    turn = current_turn.get()
+    if turn is not None and turn.question:
+        terms |= _terms(turn.question)
+    return terms
+
+
+async def result_shaping_filter(
+    context: FunctionInvocationContext,
+    next: Callable[[FunctionInvocationContext], Awaitable[None]],
+) -> None:
+    """
+    Kernel function-invocation filter that compacts and budgets the result before it enters the prompt.
+
+    Register it inside `instrumentation_filter`, so the recorded result size is what the model receives.
+    """
+    await next(context)
+    if not TOOL_RESULT_SHAPING or context.result is None:
+        return
+    value = context.result.value
+    function = context.function
+    terms, budget = _relevance_terms(context), budget_for(function.plugin_name, function.name)
+    before = result_text(value)
+    if len(before) > TOOL_RESULT_THREAD_CHARS:
+        shaped = await asyncio.to_thread(shape_result, value, terms, budget)
+    else:
+        shaped = shape_result(value, terms, budget)
+    if shaped is None:
+        return
+    bytes_saved = len(before.encode("utf-8")) - len(shaped.encode("utf-8"))
+    tokens_saved = count_tokens(before) - count_tokens(shaped)
+    if tokens_saved <= 0:
+        return
+    attributes = {"sk.plugin": function.plugin_name or "", "sk.function": function.name}
+    saved_bytes.add(max(bytes_saved, 0), attributes)
+    saved_tokens.add(tokens_saved, attributes)
+    turn = current_turn.get()
+    if turn is not None:
+        turn.tool_result_tokens_saved += tokens_saved
+    context.result = FunctionResult(function=function.metadata, value=shaped, metadata=context.result.metadata)
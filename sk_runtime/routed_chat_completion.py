@@ -0,0 +1,76 @@
+from typing import Any
+
+import semantic_kernel
+from openai import BadRequestError
+from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
+from semantic_kernel.connectors.ai.open_ai.services.open_ai_model_types import OpenAIModelTypes
+from semantic_kernel.exceptions import ServiceResponseException
+from semantic_kernel.connectors.ai.open_ai.exceptions.content_filter_ai_exception import ContentFilterAIException
+
+from sk_runtime.deployment_router import DeploymentRouter
+
+# -------------------------------
+# Chat service on top of the deployment router
+# -------------------------------
+#
+# Kept apart from deployment_router.py because the Semantic Kernel OpenAI
+# connector is the most expensive import of the apps: it is only loaded when
+# the kernel is built, not when the deployments are read.
+#
+# RoutedChatCompletion replaces one internal method of the connector and calls
+# two more. They are not public API, so requirements.txt pins semantic-kernel,
+# and the check below fails the kernel build (not the first chat request) when
+# an upgrade renamed them.
+
+CONNECTOR_INTERNALS = ("_send_completion_request", "_handle_structured_output", "store_usage")
+
+
+def check_connector_internals() -> None:
+    """Raise ImportError when the connector methods RoutedChatCompletion relies on are missing."""
+    missing = [name for name in CONNECTOR_INTERNALS if not callable(getattr(AzureChatCompletion, name, None))]
+    if missing:
+        raise ImportError(
+            f"semantic-kernel {semantic_kernel.__version__} has no AzureChatCompletion.{', '.join(missing)}; "
+            "RoutedChatCompletion needs updating for this version (see requirements.txt for the tested one)."
+        )
+
+
+check_connector_internals()
+
+
+class RoutedChatCompletion(AzureChatCompletion):
+    """
+    AzureChatCompletion whose chat requests go through a DeploymentRouter.
+
+    Everything else (history preparation, tool calling, streaming, usage) is the
+    stock service; `client` and `ai_model_id` are those of the first deployment.
+    """
+
+    router: Any = None
+
+    def __init__(self, router: DeploymentRouter) -> None:
+        primary = router.backends[0]
+        super().__init__(
+            deployment_name=primary.deployment.deployment,
+            api_version=primary.deployment.api_version,
+            async_client=primary.client,
+        )
+        self.router = router
+
+    async def _send_completion_request(self, settings: Any) -> Any:
+        if self.ai_model_type != OpenAIModelTypes.CHAT:
+            return await super()._send_completion_request(settings)
+        try:
+            settings_dict = settings.prepare_settings_dict()
+            self._handle_structured_output(settings, settings_dict)
+            if settings.tools is None:
+                settings_dict.pop("parallel_tool_calls", None)
+            response = await self.router.create(settings_dict)
+            self.store_usage(response)
+            return response
+        except BadRequestError as ex:
+            if ex.code == "content_filter":
+                raise ContentFilterAIException(f"{type(self)} service encountered a content error", ex) from ex
+            raise ServiceResponseException(f"{type(self)} service failed to complete the prompt", ex) from ex
+        except Exception as ex:
+            raise ServiceResponseException(f"{type(self)} service failed to complete the prompt", ex) from ex
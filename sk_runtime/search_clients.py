@@ -0,0 +1,109 @@
+import os
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from azure.search.documents.aio import SearchClient
+
+# -------------------------------
+# Long-lived async Azure AI Search clients
+# -------------------------------
+#
+# One aio SearchClient per (endpoint, index) for the whole process. Each index
+# caps its in-flight requests with a semaphore and bounds every query (request
+# plus result paging) with an overall timeout, so a slow index cannot hold the
+# event loop or pile up unbounded work. The Azure SDK itself is imported with
+# the first client, so it stays off the apps' import path.
+
+logger = logging.getLogger(__name__)
+
+AZURE_SEARCH_TIMEOUT = float(os.getenv("AZURE_SEARCH_TIMEOUT", "10"))
+AZURE_SEARCH_CONNECT_TIMEOUT = float(os.getenv("AZURE_SEARCH_CONNECT_TIMEOUT", "3"))
+AZURE_SEARCH_READ_TIMEOUT = float(os.getenv("AZURE_SEARCH_READ_TIMEOUT", "10"))
+AZURE_SEARCH_MAX_CONCURRENCY = int(os.getenv("AZURE_SEARCH_MAX_CONCURRENCY", "8"))
+
+
+class PooledSearchIndex:
+    """
+    A shared async SearchClient for one index with a concurrency limit and timeouts.
+
+    Args:
+        endpoint: Azure AI Search service endpoint.
+        index_name: Name of the index to query.
+        api_key: Admin or query key for the service.
+        max_concurrency: Maximum number of in-flight queries against this index.
+        timeout: Overall budget in seconds for one query, including paging through results.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        index_name: str,
+        api_key: str,
+        max_concurrency: int = AZURE_SEARCH_MAX_CONCURRENCY,
+        timeout: float = AZURE_SEARCH_TIMEOUT,
+    ) -> None:
+        self.endpoint = endpoint
+        self.index_name = index_name
+        self._api_key = api_key
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional["SearchClient"] = None
+
+    def _get_client(self) -> "SearchClient":
+        # Created on first use so the underlying aiohttp session binds to the running loop
+        if self._client is None:
+            from azure.core.credentials import AzureKeyCredential
+            from azure.search.documents.aio import SearchClient
+
+            self._client = SearchClient(
+                endpoint=self.endpoint,
+                index_name=self.index_name,
+                credential=AzureKeyCredential(self._api_key),
+                connection_timeout=AZURE_SEARCH_CONNECT_TIMEOUT,
+                read_timeout=AZURE_SEARCH_READ_TIMEOUT,
+            )
+        return self._client
+
+    async def _collect(self, search_text: str, **kwargs: Any) -> List[Dict[str, Any]]:
+        results = await self._get_client().search(search_text=search_text, **kwargs)
+        return [result async for result in results]
+
+    async def search(self, search_text: str, **kwargs: Any) -> List[Dict[str, Any]]:
+        """
+        Run a query and return all result documents.
+
+        Raises:
+            asyncio.TimeoutError: If the query does not complete within `timeout` seconds.
+        """
+        async with self._semaphore:
+            return await asyncio.wait_for(self._collect(search_text, **kwargs), timeout=self.timeout)
+
+    async def close(self) -> None:
+        """Close the underlying client; a new one is created on next use."""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.close()
+
+
+_indexes: Dict[Tuple[str, str], PooledSearchIndex] = {}
+
+
+def get_search_index(endpoint: str, index_name: str, api_key: str) -> PooledSearchIndex:
+    """Return the process-wide PooledSearchIndex for `index_name` on `endpoint`."""
+    key = (endpoint, index_name)
+    index = _indexes.get(key)
+    if index is None:
+        index = PooledSearchIndex(endpoint=endpoint, index_name=index_name, api_key=api_key)
+        _indexes[key] = index
+    return index
+
+
+async def close_search_indexes() -> None:
+    """Close every pooled search client (app shutdown hook)."""
+    for index in list(_indexes.values()):
+        try:
+            await index.close()
+        except Exception as e:
+            logger.warning(f"Error closing search client for '{index.index_name}': {e}")
@@ -0,0 +1,434 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import asyncio
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Protocol
+
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from semantic_kernel.contents.history_reducer.chat_history_reducer_utils import SUMMARY_METADATA_KEY
+
+from sk_runtime.history_reducer import TokenBudgetHistoryReducer, create_history
+
+# -------------------------------
+# Session store for chat histories
+# -------------------------------
+#
+# Chat histories live in a per-process LRU of live objects (bounded by
+# SESSION_MAX_LIVE, idle sessions evicted after SESSION_IDLE_TTL) backed by an
+# optional persistent backend:
+#
+#   SESSION_STORE=memory   live objects only (default); evicted sessions are gone
+#   SESSION_STORE=sqlite   every message is also written to SESSION_STORE_PATH, so
+#                          sessions survive restarts and are shared by every worker
+#                          on the host; evicted sessions are reloaded on next use
+#
+# A session whose turn is in progress (messages added since its last save) is
+# not evicted until it has been idle for SESSION_IDLE_TTL, so the turn's save()
+# still finds it; the LRU may exceed SESSION_MAX_LIVE meanwhile.
+#
+# Messages are stored one row each in a compact encoding (JSON without empty
+# fields, zlib-compressed when large). A save only appends the messages added
+# since the last save; the history is rewritten only when the reducer changed
+# earlier messages. Each write bumps a per-session revision, and a worker
+# reloads a session whenever another worker has written it since.
+#
+# Backends are small (load / revision / append / replace / delete / purge), so a
+# Redis one maps onto a list per session plus a revision counter.
+
+logger = logging.getLogger(__name__)
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "sessions.sqlite3")
+SESSION_MAX_LIVE = int(os.getenv("SESSION_MAX_LIVE", "1000"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+# Persisted sessions idle for longer than this are purged (seconds; 0 keeps them)
+SESSION_RETENTION = float(os.getenv("SESSION_RETENTION", str(7 * 24 * 3600)))
+
+COMPRESS_OVER_BYTES = 512
+_PLAIN, _ZLIB = b"j", b"z"
+
+
+# -------------------------------
+# Compact message encoding
+# -------------------------------
+
+
+def _compact(value: Any) -> Any:
+    """Drop empty metadata/containers so common messages serialize to a few dozen bytes."""
+    if isinstance(value, dict):
+        return {key: _compact(item) for key, item in value.items() if item not in ({}, [], None)}
+    if isinstance(value, list):
+        return [_compact(item) for item in value]
+    return value
+
+
+def encode_message(message: ChatMessageContent) -> bytes:
+    """Serialize a message without its raw service payload (inner_content) or per-chunk metadata."""
+    exclude = {"inner_content": True, "items": {"__all__": {"inner_content"}}}
+    # Only the summary marker is needed to rebuild the history; token usage, ids etc. are dropped
+    metadata = {SUMMARY_METADATA_KEY: True} if message.metadata.get(SUMMARY_METADATA_KEY) else {}
+    data = message.model_copy(update={"metadata": metadata}).model_dump(mode="json", exclude_none=True, exclude=exclude)
+    payload = json.dumps(_compact(data), separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+    if len(payload) > COMPRESS_OVER_BYTES:
+        return _ZLIB + zlib.compress(payload)
+    return _PLAIN + payload
+
+
+def decode_message(data: bytes) -> ChatMessageContent:
+    payload = zlib.decompress(data[1:]) if data[:1] == _ZLIB else data[1:]
+    return ChatMessageContent.model_validate_json(payload)
+
+
+# -------------------------------
+# Persistent backends
+# -------------------------------
+
+
+class SessionConflict(Exception):
+    """The session was written by another worker since it was loaded."""
+
+
+@dataclass
+class StoredSession:
+    revision: int
+    state: Dict[str, Any]
+    messages: List[bytes]
+
+
+class SessionBackend(Protocol):
+    def load(self, session_id: str) -> Optional[StoredSession]:
+        """Return the stored session, or None."""
+
+    def revision(self, session_id: str) -> Optional[int]:
+        """Return the session's current revision (cheap), or None when it does not exist."""
+
+    def append(self, session_id: str, messages: List[bytes], state: Dict[str, Any], base_revision: int) -> int:
+        """Append messages if the session is still at `base_revision`; returns the new revision or raises SessionConflict."""
+
+    def replace(self, session_id: str, messages: List[bytes], state: Dict[str, Any]) -> int:
+        """Rewrite the whole session; returns the new revision."""
+
+    def delete(self, session_id: str) -> None:
+        """Remove the session."""
+
+    def purge(self, max_idle: float) -> int:
+        """Remove sessions not written for `max_idle` seconds; returns how many were removed."""
+
+
+class SqliteSessionBackend:
+    """
+    SQLite file backend (WAL mode), safe to share between processes on one host.
+
+    Args:
+        path: Database file; created with its schema on first use.
+        busy_timeout: Seconds to wait for another process's write lock.
+    """
+
+    def __init__(self, path: str = SESSION_STORE_PATH, busy_timeout: float = 5.0) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                revision INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);
+            """
+        )
+
+    def load(self, session_id: str) -> Optional[StoredSession]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT revision, state FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            messages = [
+                data for (data,) in self._conn.execute(
+                    "SELECT data FROM messages WHERE session_id = ? ORDER BY seq", (session_id,)
+                )
+            ]
+        return StoredSession(revision=row[0], state=json.loads(row[1]), messages=messages)
+
+    def revision(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT revision FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def _write(self, session_id: str, messages: List[bytes], state: Dict[str, Any], base_revision: Optional[int]) -> int:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT revision, (SELECT COALESCE(MAX(seq), -1) FROM messages WHERE session_id = ?) "
+                    "FROM sessions WHERE session_id = ?",
+                    (session_id, session_id),
+                ).fetchone()
+                revision, last_seq = row if row is not None else (0, -1)
+                if base_revision is not None and revision != base_revision:
+                    raise SessionConflict(f"Session {session_id} is at revision {revision}, expected {base_revision}.")
+                if base_revision is None:
+                    self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+                    last_seq = -1
+                self._conn.executemany(
+                    "INSERT INTO messages (session_id, seq, data) VALUES (?, ?, ?)",
+                    [(session_id, last_seq + 1 + i, data) for i, data in enumerate(messages)],
+                )
+                self._conn.execute(
+                    "INSERT INTO sessions (session_id, revision, state, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (session_id) DO UPDATE SET revision = excluded.revision, "
+                    "state = excluded.state, updated_at = excluded.updated_at",
+                    (session_id, revision + 1, json.dumps(state), time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return revision + 1
+
+    def append(self, session_id: str, messages: List[bytes], state: Dict[str, Any], base_revision: int) -> int:
+        return self._write(session_id, messages, state, base_revision)
+
+    def replace(self, session_id: str, messages: List[bytes], state: Dict[str, Any]) -> int:
+        return self._write(session_id, messages, state, None)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def purge(self, max_idle: float) -> int:
+        cutoff = time.time() - max_idle
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE updated_at < ?)",
+                    (cutoff,),
+                )
+                removed = self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,)).rowcount
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# -------------------------------
+# Live session cache
+# -------------------------------
+
+
+@dataclass
+class LiveSession:
+    history: TokenBudgetHistoryReducer
+    revision: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+    # The messages (by identity) already written to the backend, in order
+    persisted: List[ChatMessageContent] = field(default_factory=list)
+    summary: Optional[str] = None
+
+
+@dataclass
+class SessionStoreStats:
+    live: int = 0
+    loads: int = 0
+    reloads: int = 0
+    appends: int = 0
+    rewrites: int = 0
+    conflicts: int = 0
+    evictions: int = 0
+
+
+class SessionStore:
+    """
+    Per-process LRU of live chat histories over an optional persistent backend.
+
+    Args:
+        backend: Persistent backend; None keeps sessions in this process only.
+        max_live: Live histories kept in memory; the least recently used is evicted.
+        idle_ttl: Seconds of inactivity after which a live history is evicted.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[SessionBackend] = None,
+        max_live: int = SESSION_MAX_LIVE,
+        idle_ttl: float = SESSION_IDLE_TTL,
+    ) -> None:
+        self.backend = backend
+        self.max_live = max_live
+        self.idle_ttl = idle_ttl
+        self.stats = SessionStoreStats()
+        self._live: "OrderedDict[str, LiveSession]" = OrderedDict()
+
+    @staticmethod
+    def _turn_in_progress(session: LiveSession) -> bool:
+        """Whether the history holds conversation messages not saved yet (a turn has started but not ended)."""
+        saved = {id(message) for message in session.persisted}
+        return any(
+            id(message) not in saved and message.role != AuthorRole.SYSTEM for message in session.history.messages
+        )
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        excess = len(self._live) - self.max_live
+        evicted = []
+        for session_id, session in self._live.items():
+            idle = now - session.last_used
+            if excess <= 0 and idle < self.idle_ttl:
+                break
+            if self._turn_in_progress(session):
+                if idle < self.idle_ttl:
+                    # Still streaming: save() at the end of the turn needs it (the cap is exceeded meanwhile)
+                    continue
+                logger.warning(f"Evicting session {session_id} with unsaved messages (turn abandoned?).")
+            evicted.append(session_id)
+            excess -= 1
+        for session_id in evicted:
+            del self._live[session_id]
+            self.stats.evictions += 1
+
+    def _restore(self, stored: StoredSession, service: Optional[ChatCompletionClientBase]) -> LiveSession:
+        history = create_history(service=service)
+        history.messages = [decode_message(data) for data in stored.messages]
+        history.summary = stored.state.get("summary")
+        return LiveSession(
+            history=history, revision=stored.revision, persisted=list(history.messages), summary=history.summary
+        )
+
+    async def history(
+        self,
+        session_id: str,
+        system_prompt: Optional[str] = None,
+        service: Optional[ChatCompletionClientBase] = None,
+    ) -> TokenBudgetHistoryReducer:
+        """
+        Return the session's history, loading it from the backend or creating it (seeded with `system_prompt`).
+
+        A live history is reused unless another worker has written the session since.
+        """
+        session = self._live.get(session_id)
+        if session is not None and self.backend is not None:
+            revision = await asyncio.to_thread(self.backend.revision, session_id)
+            if revision is not None and revision != session.revision:
+                self.stats.reloads += 1
+                session = None
+        if session is None:
+            stored = await asyncio.to_thread(self.backend.load, session_id) if self.backend is not None else None
+            if stored is not None:
+                self.stats.loads += 1
+                session = self._restore(stored, service)
+            else:
+                session = LiveSession(history=create_history(system_prompt, service=service))
+            self._live[session_id] = session
+        session.last_used = time.monotonic()
+        self._live.move_to_end(session_id)
+        self._evict()
+        self.stats.live = len(self._live)
+        return session.history
+
+    async def save(self, session_id: str) -> None:
+        """
+        Persist what changed in the session's history since the last save (nothing is written without a backend).
+
+        Call it at the end of every turn: until then the session is kept out of eviction.
+        """
+        session = self._live.get(session_id)
+        if session is None:
+            logger.warning(f"Session {session_id} was evicted before its turn was saved.")
+            return
+        if self.backend is None:
+            # Nothing to write, but the turn has ended: the session may be evicted again
+            session.persisted = list(session.history.messages)
+            return
+        messages = list(session.history.messages)
+        persisted = session.persisted
+        state = {"summary": session.history.summary}
+        appendable = len(messages) >= len(persisted) and all(a is b for a, b in zip(messages, persisted))
+        if appendable and len(messages) == len(persisted) and state["summary"] == session.summary:
+            return
+
+        if appendable:
+            new = [encode_message(message) for message in messages[len(persisted):]]
+            try:
+                session.revision = await asyncio.to_thread(self.backend.append, session_id, new, state, session.revision)
+                self.stats.appends += 1
+            except SessionConflict as e:
+                # Concurrent turns on two workers: the last writer's view wins
+                logger.warning(f"{e} Rewriting the session with this worker's history.")
+                self.stats.conflicts += 1
+                appendable = False
+        if not appendable:
+            encoded = [encode_message(message) for message in messages]
+            session.revision = await asyncio.to_thread(self.backend.replace, session_id, encoded, state)
+            self.stats.rewrites += 1
+        session.persisted = messages
+        session.summary = state["summary"]
+
+    async def delete(self, session_id: str) -> None:
+        self._live.pop(session_id, None)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.delete, session_id)
+
+    async def purge(self, max_idle: float = SESSION_RETENTION) -> int:
+        """Evict idle live sessions and purge persisted ones idle for `max_idle` seconds."""
+        self._evict()
+        if self.backend is None or max_idle <= 0:
+            return 0
+        removed = await asyncio.to_thread(self.backend.purge, max_idle)
+        if removed:
+            logger.info(f"Purged {removed} idle sessions from the session store.")
+        return removed
+
+    def snapshot(self) -> Dict[str, int]:
+        """Counters plus current size, suitable for logging or a metrics exporter."""
+        self.stats.live = len(self._live)
+        return asdict(self.stats)
+
+
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Return the process-wide session store configured by SESSION_STORE."""
+    global _session_store
+    if _session_store is None:
+        if SESSION_STORE == "sqlite":
+            backend: Optional[SessionBackend] = SqliteSessionBackend(SESSION_STORE_PATH)
+            logger.info(f"Sessions are persisted to {SESSION_STORE_PATH}.")
+        else:
+            if SESSION_STORE != "memory":
+                logger.warning(f"Unknown SESSION_STORE '{SESSION_STORE}'; keeping sessions in memory.")
+            backend = None
+        _session_store = SessionStore(backend)
+    return _session_store
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
@@ -0,0 +1,122 @@
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# -------------------------------
+# Process configuration
+# -------------------------------
+#
+# The .env file is read once per process, when this module is first imported,
+# so the apps import it before anything else: every other module reads its
+# tuning knobs (HTTP_*, LLM_*, ...) from the environment at import time and must
+# see the .env values too. Service endpoints, keys and names are then parsed
+# once into a frozen Settings object shared by the apps and the plugins.
+#
+# WARM_UP controls what the Chainlit apps do at startup:
+#   background (default)  start serving right away; build the kernel, import the
+#                         SDKs and open the Azure OpenAI connections in the background
+#   blocking              finish all of that before the first request is accepted
+#   off                   build everything on the first turn
+
+_env_lock = threading.Lock()
+_env_loaded = False
+
+
+def load_environment() -> None:
+    """Load the .env file into the process environment (once; existing variables win)."""
+    global _env_loaded
+    with _env_lock:
+        if not _env_loaded:
+            load_dotenv()
+            _env_loaded = True
+
+
+load_environment()
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Service configuration of the apps and plugins, read from the environment."""
+
+    azure_openai_api_key: Optional[str]
+    azure_openai_endpoint: Optional[str]
+    # Full base URL (e.g. https://<resource>.openai.azure.com/openai, a gateway or a test server)
+    azure_openai_endpoint_old: Optional[str]
+    azure_openai_base_url: Optional[str]
+    azure_openai_deployment: str
+    azure_openai_api_version: str
+    # Resource serving the embedding deployments, when it is not azure_openai_endpoint
+    azure_openai_embedding_endpoint: Optional[str]
+    azure_openai_prompt: Optional[str]
+    azure_openai_prompt_newapp: Optional[str]
+
+    search_endpoint: Optional[str]
+    search_api_key: Optional[str]
+    search_index: Optional[str]
+    # "remote" (Azure AI Search) or "local" (in-process index, see local_index.py)
+    search_backend: str
+    local_index_path: Optional[str]
+    search_endpoint_2: Optional[str]
+    search_api_key_2: Optional[str]
+    search_index_2: Optional[str]
+    search_backend_2: str
+    local_index_path_2: Optional[str]
+
+    google_api_key: Optional[str]
+    google_search_engine_id: Optional[str]
+    google_search_url: str
+
+    inventory_url: Optional[str]
+    inventory_query_url: Optional[str]
+    inventory_facets_url: Optional[str]
+    inventory_bulk_url: Optional[str]
+
+    warm_up: str
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        inventory_url = os.getenv("URL_retrieve_data")
+        inventory_base = inventory_url.rstrip("/") if inventory_url else None
+        return cls(
+            azure_openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            azure_openai_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            azure_openai_endpoint_old=os.getenv("AZURE_OPENAI_ENDPOINT_OLD"),
+            azure_openai_base_url=os.getenv("AZURE_OPENAI_BASE_URL"),
+            azure_openai_deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4.1"),
+            azure_openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION", "2025-01-01-preview"),
+            azure_openai_embedding_endpoint=os.getenv("AZURE_OPENAI_EMBEDDING_ENDPOINT"),
+            azure_openai_prompt=os.getenv("AZURE_OPENAI_PROMPT"),
+            azure_openai_prompt_newapp=os.getenv("AZURE_OPENAI_PROMPT_NEWAPP"),
+            search_endpoint=os.getenv("AZURE_SEARCH_ENDPOINT"),
+            search_api_key=os.getenv("AZURE_SEARCH_API_KEY"),
+            search_index=os.getenv("AZURE_SEARCH_INDEX"),
+            search_backend=os.getenv("AZURE_SEARCH_BACKEND", "remote").lower(),
+            local_index_path=os.getenv("LOCAL_INDEX_PATH"),
+            search_endpoint_2=os.getenv("AZURE_SEARCH_ENDPOINT_2"),
+            search_api_key_2=os.getenv("AZURE_SEARCH_API_KEY_2"),
+            search_index_2=os.getenv("AZURE_SEARCH_INDEX_2"),
+            search_backend_2=os.getenv("AZURE_SEARCH_BACKEND_2", "remote").lower(),
+            local_index_path_2=os.getenv("LOCAL_INDEX_PATH_2"),
+            google_api_key=os.getenv("GOOGLE_API_KEY"),
+            google_search_engine_id=os.getenv("GOOGLE_SEARCH_ENGINE_ID"),
+            google_search_url=os.getenv("GOOGLE_SEARCH_URL", "https://www.googleapis.com/customsearch/v1"),
+            inventory_url=inventory_url,
+            inventory_query_url=os.getenv("URL_query_inventory") or (f"{inventory_base}/query" if inventory_base else None),
+            inventory_facets_url=os.getenv("URL_inventory_facets") or (f"{inventory_base}/facets" if inventory_base else None),
+            inventory_bulk_url=os.getenv("URL_inventory_bulk") or (f"{inventory_base}/bulk" if inventory_base else None),
+            warm_up=os.getenv("WARM_UP", "background").lower(),
+        )
+
+
+_settings: Optional[Settings] = None
+
+
+def get_settings() -> Settings:
+    """Return the process-wide Settings, parsed on first use."""
+    global _settings
+    if _settings is None:
+        _settings = Settings.from_env()
+    return _settings
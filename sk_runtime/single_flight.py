@@ -0,0 +1,160 @@
+import os
+import json
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from opentelemetry import metrics
+from semantic_kernel.filters import FunctionInvocationContext
+from semantic_kernel.functions.function_result import FunctionResult
+
+from sk_runtime.result_cache import normalize_query
+from sk_runtime.turn_metrics import TurnMetrics, current_turn
+
+# -------------------------------
+# Single-flight coalescing of identical tool calls
+# -------------------------------
+#
+# When many sessions ask the same thing at once (a show was just announced),
+# their tool calls reach the kernel within milliseconds of each other. The first
+# call for a key (plugin, function, normalized arguments) runs; identical calls
+# arriving while it is in flight wait for it and get its result instead of
+# sending their own backend request. Nothing is kept once the call finishes:
+# this is not a cache (see result_cache.py for that), only in-flight sharing.
+#
+# Only functions listed in SINGLE_FLIGHT_FUNCTIONS take part ("function" or
+# "plugin.function", as in TOOL_RESULT_BUDGETS); they must be read-only. String
+# arguments are compared like cache queries (case, punctuation and spacing do
+# not matter). A waiter gives up after SINGLE_FLIGHT_MAX_WAIT_S and makes its
+# own call, and so does every waiter when the leading call is cancelled; an
+# exception from the leading call is raised in every waiter.
+#
+# Data versions read by the leading call (see data_versions.py) are recorded on
+# every waiter's turn too, so answers built on a shared result stay invalidatable.
+
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() == "true"
+SINGLE_FLIGHT_FUNCTIONS = frozenset(
+    name.strip()
+    for name in os.getenv(
+        "SINGLE_FLIGHT_FUNCTIONS",
+        "ai_search,web_search,get_inventory,query_inventory,list_inventory_facets,"
+        "lookup_inventory_items,compare_inventory_prices",
+    ).split(",")
+    if name.strip()
+)
+SINGLE_FLIGHT_MAX_WAIT_S = float(os.getenv("SINGLE_FLIGHT_MAX_WAIT_S", "10"))
+
+meter = metrics.get_meter("sk_runtime")
+coalesced_calls = meter.create_counter(
+    "sk.tool.coalesced", unit="{call}", description="Tool calls answered by an identical call already in flight"
+)
+coalesce_fallbacks = meter.create_counter(
+    "sk.tool.coalesce_fallbacks", unit="{call}", description="Waiting tool calls that made their own call (timeout, cancelled leader)"
+)
+
+
+@dataclass
+class _Flight:
+    """One leading call and what its waiters need from it."""
+
+    future: "asyncio.Future[Any]"
+    observed: TurnMetrics = field(default_factory=lambda: TurnMetrics(app="single_flight", show_steps=False))
+
+
+_flights: Dict[Tuple[str, str, str], _Flight] = {}
+
+
+def coalesces(plugin: Optional[str], function: str) -> bool:
+    """Whether calls of `plugin.function` are shared while in flight."""
+    return SINGLE_FLIGHT and (function in SINGLE_FLIGHT_FUNCTIONS or f"{plugin}.{function}" in SINGLE_FLIGHT_FUNCTIONS)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return normalize_query(value)
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    return value
+
+
+def flight_key(context: FunctionInvocationContext) -> Tuple[str, str, str]:
+    """(plugin, function, normalized arguments); only the function's own parameters count."""
+    function = context.function
+    parameters = {parameter.name for parameter in function.metadata.parameters}
+    arguments = {name: _normalize(value) for name, value in (context.arguments or {}).items() if name in parameters}
+    return function.plugin_name or "", function.name, json.dumps(arguments, sort_keys=True, default=str)
+
+
+def _share(turn: Optional[TurnMetrics], observed: TurnMetrics) -> None:
+    if turn is not None:
+        turn.data_versions.update(observed.data_versions)
+
+
+async def _lead(
+    key: Tuple[str, str, str],
+    context: FunctionInvocationContext,
+    next: Callable[[FunctionInvocationContext], Awaitable[None]],
+) -> None:
+    flight = _Flight(future=asyncio.get_running_loop().create_future())
+    _flights[key] = flight
+    turn = current_turn.get()
+    # Record data versions aside so they can be handed to the waiters as well
+    token = current_turn.set(flight.observed)
+    try:
+        await next(context)
+    except asyncio.CancelledError:
+        flight.future.cancel()
+        raise
+    except Exception as e:
+        flight.future.set_exception(e)
+        flight.future.exception()  # mark retrieved when nobody is waiting
+        raise
+    finally:
+        current_turn.reset(token)
+        _flights.pop(key, None)
+        _share(turn, flight.observed)
+    flight.future.set_result(context.result.value if context.result is not None else None)
+
+
+async def single_flight_filter(
+    context: FunctionInvocationContext,
+    next: Callable[[FunctionInvocationContext], Awaitable[None]],
+) -> None:
+    """
+    Kernel function-invocation filter that shares identical in-flight calls of opted-in functions.
+
+    Register it last (innermost): step, telemetry and result-shaping filters still see
+    every call, and a call answered by a prefetch never reaches it.
+    """
+    function = context.function
+    if not coalesces(function.plugin_name, function.name):
+        await next(context)
+        return
+    key = flight_key(context)
+    flight = _flights.get(key)
+    if flight is None:
+        await _lead(key, context, next)
+        return
+
+    attributes = {"sk.plugin": function.plugin_name or "", "sk.function": function.name}
+    try:
+        value = await asyncio.wait_for(asyncio.shield(flight.future), timeout=SINGLE_FLIGHT_MAX_WAIT_S)
+    except asyncio.TimeoutError:
+        coalesce_fallbacks.add(1, {**attributes, "sk.single_flight.reason": "timeout"})
+        await next(context)
+        return
+    except asyncio.CancelledError:
+        if not flight.future.cancelled():
+            raise
+        coalesce_fallbacks.add(1, {**attributes, "sk.single_flight.reason": "leader_cancelled"})
+        await next(context)
+        return
+
+    coalesced_calls.add(1, attributes)
+    turn = current_turn.get()
+    _share(turn, flight.observed)
+    if turn is not None:
+        turn.tool_calls_coalesced += 1
+    context.result = FunctionResult(function=function.metadata, value=value)
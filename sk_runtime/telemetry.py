@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import time
+import logging
+from typing import Any, Awaitable, Callable, Optional, TextIO
+
+from opentelemetry import metrics, trace
+from semantic_kernel.filters import FunctionInvocationContext
+
+from sk_runtime.history_reducer import count_tokens
+from sk_runtime.turn_metrics import current_turn
+
+# -------------------------------
+# Hot-path instrumentation (OpenTelemetry)
+# -------------------------------
+#
+# Every kernel function invocation (search, web, inventory, ...) becomes a span
+# with its latency, result size in bytes and tokens; every LLM round trip adds
+# its prompt/completion token usage. Spans nest under the "turn" span opened by
+# `track_turn`, and the same numbers are aggregated on the turn's metrics line.
+#
+# Without `configure_telemetry` the OpenTelemetry API is a no-op, so the
+# instruments cost next to nothing. TELEMETRY_EXPORTER selects the exporter:
+#   none     - default
+#   console  - JSON spans and metrics on stdout, or TELEMETRY_EXPORT_FILE (JSON lines)
+#   otlp     - OTLP/HTTP to OTEL_EXPORTER_OTLP_ENDPOINT (needs opentelemetry-exporter-otlp-proto-http)
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_EXPORTER = os.getenv("TELEMETRY_EXPORTER", "none").lower()
+TELEMETRY_EXPORT_FILE = os.getenv("TELEMETRY_EXPORT_FILE")
+TELEMETRY_METRICS_INTERVAL_MS = int(os.getenv("TELEMETRY_METRICS_INTERVAL_MS", "60000"))
+
+tracer = trace.get_tracer("sk_runtime")
+meter = metrics.get_meter("sk_runtime")
+
+tool_duration = meter.create_histogram("sk.tool.duration", unit="ms", description="Kernel function latency")
+tool_result_size = meter.create_histogram("sk.tool.result.size", unit="By", description="Kernel function result size")
+tool_result_tokens = meter.create_histogram("sk.tool.result.tokens", unit="{token}", description="Kernel function result tokens")
+llm_round_trips = meter.create_counter("sk.llm.round_trips", unit="{request}", description="Chat completion requests")
+llm_tokens = meter.create_counter("sk.llm.tokens", unit="{token}", description="Prompt and completion tokens")
+
+_configured = False
+
+
+def result_text(value: Any) -> str:
+    """Serialize a function result the way the model receives it."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    try:
+        return json.dumps(value, ensure_ascii=False, default=str)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+async def instrumentation_filter(
+    context: FunctionInvocationContext,
+    next: Callable[[FunctionInvocationContext], Awaitable[None]],
+) -> None:
+    """
+    Kernel function-invocation filter that records a span and metrics for every call.
+
+    Register it after UI filters (e.g. `tool_step_filter`) so the timing covers
+    the function itself rather than the step rendering around it.
+    """
+    tool = f"{context.function.plugin_name}.{context.function.name}"
+    attributes = {"sk.plugin": context.function.plugin_name or "", "sk.function": context.function.name}
+    started = time.perf_counter()
+    with tracer.start_as_current_span(f"tool {tool}", attributes=attributes) as span:
+        error: Optional[BaseException] = None
+        try:
+            await next(context)
+        except BaseException as e:
+            # The span records the exception and error status itself
+            error = e
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            text = result_text(context.result.value if context.result is not None and error is None else None)
+            size, tokens = len(text.encode("utf-8")), count_tokens(text)
+            outcome = {**attributes, "sk.outcome": "error" if error is not None else "ok"}
+            tool_duration.record(elapsed_ms, outcome)
+            if error is None:
+                tool_result_size.record(size, attributes)
+                tool_result_tokens.record(tokens, attributes)
+                span.set_attribute("sk.result.bytes", size)
+                span.set_attribute("sk.result.tokens", tokens)
+
+            turn = current_turn.get()
+            if turn is not None:
+                turn.tool_ms += elapsed_ms
+                turn.tool_result_tokens += tokens
+
+
+def record_llm_usage(message: Any) -> None:
+    """
+    Record token usage carried by a chat message or streamed chunk, if it has any.
+
+    Semantic Kernel attaches `usage` to one chunk per chat completion request, so
+    each usage seen is one LLM round trip of the current turn.
+    """
+    metadata = getattr(message, "metadata", None) or {}
+    usage = metadata.get("usage")
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    llm_round_trips.add(1)
+    llm_tokens.add(prompt, {"sk.token.type": "prompt"})
+    llm_tokens.add(completion, {"sk.token.type": "completion"})
+    trace.get_current_span().add_event(
+        "llm.round_trip", {"gen_ai.usage.input_tokens": prompt, "gen_ai.usage.output_tokens": completion}
+    )
+
+    turn = current_turn.get()
+    if turn is not None:
+        turn.llm_round_trips += 1
+        turn.prompt_tokens += prompt
+        turn.completion_tokens += completion
+
+
+def _console_stream() -> TextIO:
+    if TELEMETRY_EXPORT_FILE:
+        return open(TELEMETRY_EXPORT_FILE, "a", encoding="utf-8", buffering=1)
+    return sys.stdout
+
+
+def configure_telemetry(service_name: str) -> None:
+    """Install tracer and meter providers for TELEMETRY_EXPORTER; safe to call more than once."""
+    global _configured
+    if _configured or TELEMETRY_EXPORTER == "none":
+        return
+
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import ConsoleMetricExporter, PeriodicExportingMetricReader
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if TELEMETRY_EXPORTER == "console":
+        out = _console_stream()
+        span_exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+        metric_exporter = ConsoleMetricExporter(out=out, formatter=lambda data: data.to_json(indent=None) + "\n")
+    elif TELEMETRY_EXPORTER == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.metric_exporter import OTLPMetricExporter
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("TELEMETRY_EXPORTER=otlp needs opentelemetry-exporter-otlp-proto-http; telemetry disabled.")
+            return
+        span_exporter, metric_exporter = OTLPSpanExporter(), OTLPMetricExporter()
+    else:
+        logger.warning(f"Unknown TELEMETRY_EXPORTER '{TELEMETRY_EXPORTER}'; telemetry disabled.")
+        return
+
+    resource = Resource.create({"service.name": service_name})
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(tracer_provider)
+    reader = PeriodicExportingMetricReader(metric_exporter, export_interval_millis=TELEMETRY_METRICS_INTERVAL_MS)
+    metrics.set_meter_provider(MeterProvider(resource=resource, metric_readers=[reader]))
+    _configured = True
+    logger.info(f"Telemetry exporting to {TELEMETRY_EXPORTER} for service '{service_name}'.")
+
+
+def shutdown_telemetry() -> None:
+    """Flush pending spans and metrics; called from the app shutdown hooks."""
+    if not _configured:
+        return
+    for provider in (trace.get_tracer_provider(), metrics.get_meter_provider()):
+        shutdown = getattr(provider, "shutdown", None)
+        if shutdown is not None:
+            shutdown()
@@ -0,0 +1,179 @@
+import json
+import time
+import logging
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from opentelemetry import trace
+
+# -------------------------------
+# Per-turn perceived-latency metrics
+# -------------------------------
+#
+# Every user turn records time-to-first-token (what the user perceives) and total
+# latency. Each finished turn is logged as one JSON line on the "turn_metrics"
+# logger, and recent turns are kept in a rolling window for p50/p95 summaries.
+# The turn is also the parent span of its tool and LLM spans (see telemetry.py).
+
+logger = logging.getLogger("turn_metrics")
+tracer = trace.get_tracer("sk_runtime")
+
+# The turn being served by the current task (and the tool calls it spawns)
+current_turn: "contextvars.ContextVar[Optional[TurnMetrics]]" = contextvars.ContextVar("current_turn", default=None)
+
+
+@dataclass
+class TurnMetrics:
+    app: str
+    session_id: Optional[str] = None
+    # The user's message; tool filters use it to judge relevance (not logged)
+    question: Optional[str] = None
+    started_at: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    tool_calls: int = 0
+    # Tools called ("plugin.function") and data versions they read (see data_versions.py)
+    tools: List[str] = field(default_factory=list)
+    data_versions: Dict[str, Optional[str]] = field(default_factory=dict)
+    answer_cache_hit: bool = False
+    # Set by the intent router: predicted intent and whether a speculative prefetch answered a tool call
+    intent: Optional[str] = None
+    prefetch_used: bool = False
+    # Filled in by the telemetry filter and usage hook
+    tool_ms: float = 0.0
+    tool_result_tokens: int = 0
+    # Tokens removed from tool results by result shaping (see result_shaping.py)
+    tool_result_tokens_saved: int = 0
+    # Tool calls answered by an identical call already in flight (see single_flight.py)
+    tool_calls_coalesced: int = 0
+    llm_round_trips: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # Time LLM requests spent queued, waiting for quota or backing off (see admission.py)
+    llm_wait_ms: float = 0.0
+    # Azure OpenAI deployment that served the last request, and requests moved to another one (see deployment_router.py)
+    deployment: Optional[str] = None
+    failovers: int = 0
+    error: Optional[str] = None
+    # LLM requests and tool calls kept for the turn trace file, when recording (see turn_trace.py)
+    trace: Optional[Any] = None
+    # Whether tool calls are rendered as Chainlit steps (off for CLI and load tests)
+    show_steps: bool = True
+
+    def mark_first_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    @property
+    def ttft_ms(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return (self.first_token_at - self.started_at) * 1000
+
+    @property
+    def total_ms(self) -> Optional[float]:
+        if self.finished_at is None:
+            return None
+        return (self.finished_at - self.started_at) * 1000
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "app": self.app,
+            "session_id": self.session_id,
+            "ttft_ms": None if self.ttft_ms is None else round(self.ttft_ms, 1),
+            "total_ms": None if self.total_ms is None else round(self.total_ms, 1),
+            "tool_calls": self.tool_calls,
+            "tools": self.tools,
+            "answer_cache_hit": self.answer_cache_hit,
+            "intent": self.intent,
+            "prefetch_used": self.prefetch_used,
+            "tool_ms": round(self.tool_ms, 1),
+            "tool_result_tokens": self.tool_result_tokens,
+            "tool_result_tokens_saved": self.tool_result_tokens_saved,
+            "tool_calls_coalesced": self.tool_calls_coalesced,
+            "llm_round_trips": self.llm_round_trips,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "llm_wait_ms": round(self.llm_wait_ms, 1),
+            "deployment": self.deployment,
+            "failovers": self.failovers,
+            "error": self.error,
+        }
+
+
+class LatencyWindow:
+    """Rolling window of recent turns for quick percentile summaries."""
+
+    def __init__(self, size: int = 500) -> None:
+        self.ttft: Deque[float] = deque(maxlen=size)
+        self.total: Deque[float] = deque(maxlen=size)
+
+    def add(self, metrics: TurnMetrics) -> None:
+        if metrics.ttft_ms is not None:
+            self.ttft.append(metrics.ttft_ms)
+        if metrics.total_ms is not None:
+            self.total.append(metrics.total_ms)
+
+    @staticmethod
+    def _percentile(values: Deque[float], pct: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 1)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "turns": len(self.total),
+            "ttft_p50_ms": self._percentile(self.ttft, 0.50),
+            "ttft_p95_ms": self._percentile(self.ttft, 0.95),
+            "total_p50_ms": self._percentile(self.total, 0.50),
+            "total_p95_ms": self._percentile(self.total, 0.95),
+        }
+
+
+latency_window = LatencyWindow()
+
+# Called with every finished turn, e.g. to write it to the trace file (see turn_trace.py)
+_turn_listeners: List[Callable[[TurnMetrics], None]] = []
+
+
+def add_turn_listener(listener: Callable[[TurnMetrics], None]) -> None:
+    """Call `listener` with the metrics of every turn once it is finished (listener errors are logged)."""
+    if listener not in _turn_listeners:
+        _turn_listeners.append(listener)
+
+
+@contextmanager
+def track_turn(
+    app: str, session_id: Optional[str] = None, show_steps: bool = True, question: Optional[str] = None
+) -> Iterator[TurnMetrics]:
+    """
+    Measure one user turn; the metrics are visible to tool filters through `current_turn`.
+
+    Usage:
+        with track_turn("appchainlit", session_id, question=user_input) as metrics:
+            ... metrics.mark_first_token() when the first token is shown ...
+    """
+    metrics = TurnMetrics(app=app, session_id=session_id, question=question, show_steps=show_steps)
+    token = current_turn.set(metrics)
+    with tracer.start_as_current_span("turn") as span:
+        try:
+            yield metrics
+        except Exception as e:
+            metrics.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            metrics.finished_at = time.perf_counter()
+            current_turn.reset(token)
+            latency_window.add(metrics)
+            summary = metrics.to_dict()
+            span.set_attributes({f"sk.turn.{key}": value for key, value in summary.items() if value is not None})
+            logger.info(json.dumps(summary))
+            for listener in _turn_listeners:
+                try:
+                    listener(metrics)
+                except Exception as e:
+                    logger.warning(f"Turn listener {listener!r} failed: {e}")
@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.filters import FunctionInvocationContext
+
+from sk_runtime.telemetry import result_text
+from sk_runtime.turn_metrics import TurnMetrics, add_turn_listener, current_turn
+
+# -------------------------------
+# Turn traces (record / replay input)
+# -------------------------------
+#
+# With TURN_TRACE_FILE set, every finished turn is appended to that file as one
+# JSON line: the question and answer, each LLM request (when it started, its
+# first token and end, tokens, the text or tool calls it returned) and each tool
+# call (arguments, timing, the result the model received). Times are ms from the
+# start of the turn. Earlier turns of the session are not repeated; they are the
+# session's previous lines.
+#
+# benchmarks/replay_traces.py re-drives such files offline against either app
+# and benchmarks/trace_report.py breaks each turn down into its critical path
+# (LLM vs. each tool vs. our own overhead) and diffs two runs.
+#
+# Two hooks feed the trace: `trace_filter` (kernel function invocations) and the
+# RecordingChatCompletion mixin of the chat service (see KernelProvider's
+# chat_service_mixins). Both do nothing outside a turn or when recording is off.
+#
+# TURN_TRACE_SAMPLE keeps that fraction of turns; texts (answers, tool results)
+# are cut to TURN_TRACE_MAX_CHARS. Traces contain user questions and answers:
+# treat the files like the chat transcripts they are.
+
+logger = logging.getLogger(__name__)
+
+TURN_TRACE_FILE = os.getenv("TURN_TRACE_FILE")
+TURN_TRACE_SAMPLE = float(os.getenv("TURN_TRACE_SAMPLE", "1"))
+TURN_TRACE_MAX_CHARS = int(os.getenv("TURN_TRACE_MAX_CHARS", "4000"))
+
+TRACE_VERSION = 1
+
+
+def _clip(text: Optional[str]) -> Optional[str]:
+    if text is None or len(text) <= TURN_TRACE_MAX_CHARS:
+        return text
+    return text[:TURN_TRACE_MAX_CHARS] + "…"
+
+
+def _offset_ms(turn: TurnMetrics) -> float:
+    return round((time.perf_counter() - turn.started_at) * 1000, 1)
+
+
+@dataclass
+class LlmCall:
+    """One chat completion request of a turn."""
+
+    # Function-calling round of the request (0 = first request of the turn)
+    index: int
+    start_ms: float
+    messages: int
+    stream: bool = True
+    first_token_ms: Optional[float] = None
+    end_ms: Optional[float] = None
+    content: str = ""
+    tool_calls: List[Dict[str, str]] = field(default_factory=list)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    error: Optional[str] = None
+
+    def observe(self, turn: TurnMetrics, message: Any) -> None:
+        """Take in one returned (or streamed) message."""
+        text = getattr(message, "content", None)
+        calls = [item for item in getattr(message, "items", ()) if isinstance(item, FunctionCallContent)]
+        if self.first_token_ms is None and (text or calls):
+            self.first_token_ms = _offset_ms(turn)
+        if text:
+            self.content += text
+        for item in calls:
+            # Streamed tool calls arrive in pieces: name and id first, then the arguments
+            key = item.index if item.index is not None else len(self.tool_calls)
+            while len(self.tool_calls) <= key:
+                self.tool_calls.append({"id": "", "name": "", "arguments": ""})
+            call = self.tool_calls[key]
+            call["id"] = call["id"] or (item.id or "")
+            call["name"] = call["name"] or (item.name or "")
+            if item.arguments:
+                call["arguments"] += item.arguments if isinstance(item.arguments, str) else json.dumps(item.arguments)
+        usage = (getattr(message, "metadata", None) or {}).get("usage")
+        if usage is not None:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+
+
+@dataclass
+class ToolCall:
+    """One kernel function invocation of a turn."""
+
+    name: str
+    arguments: Dict[str, Any]
+    start_ms: float
+    end_ms: Optional[float] = None
+    result: Optional[str] = None
+    error: Optional[str] = None
+    # Served by the turn's speculative prefetch (the duration is not the backend's)
+    prefetched: bool = False
+
+
+@dataclass
+class TurnTrace:
+    llm: List[LlmCall] = field(default_factory=list)
+    tools: List[ToolCall] = field(default_factory=list)
+
+
+def _trace(turn: TurnMetrics) -> TurnTrace:
+    if turn.trace is None:
+        turn.trace = TurnTrace()
+    return turn.trace
+
+
+def _recording() -> Optional[TurnMetrics]:
+    """The current turn, if its calls are being recorded."""
+    return current_turn.get() if TURN_TRACE_FILE else None
+
+
+# -------------------------------
+# Hooks
+# -------------------------------
+
+
+async def trace_filter(
+    context: FunctionInvocationContext,
+    next: Callable[[FunctionInvocationContext], Awaitable[None]],
+) -> None:
+    """
+    Kernel function-invocation filter that records each call on the turn trace.
+
+    Register it outside result shaping, so the trace holds the result the model received.
+    """
+    turn = _recording()
+    if turn is None:
+        await next(context)
+        return
+    function = context.function
+    parameters = {parameter.name for parameter in function.metadata.parameters}
+    call = ToolCall(
+        name=f"{function.plugin_name}.{function.name}",
+        arguments={name: value for name, value in (context.arguments or {}).items() if name in parameters},
+        start_ms=_offset_ms(turn),
+    )
+    _trace(turn).tools.append(call)
+    # A turn has at most one prefetch, so the call that sets the flag is the one it served
+    prefetch_used = turn.prefetch_used
+    try:
+        await next(context)
+    except BaseException as e:
+        call.error = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        call.end_ms = _offset_ms(turn)
+    call.prefetched = turn.prefetch_used and not prefetch_used
+    call.result = _clip(result_text(context.result.value if context.result is not None else None))
+
+
+class RecordingChatCompletion:
+    """
+    Chat completion service mixin that records every request on the turn trace.
+
+    Placed before the service class, e.g. KernelProvider(chat_service_mixins=[RecordingChatCompletion]).
+    """
+
+    async def _inner_get_chat_message_contents(self, chat_history: Any, settings: Any) -> List[Any]:
+        turn = _recording()
+        if turn is None:
+            return await super()._inner_get_chat_message_contents(chat_history, settings)
+        call = LlmCall(index=0, start_ms=_offset_ms(turn), messages=len(chat_history.messages), stream=False)
+        _trace(turn).llm.append(call)
+        try:
+            messages = await super()._inner_get_chat_message_contents(chat_history, settings)
+        except BaseException as e:
+            call.error = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            call.end_ms = _offset_ms(turn)
+        for message in messages:
+            call.observe(turn, message)
+        return messages
+
+    async def _inner_get_streaming_chat_message_contents(
+        self, chat_history: Any, settings: Any, function_invoke_attempt: int = 0
+    ) -> AsyncGenerator[List[Any], Any]:
+        turn = _recording()
+        inner = super()._inner_get_streaming_chat_message_contents(chat_history, settings, function_invoke_attempt)
+        if turn is None:
+            async for messages in inner:
+                yield messages
+            return
+        call = LlmCall(index=function_invoke_attempt, start_ms=_offset_ms(turn), messages=len(chat_history.messages))
+        _trace(turn).llm.append(call)
+        try:
+            async for messages in inner:
+                for message in messages:
+                    if message is not None:
+                        call.observe(turn, message)
+                yield messages
+        except BaseException as e:
+            call.error = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            call.end_ms = _offset_ms(turn)
+
+
+# -------------------------------
+# Trace file
+# -------------------------------
+
+
+def turn_record(turn: TurnMetrics) -> Dict[str, Any]:
+    """The trace line of a finished turn."""
+    trace = turn.trace or TurnTrace()
+    answer = next((call.content for call in reversed(trace.llm) if call.stream and call.content), None)
+    started = time.time() - (time.perf_counter() - turn.started_at)
+    record = {
+        "v": TRACE_VERSION,
+        "app": turn.app,
+        "session": turn.session_id,
+        "at": round(started, 3),
+        "question": turn.question,
+        "answer": _clip(answer),
+        "ttft_ms": None if turn.ttft_ms is None else round(turn.ttft_ms, 1),
+        "total_ms": None if turn.total_ms is None else round(turn.total_ms, 1),
+        "llm_wait_ms": round(turn.llm_wait_ms, 1),
+        "deployment": turn.deployment,
+        "intent": turn.intent,
+        "answer_cache_hit": turn.answer_cache_hit,
+        "prefetch_used": turn.prefetch_used,
+        "error": turn.error,
+        "llm": [asdict(call) for call in trace.llm],
+        "tools": [asdict(call) for call in trace.tools],
+    }
+    for call in record["llm"]:
+        call["content"] = _clip(call["content"])
+    return record
+
+
+class TurnRecorder:
+    """Appends finished turns to a JSON-lines trace file."""
+
+    def __init__(self, path: str, sample: float = 1.0) -> None:
+        self.path = path
+        self.sample = sample
+        self._lock = threading.Lock()
+
+    def __call__(self, turn: TurnMetrics) -> None:
+        if self.sample < 1 and random.random() >= self.sample:
+            return
+        line = json.dumps(turn_record(turn), ensure_ascii=False, separators=(",", ":"), default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def enable_turn_recording() -> Optional[TurnRecorder]:
+    """Write every finished turn to TURN_TRACE_FILE; returns the recorder, or None when it is not set."""
+    if not TURN_TRACE_FILE:
+        return None
+    recorder = TurnRecorder(TURN_TRACE_FILE, TURN_TRACE_SAMPLE)
+    add_turn_listener(recorder)
+    logger.info(f"Recording turn traces to {TURN_TRACE_FILE}.")
+    return recorder
+
+
+def read_traces(path: str) -> Iterator[Dict[str, Any]]:
+    """Turn records of a trace file, in file order (unreadable lines are skipped)."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"{path}:{number}: not a JSON line, skipped.")
+                continue
+            if record.get("v") == TRACE_VERSION:
+                yield record